@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按钮查找与文本规范化的性能基准测试。
+
+直接使用生产实现（main.py 的 find_button 和 button_matcher.py 的 normalize_button_text），在 1 到 1000 个按钮、
+混合表情/中文/英文文本的合成内联键盘上测量完全匹配、部分匹配、模糊匹配、回调数据和位置查找的
+吞吐量与延迟，并把结果写入 JSON 文件，便于在不同版本之间对比。
+
+用法:
+    python benchmark.py                                  # 运行并写入 bench_results.json
+    python benchmark.py --output new.json --compare bench_results.json
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+from types import SimpleNamespace
+
+from telethon.tl.types import ReplyInlineMarkup, KeyboardButtonRow, KeyboardButtonCallback
+
+from button_matcher import normalize_button_text
+from main import find_button
+
+KEYBOARD_SIZES = [1, 10, 100, 1000]
+BUTTONS_PER_ROW = 4
+
+# 填充按钮使用的文本，均不包含签到相关关键词，保证只有目标按钮能被匹配到
+FILLER_EMOJIS = ["🎁", "🔥", "⭐", "📅", "💰", "🎮", "🏆", "📢"]
+FILLER_WORDS = ["余额", "邀请好友", "帮助", "设置", "商城", "排行榜", "任务", "兑换",
+                "Profile", "Help", "Shop", "Invite", "Rank", "Wallet", "Tasks", "Settings"]
+
+# 场景名称 -> (目标按钮文本, 目标回调数据, 按钮定义)，位置场景的按钮定义在生成键盘后确定
+SCENARIOS = {
+    "exact": ("签到", b"checkin", "签到"),
+    "substring": ("🎯 每日签到领奖励", b"checkin", "每日签到"),
+    "fuzzy": ("✅ Daily Check-In", b"checkin", "check in"),
+    "callback_data": ("🎯 签到", b"checkin", {"data": "checkin"}),
+    "position": ("🎯 签到", b"checkin", None),
+    "miss": (None, None, "签到"),
+}
+
+def build_keyboard(size, target_text, target_data, rng):
+    """生成包含 size 个按钮的内联键盘，目标按钮放在最后（最坏情况）。"""
+    buttons = []
+    for i in range(size):
+        text = f"{rng.choice(FILLER_EMOJIS)} {rng.choice(FILLER_WORDS)} {i}"
+        buttons.append(KeyboardButtonCallback(text=text, data=f"action_{i}".encode()))
+    if target_text is not None:
+        buttons[-1] = KeyboardButtonCallback(text=target_text, data=target_data)
+
+    rows = [
+        KeyboardButtonRow(buttons=buttons[i:i + BUTTONS_PER_ROW])
+        for i in range(0, len(buttons), BUTTONS_PER_ROW)
+    ]
+    return SimpleNamespace(id=1, reply_markup=ReplyInlineMarkup(rows=rows))
+
+def measure(func, min_time, min_iterations):
+    """重复执行 func，直到达到最少次数和最短时间，返回每次调用的耗时（秒）列表。"""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_iterations or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "iterations": len(timings),
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p95_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6,
+        "ops_per_sec": len(timings) / sum(timings) if sum(timings) else float('inf'),
+    }
+
+def run_lookup_benchmarks(min_time, min_iterations, seed):
+    results = []
+    for size in KEYBOARD_SIZES:
+        for scenario, (target_text, target_data, button_def) in SCENARIOS.items():
+            message = build_keyboard(size, target_text, target_data, random.Random(seed))
+            if scenario == "position":
+                last_row = len(message.reply_markup.rows) - 1
+                button_def = [last_row, len(message.reply_markup.rows[last_row].buttons) - 1]
+
+            expected = message.reply_markup.rows[-1].buttons[-1] if target_text is not None else None
+            found = find_button(message, button_def)
+            if found is not expected:
+                raise AssertionError(f"场景 {scenario} ({size} 个按钮) 找到了错误的按钮: {found}")
+
+            # cold: 每次查找前清空规范化缓存，相当于第一次见到这个键盘；warm: 按钮文本已缓存
+            for mode in ("cold", "warm"):
+                if mode == "cold":
+                    def lookup():
+                        normalize_button_text.cache_clear()
+                        find_button(message, button_def)
+                else:
+                    def lookup():
+                        find_button(message, button_def)
+                stats = summarize(measure(lookup, min_time, min_iterations))
+                results.append({"benchmark": "lookup", "scenario": scenario, "buttons": size, "mode": mode, **stats})
+    return results
+
+def run_normalize_benchmarks(min_time, min_iterations, seed):
+    rng = random.Random(seed)
+    results = []
+    for size in KEYBOARD_SIZES:
+        texts = [f"{rng.choice(FILLER_EMOJIS)} {rng.choice(FILLER_WORDS)}，Check-In {i}!" for i in range(size)]
+
+        def normalize_all():
+            normalize_button_text.cache_clear()
+            for text in texts:
+                normalize_button_text(text)
+
+        stats = summarize(measure(normalize_all, min_time, min_iterations))
+        results.append({"benchmark": "normalize", "scenario": "mixed_text", "buttons": size, "mode": "cold", **stats})
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """与之前的结果文件对比，输出每项 p50 延迟的变化。"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def key(r):
+        return (r["benchmark"], r["scenario"], r["buttons"], r["mode"])
+
+    previous = {key(r): r for r in baseline["results"]}
+    print(f"\n与 {baseline_path} (版本 {baseline.get('revision')}) 对比 p50 延迟:")
+    for result in results:
+        old = previous.get(key(result))
+        if not old:
+            continue
+        ratio = result["p50_us"] / old["p50_us"] if old["p50_us"] else float('inf')
+        flag = " ⚠️" if ratio > 1.2 else ""
+        print(f"  {result['benchmark']:<9} {result['scenario']:<13} {result['buttons']:>5} {result['mode']:<4} "
+              f"{old['p50_us']:>10.1f}us -> {result['p50_us']:>10.1f}us  x{ratio:.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="按钮查找与文本规范化的性能基准测试")
+    parser.add_argument("--output", default="bench_results.json", help="结果输出文件")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每项测试的最短运行秒数")
+    parser.add_argument("--min-iterations", type=int, default=20, help="每项测试的最少运行次数")
+    parser.add_argument("--seed", type=int, default=1, help="生成合成键盘的随机种子")
+    args = parser.parse_args()
+
+    # find_button 会在 INFO 级别记录匹配过程，测试时关闭以免日志输出影响计时
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = run_lookup_benchmarks(args.min_time, args.min_iterations, args.seed)
+    results += run_normalize_benchmarks(args.min_time, args.min_iterations, args.seed)
+
+    for r in results:
+        print(f"{r['benchmark']:<9} {r['scenario']:<13} {r['buttons']:>5} {r['mode']:<4} "
+              f"p50={r['p50_us']:>10.1f}us p95={r['p95_us']:>10.1f}us {r['ops_per_sec']:>12.0f} ops/s")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
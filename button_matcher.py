@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按钮文本的模糊匹配和按钮面板的索引。
+
+机器人配置中的按钮文本定义在加载配置时编译为 ButtonMatcher（见 config_loader），
+签到时只需对面板上的按钮打分，main.py 和 replay.py 共用同一套匹配规则。
+收到的每条带按钮的消息只遍历一次面板，建立 KeyboardIndex 供查找按钮和日志分析共用。
+"""
+
+import re
+import functools
+
+# 匹配时忽略的字符：空白、常见标点符号，以及表情符号等辅助平面字符
+_IGNORED_CHARS_RE = re.compile(r'[\s.,，。:：;；!！?？_\-—～~()\U00010000-\U0010ffff]')
+
+# 签到关键词，单字关键词很容易误匹配，因此只给很低的置信度
+CHECKIN_KEYWORDS = ("签到", "打卡", "checkin", "check", "签", "到")
+# 配置中的按钮文本要求的最低置信度：只有单字关键词相同（0.15）的按钮不会被点击
+MIN_CONFIDENCE = 0.3
+
+@functools.lru_cache(maxsize=4096)
+def normalize_button_text(text):
+    """转为小写并去除空白、标点和表情符号。结果会被缓存，同一按钮文本只处理一次。"""
+    return _IGNORED_CHARS_RE.sub('', text.lower())
+
+class ButtonMatcher:
+    """
+    针对单个按钮文本定义的匹配器，每个配置只需构建一次。
+
+    对每个按钮给出 0 到 1 的置信度：完全相同为 1.0，其次依次为忽略空白标点后相同、
+    原文包含、忽略空白标点后包含，最后是共同的签到关键词。best() 会对所有按钮打分并返回
+    置信度最高的一个，而不是第一个勉强匹配上的按钮。
+    """
+
+    EXACT = 1.0
+    NORMALIZED_EXACT = 0.9
+
+    def __init__(self, target, min_confidence=0.0):
+        self.target = target or ""
+        self.normalized = normalize_button_text(self.target)
+        self.keywords = frozenset(kw for kw in CHECKIN_KEYWORDS if kw in self.normalized)
+        self.min_confidence = min_confidence
+
+    def score(self, text):
+        """返回按钮文本与目标的匹配置信度，0 表示不匹配。"""
+        if not self.target or not text:
+            return 0.0
+        if text == self.target:
+            return self.EXACT
+
+        normalized = normalize_button_text(text)
+        if normalized and normalized == self.normalized:
+            return self.NORMALIZED_EXACT
+
+        # 原文包含：越接近完整按钮文本，置信度越高
+        if self.target in text:
+            return 0.7 + 0.15 * len(self.target) / len(text)
+
+        # 忽略空白、标点和表情符号后，一个字符串包含另一个
+        if normalized and self.normalized:
+            shorter, longer = sorted((normalized, self.normalized), key=len)
+            if shorter in longer:
+                return 0.5 + 0.2 * len(shorter) / len(longer)
+
+        # 共同的签到关键词
+        common = [kw for kw in self.keywords if kw in normalized]
+        if not common:
+            return 0.0
+        return 0.4 if any(len(kw) > 1 for kw in common) else 0.15
+
+    def match(self, text):
+        """按钮文本是否与目标匹配（置信度大于 0 且不低于 min_confidence）。"""
+        confidence = self.score(text)
+        return confidence > 0 and confidence >= self.min_confidence
+
+    def best(self, buttons):
+        """
+        对所有按钮打分，返回置信度最高的按钮；置信度相同时取靠前的按钮。
+
+        Returns:
+            tuple: (button, confidence)，没有匹配的按钮时为 (None, 0.0)。
+        """
+        best_button, best_confidence = None, 0.0
+        for button in buttons:
+            confidence = self.score(button.text)
+            if confidence > best_confidence:
+                best_button, best_confidence = button, confidence
+                if confidence == self.EXACT:
+                    break
+        if best_button is None or best_confidence < self.min_confidence:
+            return None, 0.0
+        return best_button, best_confidence
+
+@functools.lru_cache(maxsize=1024)
+def get_button_matcher(target):
+    """返回按钮文本定义对应的匹配器（最低置信度为 MIN_CONFIDENCE），同一定义只构建一次。"""
+    return ButtonMatcher(target, min_confidence=MIN_CONFIDENCE)
+
+class KeyboardIndex:
+    """
+    一条消息按钮面板的索引，每条收到的消息只构建一次，查找按钮和日志分析共用。
+
+    构建时只记录面板的各行；按钮列表以及回调数据、文本、规范化文本和位置的映射在第一次用到时
+    各遍历一次按钮建立，之后的查找都是字典查找。按位置查找直接取对应行列；按回调数据查找是一次字典查找，每个按钮的
+    回调数据只解码一次（decoded），by_data 和日志分析共用；按文本查找先查文本完全相同、再查规范化后相同的按钮，
+    都没有时才对所有按钮打分一次。
+    """
+
+    __slots__ = ("markup_type", "rows", "_buttons", "_decoded", "_by_data", "_by_text", "_by_normalized", "_positions")
+
+    def __init__(self, reply_markup):
+        self.markup_type = type(reply_markup).__name__ if reply_markup else None
+        self.rows = [row.buttons for row in getattr(reply_markup, 'rows', None) or ()]
+        self._buttons = None
+        self._decoded = None
+        self._by_data = None
+        self._by_text = None
+        self._by_normalized = None
+        self._positions = None
+
+    def __len__(self):
+        return sum(len(buttons) for buttons in self.rows)
+
+    @property
+    def buttons(self):
+        """按行展开的所有按钮。"""
+        if self._buttons is None:
+            self._buttons = [button for buttons in self.rows for button in buttons]
+        return self._buttons
+
+    @property
+    def decoded(self):
+        """与 buttons 一一对应的 UTF-8 解码后的回调数据，没有回调数据或无法解码时为 None。"""
+        if self._decoded is None:
+            decoded = []
+            for button in self.buttons:
+                data = getattr(button, 'data', None)
+                try:
+                    decoded.append(data.decode('utf-8') if data else None)
+                except UnicodeDecodeError:
+                    decoded.append(None)
+            self._decoded = decoded
+        return self._decoded
+
+    @property
+    def by_data(self):
+        """{回调数据: 第一个使用该数据的按钮}，由 decoded 建立，无法按 UTF-8 解码的回调数据不在其中。"""
+        if self._by_data is None:
+            self._by_data = {}
+            for button, data in zip(self.buttons, self.decoded):
+                if data is not None:
+                    self._by_data.setdefault(data, button)
+        return self._by_data
+
+    @property
+    def by_text(self):
+        """{按钮文本: 第一个使用该文本的按钮}"""
+        if self._by_text is None:
+            self._by_text = {}
+            for button in self.buttons:
+                if button.text:
+                    self._by_text.setdefault(button.text, button)
+        return self._by_text
+
+    @property
+    def by_normalized(self):
+        """{规范化文本: 第一个规范化后为该文本的按钮}"""
+        if self._by_normalized is None:
+            self._by_normalized = {}
+            for button in self.buttons:
+                normalized = normalize_button_text(button.text) if button.text else ""
+                if normalized:
+                    self._by_normalized.setdefault(normalized, button)
+        return self._by_normalized
+
+    def entries(self):
+        """依次产生 (按钮, (行, 列), 按钮类型, 解码后的回调数据)。"""
+        decoded = iter(self.decoded)
+        for i, buttons in enumerate(self.rows):
+            for j, button in enumerate(buttons):
+                yield button, (i, j), type(button).__name__, next(decoded)
+
+    def at(self, row, col):
+        """返回 [行, 列] 位置的按钮，不存在时返回 None。"""
+        if 0 <= row < len(self.rows) and 0 <= col < len(self.rows[row]):
+            return self.rows[row][col]
+        return None
+
+    def find_data(self, data):
+        """返回回调数据（文本）相同的第一个按钮，不存在时返回 None。"""
+        return self.by_data.get(data)
+
+    def find_text(self, matcher):
+        """
+        返回与 matcher 最匹配的按钮，结果与 matcher.best(self.buttons) 相同。
+
+        文本完全相同和规范化后相同是最高的两档置信度，先按字典查找，都没有时才对所有按钮打分。
+
+        Returns:
+            tuple: (button, confidence)，没有匹配的按钮时为 (None, 0.0)。
+        """
+        if not matcher.target:
+            return None, 0.0
+        button = self.by_text.get(matcher.target)
+        if button is not None:
+            return button, matcher.EXACT
+        button = self.by_normalized.get(matcher.normalized) if matcher.normalized else None
+        if button is not None:
+            return button, matcher.NORMALIZED_EXACT
+        return matcher.best(self.buttons)
+
+    def position_of(self, button):
+        """返回按钮的 [行, 列] 位置，按钮不在面板中时返回 None。"""
+        if self._positions is None:
+            self._positions = {id(b): [i, j] for i, buttons in enumerate(self.rows) for j, b in enumerate(buttons)}
+        position = self._positions.get(id(button))
+        return list(position) if position else None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监听模式的交互记录（capture）文件。
+
+每条记录是一行紧凑的 JSON（JSON Lines），由后台线程负责序列化和写入，事件循环只需把记录放进队列，
+不会因为磁盘写入阻塞更新处理。文件可以按大小或时间轮转，轮转出的文件名带时间戳，可选 gzip 压缩：
+
+    monitor_capture.jsonl                          # 当前正在写入的文件
+    monitor_capture.20240501-120000-000.jsonl.gz   # 已轮转的文件，按文件名排序即为时间顺序
+"""
+
+import os
+import gzip
+import json
+import time
+import queue
+import shutil
+import logging
+import threading
+
+_STOP = object()
+
+def rotated_name(path, when=None):
+    """返回轮转后的文件名：在扩展名前插入时间戳和同一秒内的序号，按文件名排序即为时间顺序。"""
+    stem, ext = os.path.splitext(path)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(when))
+    index = 0
+    while True:
+        candidate = f"{stem}.{stamp}-{index:03d}{ext}"
+        if not (os.path.exists(candidate) or os.path.exists(candidate + ".gz")):
+            return candidate
+        index += 1
+
+def capture_files(path):
+    """
+    返回某个记录文件的所有分段，按时间从旧到新排列：先是轮转出的文件，最后是当前文件。
+    """
+    directory = os.path.dirname(path) or "."
+    stem, ext = os.path.splitext(os.path.basename(path))
+    rotated = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(stem + ".") and (name.endswith(ext) or name.endswith(ext + ".gz"))
+        and name not in (stem + ext, stem + ext + ".gz")
+    )
+    return rotated + ([path] if os.path.exists(path) else [])
+
+class CaptureWriter:
+    """
+    在后台线程中把记录写入 JSON Lines 文件，并按大小或时间轮转。
+
+    启动时如果文件已存在且不为空（上一次监听留下的记录），会先把它轮转保存，不会被覆盖。
+    """
+
+    def __init__(self, path, max_bytes=None, interval=None, compress=False):
+        """
+        Args:
+            path: 当前记录文件的路径。
+            max_bytes: 文件达到该大小（字节）后轮转，None 表示不按大小轮转。
+            interval: 文件写入超过该秒数后轮转，None 表示不按时间轮转。
+            compress: 为 True 时用 gzip 压缩轮转出的文件。
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compress = compress
+        self.records = 0
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._opened_at = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path):
+            self._rotate()
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """把一条记录（可 JSON 序列化的字典）放入写入队列，不阻塞调用方。"""
+        record.setdefault("ts", round(time.time(), 3))
+        self._queue.put(record)
+
+    def close(self):
+        """写完队列中剩余的记录并关闭文件。"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.monotonic()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.interval) and time.monotonic() - self._opened_at >= self.interval
+
+    def _rotate(self):
+        """把当前文件改名为带时间戳的分段（可选压缩），由写入线程或初始化时调用。"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        target = rotated_name(self.path)
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, 'rb') as src, gzip.open(target + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+            target += ".gz"
+        logging.info(f"记录文件已轮转: {target}")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            try:
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str))
+                self._file.write("\n")
+                self.records += 1
+                # 队列暂时为空时才刷新，连续到达的记录合并成一次写入
+                if self._queue.empty():
+                    self._file.flush()
+                if self._should_rotate():
+                    self._rotate()
+                    self._open()
+            except (OSError, TypeError, ValueError) as e:
+                logging.error(f"写入记录文件 {self.path} 失败: {e}")
+        self._file.close()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+
+from capture import CaptureWriter, capture_files
+
+def read_records(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_writer_rotates_by_size_and_compresses(tmp_path):
+    path = str(tmp_path / "capture.jsonl")
+    with CaptureWriter(path, max_bytes=200, compress=True) as writer:
+        for i in range(20):
+            writer.write({"type": "message", "message_id": i, "text": "签到成功"})
+
+    files = capture_files(path)
+    assert len(files) > 2 and all(f.endswith(".gz") for f in files[:-1])
+    records = [r for f in files for r in read_records(f)]
+    assert [r["message_id"] for r in records] == list(range(20))
+    # 每条记录是一行紧凑的 JSON
+    assert all("ts" in r for r in records)
+
+def test_previous_capture_is_kept(tmp_path):
+    path = str(tmp_path / "capture.jsonl")
+    with CaptureWriter(path) as writer:
+        writer.write({"type": "message", "message_id": 1})
+    with CaptureWriter(path) as writer:
+        writer.write({"type": "message", "message_id": 2})
+
+    files = capture_files(path)
+    assert [r["message_id"] for f in files for r in read_records(f)] == [1, 2]
@@ -0,0 +1,468 @@
+import os
+import re
+import json
+import math
+import asyncio
+import logging
+import sqlite3
+import time
+import datetime as dt
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from telethon.tl.types import InputPeerUser
+
+# --- 状态目录 ---
+# 签到过程中需要跨运行保留的数据都保存在这个目录下（GitHub Actions 中通过 actions/cache 保留）
+STATE_DIR = os.environ.get('CHECKIN_STATE_DIR', '.checkin_state')
+
+def state_path(filename):
+    """返回状态目录下的文件路径，必要时创建状态目录。"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, filename)
+
+def account_state_path(account, name):
+    """
+    返回某个账户的 JSON 状态文件路径。
+
+    默认账户使用 "<name>.json"，其它账户使用 "<name>_<账户名>.json"，账户之间互不影响。
+    """
+    if not account or account == "default":
+        return state_path(f"{name}.json")
+    safe_account = re.sub(r'[^\w.-]', '_', account)
+    return state_path(f"{name}_{safe_account}.json")
+
+def bot_key(username):
+    """状态文件中使用的机器人键：去掉 @ 并转为小写。"""
+    return username.lstrip('@').lower()
+
+def load_json(path, default):
+    """读取 JSON 状态文件，文件不存在或已损坏时返回 default。"""
+    if not path:
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logging.warning(f"无法读取状态文件 {path}，将重新生成: {e}")
+        return default
+
+def save_json(path, data):
+    """先写临时文件再替换，避免进程中途退出时留下不完整的状态文件。"""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# --- Peer 缓存 ---
+class PeerCache:
+    """
+    机器人用户名到 InputPeer 的缓存。
+
+    每个用户名每次运行最多解析一次，解析结果的 id 和 access_hash 持久化到本地文件，
+    下次运行直接构造 InputPeerUser，避免重复的 ResolveUsername 请求触发 FloodWait。
+    提供 limiter（rate_limiter.AccountRateLimiter）时，解析请求按 "read" 类型限速。
+    """
+
+    def __init__(self, path=None, limiter=None):
+        self.path = path
+        self.limiter = limiter
+        self._entries = load_json(path, {})
+        self._resolving = {}
+        self._dirty = False
+
+    def get(self, username):
+        """返回缓存中的 InputPeerUser，没有缓存时返回 None。"""
+        entry = self._entries.get(bot_key(username))
+        if entry is None:
+            return None
+        return InputPeerUser(user_id=entry["id"], access_hash=entry["access_hash"])
+
+    async def resolve(self, client, username):
+        """
+        返回用户名对应的 InputPeer，缓存未命中时向 Telegram 解析一次。
+
+        同一用户名的并发解析请求会共享同一次 RPC。
+        """
+        peer = self.get(username)
+        if peer is not None:
+            return peer
+
+        key = bot_key(username)
+        task = self._resolving.get(key)
+        if task is None:
+            if self.limiter is not None:
+                lookup = self.limiter.call("read", lambda: client.get_input_entity(username))
+            else:
+                lookup = client.get_input_entity(username)
+            task = self._resolving[key] = asyncio.ensure_future(lookup)
+        try:
+            peer = await task
+        finally:
+            self._resolving.pop(key, None)
+
+        if isinstance(peer, InputPeerUser) and key not in self._entries:
+            self._entries[key] = {"id": peer.user_id, "access_hash": peer.access_hash}
+            self._dirty = True
+        return peer
+
+    async def resolve_all(self, client, usernames):
+        """
+        并发解析所有用户名并保存缓存。
+
+        Returns:
+            dict: {username: InputPeer 或解析时抛出的异常}
+        """
+        usernames = list(usernames)
+        results = await asyncio.gather(
+            *(self.resolve(client, username) for username in usernames),
+            return_exceptions=True
+        )
+        for username, result in zip(usernames, results):
+            if isinstance(result, Exception):
+                logging.error(f"无法解析机器人 {username}: {result}")
+        self.save()
+        return dict(zip(usernames, results))
+
+    def invalidate(self, username):
+        """Telegram 拒绝缓存的 peer 时调用，下次使用时重新解析。"""
+        if self._entries.pop(bot_key(username), None) is not None:
+            logging.info(f"已清除 {username} 的 peer 缓存，下次将重新解析。")
+            self._dirty = True
+            self.save()
+
+    def save(self):
+        if self._dirty:
+            save_json(self.path, self._entries)
+            self._dirty = False
+
+# --- 签到方法学习 ---
+class StrategyStore:
+    """
+    记录每个机器人实际签到成功的方法，下次运行时优先尝试。
+
+    方法用字典表示: {"kind": "callback" | "text" | "position" | "command", "value": ..., "start_command": ...}，
+    分别对应按回调数据、按钮文本、按钮位置点击，或直接发送命令。每个方法记录累计成功次数和
+    自上次成功以来的连续失败次数，连续失败过多的方法会被遗忘。
+    """
+
+    MAX_FAILURES = 5
+
+    def __init__(self, path=None):
+        self.path = path
+        self._data = load_json(path, {})
+        self._dirty = False
+
+    @staticmethod
+    def _same(entry, strategy):
+        return all(entry.get(field) == strategy.get(field) for field in ("kind", "value", "start_command"))
+
+    def strategies(self, bot_username):
+        """返回该机器人学到的方法，最近没有失败且成功次数多的排在前面。"""
+        entries = self._data.get(bot_key(bot_username), [])
+        return sorted(entries, key=lambda e: (e["failures"] > 0, -e["successes"], -e["last_success"]))
+
+    def record_success(self, bot_username, strategy):
+        entries = self._data.setdefault(bot_key(bot_username), [])
+        entry = next((e for e in entries if self._same(e, strategy)), None)
+        if entry is None:
+            entry = {"kind": strategy["kind"], "value": strategy["value"],
+                     "start_command": strategy.get("start_command"), "successes": 0}
+            entries.append(entry)
+            logging.info(f"已记录 {bot_username} 的签到方法: {strategy['kind']} {strategy['value']!r}")
+        entry["successes"] += 1
+        entry["failures"] = 0
+        entry["last_success"] = int(time.time())
+        self._dirty = True
+
+    def record_failure(self, bot_username, strategy):
+        """只记录已学到的方法的失败，连续失败 MAX_FAILURES 次后遗忘该方法。"""
+        entries = self._data.get(bot_key(bot_username), [])
+        entry = next((e for e in entries if self._same(e, strategy)), None)
+        if entry is None:
+            return
+        entry["failures"] += 1
+        if entry["failures"] >= self.MAX_FAILURES:
+            entries.remove(entry)
+            logging.info(f"{bot_username} 的签到方法 {entry['kind']} {entry['value']!r} 连续失败，已遗忘。")
+        self._dirty = True
+
+    def ordered_commands(self, bot_username, commands):
+        """按历史成功情况排列候选命令：学到的命令在前，其余保持原顺序。"""
+        learned = [e["value"] for e in self.strategies(bot_username) if e["kind"] == "command" and e["failures"] == 0]
+        return [cmd for cmd in learned if cmd in commands] + [cmd for cmd in commands if cmd not in learned]
+
+    def save(self):
+        if self._dirty:
+            save_json(self.path, self._data)
+            self._dirty = False
+
+class KeyboardMemory:
+    """
+    每个机器人上一次签到成功时点击的按钮面板：消息 ID 和回调数据。
+
+    大多数机器人的内联按钮面板会在同一条消息上保留很多天，下次签到可以直接对这条消息发起回调查询，
+    省去发送启动命令和等待新面板的一次往返。机器人拒绝回调（消息太旧、回调数据失效等）时由调用方遗忘。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = load_json(path, {})
+        self._dirty = False
+
+    def get(self, bot_username):
+        """返回 {"message_id": ..., "data": ...}，没有记录时返回 None。"""
+        return self._entries.get(bot_key(bot_username))
+
+    def remember(self, bot_username, message_id, data):
+        entry = {"message_id": message_id, "data": data}
+        if self._entries.get(bot_key(bot_username)) != entry:
+            self._entries[bot_key(bot_username)] = entry
+            self._dirty = True
+
+    def forget(self, bot_username):
+        if self._entries.pop(bot_key(bot_username), None) is not None:
+            self._dirty = True
+
+    def save(self):
+        if self._dirty:
+            save_json(self.path, self._entries)
+            self._dirty = False
+
+# --- 响应延迟 ---
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logging.warning(f"{name} 不是有效的数字，使用默认值 {default}。")
+        return float(default)
+
+class LatencyTracker:
+    """
+    每个机器人最近的响应延迟样本（滚动窗口），用于推导等待超时时间。
+
+    超时时间 = 样本的指定百分位数 + 余量，并限制在下限和上限之间。样本不足时使用调用方给出的默认值。
+    等待超时本身也会作为一个样本记录（实际延迟至少这么长），这样偶尔变慢的机器人会逐渐得到更长的超时。
+    """
+
+    WINDOW = 50
+    MIN_SAMPLES = 5
+
+    def __init__(self, path=None, percentile=None, margin=None, floor=None, ceiling=None):
+        self.path = path
+        self.percentile = percentile if percentile is not None else _env_float('CHECKIN_TIMEOUT_PERCENTILE', 95)
+        self.margin = margin if margin is not None else _env_float('CHECKIN_TIMEOUT_MARGIN', 2)
+        self.floor = floor if floor is not None else _env_float('CHECKIN_TIMEOUT_FLOOR', 3)
+        self.ceiling = ceiling if ceiling is not None else _env_float('CHECKIN_TIMEOUT_CEILING', 30)
+        self._samples = load_json(path, {})
+        self._dirty = False
+
+    def observe(self, bot_username, latency):
+        """记录一次响应延迟（秒）。"""
+        samples = self._samples.setdefault(bot_key(bot_username), [])
+        samples.append(round(latency, 3))
+        del samples[:-self.WINDOW]
+        self._dirty = True
+
+    def timeout(self, bot_username, default):
+        """
+        返回该机器人的等待超时时间。
+
+        Returns:
+            tuple: (秒数, 说明)，说明用于日志中解释超时时间的来源。
+        """
+        samples = self._samples.get(bot_key(bot_username), [])
+        if len(samples) < self.MIN_SAMPLES:
+            value, reason = default, f"样本不足 ({len(samples)} 个)，使用默认值"
+        else:
+            ordered = sorted(samples)
+            index = min(len(ordered) - 1, max(0, math.ceil(len(ordered) * self.percentile / 100) - 1))
+            value = ordered[index] + self.margin
+            reason = f"p{self.percentile:g}={ordered[index]:.2f}s + {self.margin:g}s，{len(samples)} 个样本"
+        return min(max(value, self.floor), self.ceiling), reason
+
+    def save(self):
+        if self._dirty:
+            save_json(self.path, self._samples)
+            self._dirty = False
+
+# --- 机器人健康状况 ---
+HEALTH_CLOSED, HEALTH_OPEN, HEALTH_PROBE = "closed", "open", "probe"
+# 健康评分中各结果的权重：成功、有响应但未成功、完全没有响应
+HEALTH_WEIGHTS = {"success": 1.0, "failure": 0.5, "timeout": 0.0}
+
+class BotHealth:
+    """
+    每个机器人最近的签到结果和熔断状态。
+
+    一个机器人的一轮签到（或一次探测）结束后记录一个结果："success"、"failure"（机器人有响应但没有
+    签到成功）或 "timeout"（整轮都没有任何响应，包括无法解析、已停用或屏蔽了账户的机器人）。
+    连续 threshold 次 timeout 后熔断：之后的运行跳过该机器人，只在退避时间（backoff、2×backoff……，
+    不超过 max_backoff）到达时发送一次探测请求，机器人重新响应后恢复正常签到。
+
+    账户自己的请求被 FloodWait 限流时请求根本没有到达机器人，这样的一轮不记录结果（见 note_throttled）。
+    """
+
+    WINDOW = 20
+
+    def __init__(self, path=None, threshold=None, backoff=None, max_backoff=None, clock=time.time):
+        self.path = path
+        self.threshold = threshold if threshold is not None else _env_float('CHECKIN_CIRCUIT_THRESHOLD', 3)
+        self.backoff = backoff if backoff is not None else _env_float('CHECKIN_CIRCUIT_BACKOFF', 3600)
+        self.max_backoff = max_backoff if max_backoff is not None else _env_float('CHECKIN_CIRCUIT_MAX_BACKOFF', 7 * 86400)
+        self.clock = clock
+        self._data = load_json(path, {})
+        self._dirty = False
+        self._throttled = {}
+
+    def _entry(self, bot_username):
+        return self._data.setdefault(bot_key(bot_username), {
+            "recent": [], "timeouts": 0, "probes": 0, "open_until": None, "last_response": None,
+        })
+
+    def note_response(self, bot_username):
+        """机器人有任何响应（消息、编辑或回调结果）时调用。"""
+        self._entry(bot_username)["last_response"] = self.clock()
+        self._dirty = True
+
+    def responded_since(self, bot_username, since):
+        """机器人在 since（time.time() 时间戳）之后是否有过响应。"""
+        entry = self._data.get(bot_key(bot_username))
+        return bool(entry and entry["last_response"] and entry["last_response"] >= since)
+
+    def note_throttled(self, bot_username):
+        """发给机器人的请求因 FloodWait 超过上限而被放弃时调用，只在本次运行中有效。"""
+        self._throttled[bot_key(bot_username)] = self.clock()
+
+    def throttled_since(self, bot_username, since):
+        """发给机器人的请求在 since（time.time() 时间戳）之后是否因 FloodWait 被放弃过。"""
+        throttled = self._throttled.get(bot_key(bot_username))
+        return throttled is not None and throttled >= since
+
+    def state(self, bot_username):
+        """
+        返回机器人的熔断状态。
+
+        Returns:
+            str: HEALTH_CLOSED（正常签到）、HEALTH_OPEN（熔断中，本次跳过）或 HEALTH_PROBE（熔断中，已到探测时间）。
+        """
+        entry = self._data.get(bot_key(bot_username))
+        if not entry or entry["open_until"] is None:
+            return HEALTH_CLOSED
+        return HEALTH_PROBE if self.clock() >= entry["open_until"] else HEALTH_OPEN
+
+    def open_until(self, bot_username):
+        """熔断中的机器人下一次探测的时间戳，未熔断时返回 None。"""
+        entry = self._data.get(bot_key(bot_username))
+        return entry["open_until"] if entry else None
+
+    def score(self, bot_username):
+        """最近结果的健康评分（0~1），没有记录时返回 None。"""
+        entry = self._data.get(bot_key(bot_username))
+        if not entry or not entry["recent"]:
+            return None
+        return sum(HEALTH_WEIGHTS[outcome] for outcome in entry["recent"]) / len(entry["recent"])
+
+    def record(self, bot_username, outcome):
+        """记录一轮签到或一次探测的结果，必要时打开、延长或关闭熔断。"""
+        entry = self._entry(bot_username)
+        entry["recent"].append(outcome)
+        del entry["recent"][:-self.WINDOW]
+        self._dirty = True
+        now = self.clock()
+
+        if outcome != "timeout":
+            if entry["open_until"] is not None:
+                logging.info(f"{bot_username} 重新响应，恢复正常签到。")
+            entry.update(timeouts=0, probes=0, open_until=None)
+            return
+
+        entry["timeouts"] += 1
+        if entry["open_until"] is not None:
+            # 探测失败，退避时间加倍
+            entry["probes"] += 1
+            delay = min(self.backoff * 2 ** entry["probes"], self.max_backoff)
+            entry["open_until"] = now + delay
+            logging.warning(f"{bot_username} 对探测仍无响应，{delay / 3600:.1f} 小时后再次探测。")
+        elif entry["timeouts"] >= self.threshold:
+            entry["probes"] = 0
+            entry["open_until"] = now + self.backoff
+            logging.warning(f"{bot_username} 连续 {entry['timeouts']} 次没有任何响应，暂停签到，"
+                            f"{self.backoff / 3600:.1f} 小时后探测。")
+
+    def save(self):
+        if self._dirty:
+            save_json(self.path, self._data)
+            self._dirty = False
+
+# --- 签到台账 ---
+# 签到日按该时区计算，默认与工作流的定时任务一致（北京时间零点）
+CHECKIN_TIMEZONE = os.environ.get('CHECKIN_TIMEZONE', 'Asia/Shanghai')
+
+def checkin_tz(timezone=None):
+    """
+    返回签到使用的时区（默认 CHECKIN_TIMEZONE）。
+
+    系统缺少时区数据时退回到 UTC+8。
+    """
+    timezone = timezone or CHECKIN_TIMEZONE
+    try:
+        return ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        logging.warning(f"无法加载时区 {timezone}，使用 UTC+8 计算签到日。")
+        return dt.timezone(dt.timedelta(hours=8))
+
+def checkin_day(timezone=None, now=None):
+    """返回当前的签到日（YYYY-MM-DD），按 timezone（默认 CHECKIN_TIMEZONE）计算。"""
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return now.astimezone(checkin_tz(timezone)).strftime("%Y-%m-%d")
+
+class CheckinLedger:
+    """
+    基于 SQLite 的签到台账，按账户、机器人和签到日记录签到结果。
+
+    每个机器人处理完立即提交，因此重新运行或进程中途被终止后，只需要处理当天尚未成功的机器人。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkins ("
+            " account TEXT NOT NULL,"
+            " bot TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (account, bot, day))"
+        )
+        self._conn.commit()
+
+    def done_bots(self, account, day):
+        """返回该账户在签到日已成功签到的机器人（规范化后的用户名）集合。"""
+        rows = self._conn.execute(
+            "SELECT bot FROM checkins WHERE account = ? AND day = ? AND status = 'success'",
+            (account, day)
+        )
+        return {row[0] for row in rows}
+
+    def is_done(self, account, bot_username, day):
+        return bot_key(bot_username) in self.done_bots(account, day)
+
+    def record(self, account, bot_username, success, attempts, day):
+        """记录一次签到结果。当天已经成功的记录不会被之后的失败覆盖。"""
+        self._conn.execute(
+            "INSERT INTO checkins (account, bot, day, status, attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (account, bot, day) DO UPDATE SET"
+            "  status = CASE WHEN checkins.status = 'success' THEN 'success' ELSE excluded.status END,"
+            "  attempts = checkins.attempts + excluded.attempts,"
+            "  updated_at = excluded.updated_at",
+            (account, bot_key(bot_username), day, "success" if success else "failed", attempts, time.time())
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from checkin_state import LatencyTracker, BotHealth, HEALTH_CLOSED, HEALTH_OPEN, HEALTH_PROBE
+
+def test_latency_timeout_uses_default_until_enough_samples():
+    tracker = LatencyTracker(percentile=95, margin=2, floor=3, ceiling=30)
+    for _ in range(LatencyTracker.MIN_SAMPLES - 1):
+        tracker.observe("@slow_bot", 0.5)
+    assert tracker.timeout("@slow_bot", 15.0)[0] == 15.0
+
+def test_latency_timeout_follows_percentile_within_limits():
+    tracker = LatencyTracker(percentile=95, margin=2, floor=3, ceiling=30)
+    for latency in [0.2] * 19 + [6.0]:
+        tracker.observe("@bot", latency)
+    # 20 个样本的 p95 是第 19 个，即 0.2 秒，加余量后仍低于下限
+    assert tracker.timeout("@bot", 15.0)[0] == 3
+
+    for latency in [6.0] * 5:
+        tracker.observe("@bot", latency)
+    assert tracker.timeout("@bot", 15.0)[0] == 8.0
+
+    for _ in range(LatencyTracker.WINDOW):
+        tracker.observe("@bot", 120.0)
+    assert tracker.timeout("@BOT", 15.0)[0] == 30
+
+def test_bot_health_opens_circuit_and_backs_off():
+    now = [1000.0]
+    health = BotHealth(threshold=2, backoff=60, max_backoff=200, clock=lambda: now[0])
+    health.record("@bot", "failure")
+    health.record("@bot", "timeout")
+    assert health.state("@bot") == HEALTH_CLOSED
+    health.record("@bot", "timeout")
+    assert health.state("@bot") == HEALTH_OPEN
+
+    now[0] += 60
+    assert health.state("@bot") == HEALTH_PROBE
+    # 探测失败后退避时间加倍，不超过上限
+    health.record("@bot", "timeout")
+    assert health.open_until("@BOT") == now[0] + 120
+    health.record("@bot", "timeout")
+    assert health.open_until("@bot") == now[0] + 200
+
+    health.record("@bot", "success")
+    assert health.state("@bot") == HEALTH_CLOSED
+    assert health.score("@bot") == (0.5 + 1.0) / 6
+    assert health.score("@other_bot") is None
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+
+import pytest
+from telethon.errors import BotResponseTimeoutError, FloodWaitError
+
+import checkin_state
+import main
+from config_loader import ConfigSet, parse_configs
+from fake_telegram import FakeBot, FakeTelegramClient
+from scheduler import CheckinScheduler
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    """每个测试使用独立的状态目录。"""
+    monkeypatch.setattr(checkin_state, "STATE_DIR", str(tmp_path))
+    return tmp_path
+
+def run_click(bot, button_def, start_command="/start"):
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            return await main.click_button(client, bot.username, button_def, start_command)
+    return asyncio.run(go())
+
+@pytest.mark.parametrize("response", ["alert", "edit", "message"])
+def test_inline_button_outcome(response):
+    """内联按钮的签到结果无论通过弹窗、编辑原消息还是新消息返回，都能被识别"""
+    bot = FakeBot("@inline_bot", response=response, delay=0.01)
+    assert run_click(bot, {"data": "checkin"}) is True
+    assert run_click(bot, "签到") is True
+    assert run_click(bot, [1, 1]) is True
+
+def test_reply_keyboard_button():
+    bot = FakeBot("@reply_bot", keyboard="reply", delay=0.01)
+    assert run_click(bot, "签到") is True
+
+def test_command_only_mode():
+    bot = FakeBot("@command_bot", keyboard=None, delay=0.01, commands={"/sign": "您今天已经签到过了"})
+    assert run_click(bot, None, "/sign") is True
+
+def test_failure_response():
+    bot = FakeBot("@failing_bot", response="edit", result_text="签到失败，请稍后再试", delay=0.01)
+    assert run_click(bot, {"data": "checkin"}) is False
+
+def test_run_checkins_reports_every_bot():
+    """不同机器人并发签到，同一机器人的配置按顺序作为备用"""
+    bots = [
+        FakeBot("@bot_a", delay=0.01),
+        FakeBot("@bot_b", response="edit", delay=0.01),
+        FakeBot("@bot_c", keyboard=None, delay=0.01, commands={"/checkin": "签到成功"}),
+    ]
+    configs = [
+        {"bot_username": "@bot_a", "start_command": "/start", "checkin_button": {"data": "checkin"}},
+        {"bot_username": "@bot_b", "start_command": "/start", "checkin_button": "签到"},
+        {"bot_username": "@bot_c", "start_command": "/sign", "checkin_button": None},
+        {"bot_username": "@bot_c", "start_command": "/checkin", "checkin_button": None},
+        {"bot_username": "@missing_bot", "start_command": "/start", "checkin_button": "签到"},
+    ]
+
+    async def go():
+        async with FakeTelegramClient(bots) as client:
+            return await main.run_checkins(client, configs, concurrency=2, retry_delay=0)
+
+    results = {r["bot_username"]: r for r in asyncio.run(go())}
+    assert list(results) == ["@bot_a", "@bot_b", "@bot_c", "@missing_bot"]
+    assert results["@bot_a"]["success"] and results["@bot_a"]["attempts"] == 1
+    assert results["@bot_b"]["success"]
+    assert results["@bot_c"]["success"] and results["@bot_c"]["attempts"] == 2
+    assert not results["@missing_bot"]["success"] and results["@missing_bot"]["error"]
+
+def test_peer_cache_is_reused_and_invalidated(state_dir, monkeypatch):
+    monkeypatch.setenv("CHECKIN_FORCE", "1")
+    bot = FakeBot("@cached_bot", delay=0.01)
+    configs = [{"bot_username": "@cached_bot", "start_command": "/start", "checkin_button": "签到"}]
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            results = await main.run_checkins(client, configs, retry_delay=0)
+            return results, client.rpc_counts["resolve"]
+
+    assert asyncio.run(go()) == ([{"bot_username": "@cached_bot", "success": True, "attempts": 1, "error": None}], 1)
+    assert asyncio.run(go())[1] == 0
+
+    # access_hash 失效后，Telegram 拒绝缓存的 peer，缓存被清除，下一次尝试重新解析
+    bot.access_hash += 1
+    assert asyncio.run(go()) == ([{"bot_username": "@cached_bot", "success": True, "attempts": 2, "error": None}], 1)
+    assert asyncio.run(go())[1] == 0
+
+def test_learned_strategy_is_tried_first(monkeypatch):
+    """记住实际成功的方法，下次运行直接使用，不再先尝试失败的配置"""
+    monkeypatch.setenv("CHECKIN_FORCE", "1")
+    bot = FakeBot("@learning_bot", keyboard=None, delay=0.01, commands={"/sign": "签到成功"})
+    configs = [
+        {"bot_username": "@learning_bot", "start_command": "/start", "checkin_button": "签到"},
+        {"bot_username": "@learning_bot", "start_command": "/daily", "checkin_button": None},
+    ]
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            results = await main.run_checkins(client, configs, retry_delay=0)
+            return results[0], client.rpc_counts["send_message"]
+
+    first, first_sends = asyncio.run(go())
+    assert first["success"]
+    second, second_sends = asyncio.run(go())
+    assert second["success"] and second["attempts"] == 1
+    assert second_sends == 1 < first_sends
+
+def test_keyboard_replay_skips_start_command(monkeypatch):
+    """回调按钮直接点击上一次的按钮面板，面板失效时改为发送启动命令"""
+    monkeypatch.setenv("CHECKIN_FORCE", "1")
+    bot = FakeBot("@replay_bot", delay=0.01)
+    configs = [{"bot_username": "@replay_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}}]
+
+    async def go(runs):
+        async with FakeTelegramClient([bot]) as client:
+            counts = []
+            for _ in range(runs):
+                before = dict(client.rpc_counts)
+                results = await main.run_checkins(client, configs, retry_delay=0)
+                assert results[0]["success"]
+                counts.append({k: client.rpc_counts[k] - before[k] for k in ("send_message", "callback")})
+            return counts
+
+    first, second = asyncio.run(go(2))
+    assert first == {"send_message": 1, "callback": 1}
+    assert second == {"send_message": 0, "callback": 1}
+
+    # 新的客户端中找不到记住的消息，机器人拒绝回调后按正常流程签到
+    stale, = asyncio.run(go(1))
+    assert stale == {"send_message": 1, "callback": 2}
+
+def test_keyboard_replay_keeps_entry_on_flood_wait(monkeypatch):
+    """回调查询被限流时不遗忘记住的按钮面板，下次运行仍然直接点击"""
+    monkeypatch.setenv("CHECKIN_FORCE", "1")
+    monkeypatch.setenv("CHECKIN_FLOOD_MAX_WAIT", "1")
+    bot = FakeBot("@throttled_bot", delay=0.01)
+    configs = [{"bot_username": "@throttled_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}}]
+    handle_callback = bot.handle_callback
+
+    async def flood_wait(client, request):
+        raise FloodWaitError(request=None, capture=600)
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            runtime = main.get_runtime(client)
+            first = await main.run_checkins(client, configs, retry_delay=0)
+            bot.handle_callback = flood_wait
+            throttled = await main.run_checkins(client, configs, retry_delay=0)
+            entry = runtime.keyboards.get("@throttled_bot")
+            bot.handle_callback = handle_callback
+            sends = client.rpc_counts["send_message"]
+            last = await main.run_checkins(client, configs, retry_delay=0)
+            return first[0], throttled[0], entry, client.rpc_counts["send_message"] - sends, last[0]
+
+    first, throttled, entry, sends, last = asyncio.run(go())
+    assert first["success"] and not throttled["success"]
+    assert entry is not None and entry["data"] == "checkin"
+    assert last["success"] and sends == 0
+
+def test_keyboard_replay_falls_back_on_callback_error(monkeypatch):
+    """回调出错（如机器人不再应答旧消息）时在同一次尝试中发送启动命令，之后仍会直接点击面板"""
+    monkeypatch.setenv("CHECKIN_FORCE", "1")
+    bot = FakeBot("@stale_bot", delay=0.01)
+    configs = [{"bot_username": "@stale_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}}]
+    handle_callback = bot.handle_callback
+
+    async def time_out_once(client, request):
+        bot.handle_callback = handle_callback
+        raise BotResponseTimeoutError(request=request)
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            results = []
+            for patch in (None, time_out_once, None):
+                if patch:
+                    bot.handle_callback = patch
+                sends = client.rpc_counts["send_message"]
+                result = (await main.run_checkins(client, configs, retry_delay=0))[0]
+                results.append((result["success"], result["attempts"], client.rpc_counts["send_message"] - sends))
+            return results
+
+    first, errored, replayed = asyncio.run(go())
+    assert first == (True, 1, 1)
+    assert errored == (True, 1, 1)
+    assert replayed == (True, 1, 0)
+
+def test_rate_limit_wait_does_not_count_against_timeout(monkeypatch):
+    """等待限速令牌的时间不计入响应超时，也不记录为机器人的响应延迟"""
+    monkeypatch.setenv("CHECKIN_RATE_SEND", "10/1")
+    monkeypatch.setenv("CHECKIN_RATE_CALLBACK", "10/1")
+    monkeypatch.setenv("CHECKIN_TIMEOUT_FLOOR", "0.2")
+    monkeypatch.setenv("CHECKIN_TIMEOUT_CEILING", "0.3")
+    bots = [FakeBot(f"@paced_bot_{i}", delay=0.02) for i in range(5)]
+    configs = [{"bot_username": bot.username, "start_command": "/start", "checkin_button": {"data": "checkin"}}
+               for bot in bots]
+
+    async def go():
+        async with FakeTelegramClient(bots) as client:
+            results = await main.run_checkins(client, configs, concurrency=5, retry_delay=0)
+            return results, main.get_runtime(client).latency
+
+    results, latency = asyncio.run(go())
+    assert all(r["success"] for r in results)
+    for bot in bots:
+        assert max(latency._samples[checkin_state.bot_key(bot.username)]) < 0.2
+
+def test_ledger_skips_bots_done_today():
+    """当天已签到成功的机器人在重新运行时被跳过，失败的机器人会被重试"""
+    bots = [FakeBot("@done_bot", delay=0.01), FakeBot("@flaky_bot", result_text="签到失败", delay=0.01)]
+    configs = [
+        {"bot_username": "@done_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}},
+        {"bot_username": "@flaky_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}},
+    ]
+
+    async def go():
+        async with FakeTelegramClient(bots) as client:
+            results = await main.run_checkins(client, configs, retry_delay=0)
+            return {r["bot_username"]: r for r in results}, client.rpc_counts["send_message"]
+
+    first, _ = asyncio.run(go())
+    assert first["@done_bot"]["success"] and not first["@flaky_bot"]["success"]
+
+    bots[1].result_text = "签到成功"
+    second, sends = asyncio.run(go())
+    assert second["@done_bot"].get("skipped") and second["@flaky_bot"]["success"]
+    assert sends == 1
+
+def test_daemon_connects_and_runs_due_bots():
+    """守护进程连接客户端，并立即执行已经错过计划时间的签到"""
+    bot = FakeBot("@daemon_bot", delay=0.01)
+    account = {"name": "default", "concurrency": 1, "bot_configs": [
+        {"bot_username": "@daemon_bot", "start_command": "/start", "checkin_button": "签到"},
+    ]}
+
+    async def go():
+        client = FakeTelegramClient([bot])
+        scheduler = CheckinScheduler(account["bot_configs"], default_time="00:00", default_jitter=0)
+        stop = asyncio.Event()
+        task = asyncio.create_task(main.daemon_loop(client, account, scheduler, stop))
+        ledger = main.get_runtime(client).ledger
+        while not ledger.is_done("default", "@daemon_bot", checkin_state.checkin_day()):
+            await asyncio.sleep(0.01)
+        assert client.is_connected()
+        stop.set()
+        await task
+        return client.rpc_counts["callback"]
+
+    assert asyncio.run(go()) == 1
+
+def test_connect_account_reports_startup_breakdown(caplog):
+    """授权检查后立即开始签到，get_me() 在后台执行，第一次发送时输出启动耗时"""
+    bot = FakeBot("@startup_bot", delay=0.01)
+    account = {"name": "default", "concurrency": 1, "bot_configs": [
+        {"bot_username": "@startup_bot", "start_command": "/start", "checkin_button": "签到"},
+    ]}
+
+    async def go():
+        client = FakeTelegramClient([bot])
+        runtime = await main.connect_account(client, account)
+        results = await main.run_checkins(client, account["bot_configs"])
+        await runtime.me
+        await client.disconnect()
+        return results, runtime.startup
+
+    with caplog.at_level("INFO"):
+        results, startup = asyncio.run(go())
+    assert results[0]["success"] and startup is None
+    assert any("启动耗时" in r.message and "首次发送" in r.message for r in caplog.records)
+    assert any("成功登录" in r.message for r in caplog.records)
+
+def test_circuit_breaker_skips_dead_bot_until_probe_answers(monkeypatch):
+    """连续无响应的机器人被熔断跳过，退避时间到达后只发送一次探测，恢复响应后正常签到"""
+    monkeypatch.setenv("CHECKIN_CIRCUIT_THRESHOLD", "2")
+    monkeypatch.setenv("CHECKIN_CIRCUIT_BACKOFF", "0.5")
+    monkeypatch.setenv("CHECKIN_TIMEOUT_FLOOR", "0.1")
+    monkeypatch.setenv("CHECKIN_TIMEOUT_CEILING", "0.2")
+    bot = FakeBot("@dead_bot", delay=0.01, silent=True)
+    configs = [{"bot_username": "@dead_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}}]
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            results = await main.run_checkins(client, configs, retry_delay=0)
+            return results[0], client.rpc_counts["send_message"]
+
+    for _ in range(2):
+        result, sends = asyncio.run(go())
+        assert not result["success"] and sends == 1
+
+    result, sends = asyncio.run(go())
+    assert result.get("circuit_open") and sends == 0
+
+    time.sleep(0.6)
+    bot.silent = False
+    result, sends = asyncio.run(go())
+    # 一次探测加一次正常签到
+    assert result["success"] and sends == 2
+
+def test_flood_wait_does_not_open_circuit(monkeypatch):
+    """账户的请求被限流时没有到达机器人，不计入机器人的熔断"""
+    monkeypatch.setenv("CHECKIN_CIRCUIT_THRESHOLD", "2")
+    monkeypatch.setenv("CHECKIN_FLOOD_MAX_WAIT", "1")
+    bot = FakeBot("@healthy_bot", delay=0.01)
+    configs = [{"bot_username": "@healthy_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}}]
+
+    async def flood_wait(*args):
+        raise FloodWaitError(request=None, capture=600)
+
+    async def go(method):
+        async with FakeTelegramClient([bot]) as client:
+            setattr(client, method, flood_wait)
+            results = await main.run_checkins(client, configs, retry_delay=0)
+            return results[0], main.get_runtime(client).health.state("@healthy_bot")
+
+    for method in ("get_input_entity", "send_message", "send_message", "send_message"):
+        result, state = asyncio.run(go(method))
+        assert not result["success"] and state == checkin_state.HEALTH_CLOSED
+
+def test_account_settings_reject_malformed_input(monkeypatch, caplog):
+    """格式错误的 TELEGRAM_SESSIONS 和账户参数记录错误或警告，而不是抛出异常"""
+    config_set = ConfigSet("test", parse_configs([{"bot_username": "@bot_a", "start_command": "/start"}]))
+    for value in ['{"a": 1}', '["session"]', '[{"name": "alice"}, 1]']:
+        monkeypatch.setenv("TELEGRAM_SESSIONS", value)
+        assert main.get_accounts(None, config_set) == []
+    monkeypatch.setenv("TELEGRAM_SESSIONS", '[{"name": "alice", "session": "s"}]')
+    assert [a["name"] for a in main.get_accounts(None, config_set)] == ["alice"]
+    monkeypatch.setenv("TELEGRAM_SESSIONS", '[{"name": "a", "concurrency": "3"}, {"name": "b", "concurrency": 0}, '
+                                            '{"name": "c", "concurrency": 2.5}, {"name": "d", "concurrency": 2}]')
+    assert [a["concurrency"] for a in main.get_accounts(None, config_set)] == [None, None, None, 2]
+
+    monkeypatch.setenv("ACCOUNT_CONCURRENCY", "many")
+    monkeypatch.setenv("ACCOUNT_WORKERS", "2.5")
+    assert main.get_account_settings() == (0, 1)
+    assert "ACCOUNT_WORKERS" in caplog.text
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from main import ResponseClassifier, classify_response
+
+def test_global_phrases():
+    assert classify_response("🎉 签到成功，获得 10 积分") is True
+    assert classify_response("您今天已经签到过了") is True
+    assert classify_response("Check-in successful!") is True
+    assert classify_response("签到失败，请稍后再试") is False
+    assert classify_response("Internal ERROR") is False
+    assert classify_response("欢迎使用本机器人") is None
+    assert classify_response("") is None
+
+def test_priority_done_over_success_over_failure():
+    classifier = ResponseClassifier.from_configs()
+    assert classifier.classify("今日已签到，签到奖励已发放")[1:] == ("done", "今日已签")
+    assert classifier.classify("签到成功，但积分发放失败")[1:] == ("success", "签到成功")
+
+def test_bot_phrases_take_precedence():
+    classifier = ResponseClassifier.from_configs([
+        {"bot_username": "@points_bot", "success_keywords": ["领取成功"], "failure_keywords": ["明天再来"]},
+    ])
+    assert classifier.classify("领取成功", "@points_bot")[0] is True
+    # 机器人自己的短语命中时，不再受全局短语 "错误" 的影响
+    assert classifier.classify("今天领过了，明天再来，不要重复点击以免错误", "@Points_Bot")[0] is False
+    assert classifier.classify("领取成功", "@other_bot")[0] is None
+    assert classifier.classify("签到成功", "@points_bot")[0] is True
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+机器人配置的加载和校验。
+
+配置可以写在 bot_configs.py（BOT_CONFIGS / ACCOUNT_BOT_CONFIGS）、bot_configs.toml 或 bot_configs.json 中。
+启动时（连接 Telegram 之前）一次性校验所有配置并转换为 BotConfig：按钮定义解析为 ButtonSpec，
+文本按钮的匹配器和对应的签到方法都预先生成，签到时不再重复判断配置的类型。
+
+TOML 和 JSON 文件的结构相同，bots 对应 BOT_CONFIGS，accounts 对应 ACCOUNT_BOT_CONFIGS:
+
+    [[bots]]
+    bot_username = "@example_bot"
+    start_command = "/start"
+    checkin_button = { data = "checkin" }
+
+    [[accounts.alice]]
+    bot_username = "@alice_only_bot"
+    start_command = "/sign"
+
+JSON 文件也可以直接是一个配置列表。省略 checkin_button 表示仅发送命令。
+"""
+
+import os
+import json
+import importlib.util
+
+from button_matcher import get_button_matcher
+from scheduler import parse_checkin_time, parse_jitter
+
+try:
+    import tomllib
+except ImportError:
+    # Python 3.10 及更早的版本需要安装 tomli
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+CONFIG_BASENAME = "bot_configs"
+# 同时存在多个配置文件时按此顺序选择第一个
+CONFIG_SUFFIXES = (".toml", ".json", ".py")
+KEYWORD_FIELDS = ("success_keywords", "done_keywords", "failure_keywords")
+CONFIG_FIELDS = ("bot_username", "start_command", "checkin_button", "checkin_time", "jitter") + KEYWORD_FIELDS
+
+class ConfigError(ValueError):
+    """机器人配置无效或无法读取，errors 为每一处问题的说明。"""
+
+    def __init__(self, errors):
+        self.errors = [errors] if isinstance(errors, str) else list(errors)
+        super().__init__("\n".join(self.errors))
+
+class ButtonSpec:
+    """
+    解析后的按钮定义。
+
+    kind 与 StrategyStore 中签到方法的类型一致："text"（按文本匹配，matcher 为预先构建的 ButtonMatcher）、
+    "position"（value 为 [行, 列]）或 "callback"（value 为回调数据）。
+    """
+
+    __slots__ = ("kind", "value", "matcher")
+
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+        self.matcher = get_button_matcher(value) if kind == "text" else None
+
+    @classmethod
+    def parse(cls, button_def):
+        """
+        解析配置中的 checkin_button，None（仅发送命令）原样返回。
+
+        Raises:
+            ValueError: 定义的格式不正确时抛出。
+        """
+        if button_def is None or isinstance(button_def, cls):
+            return button_def
+        if isinstance(button_def, str):
+            if not button_def.strip():
+                raise ValueError("checkin_button 不能是空字符串")
+            return cls("text", button_def)
+        if isinstance(button_def, (list, tuple)):
+            if len(button_def) != 2 or not all(type(i) is int and i >= 0 for i in button_def):
+                raise ValueError(f"按位置定义的 checkin_button 应为两个非负整数 [行, 列]: {button_def!r}")
+            return cls("position", list(button_def))
+        if isinstance(button_def, dict):
+            data = button_def.get("data")
+            if set(button_def) != {"data"} or not isinstance(data, str) or not data:
+                raise ValueError(f'按回调数据定义的 checkin_button 应为 {{"data": "回调数据"}}: {button_def!r}')
+            return cls("callback", data)
+        raise ValueError(f"无法识别的 checkin_button: {button_def!r}")
+
+    def to_def(self):
+        """转换回配置文件中的写法。"""
+        if self.kind == "callback":
+            return {"data": self.value}
+        if self.kind == "position":
+            return list(self.value)
+        return self.value
+
+    def __repr__(self):
+        return repr(self.to_def())
+
+class BotConfig:
+    """
+    一条校验过的机器人配置。
+
+    strategy 为这条配置对应的签到方法（StrategyStore 的格式）。get() 按配置字典的字段名读取，
+    同时接受原始字典和 BotConfig 的代码（如 CheckinScheduler、ResponseClassifier.from_configs）不需要区分。
+    """
+
+    __slots__ = ("bot_username", "start_command", "button", "strategy", "checkin_time", "jitter") + KEYWORD_FIELDS
+
+    def __init__(self, bot_username, start_command, checkin_button=None, checkin_time=None, jitter=None,
+                 success_keywords=(), done_keywords=(), failure_keywords=()):
+        self.bot_username = bot_username
+        self.start_command = start_command
+        self.button = ButtonSpec.parse(checkin_button)
+        self.checkin_time = checkin_time
+        self.jitter = jitter
+        self.success_keywords = tuple(success_keywords or ())
+        self.done_keywords = tuple(done_keywords or ())
+        self.failure_keywords = tuple(failure_keywords or ())
+
+        if self.button is None:
+            self.strategy = {"kind": "command", "value": start_command, "start_command": None}
+        else:
+            self.strategy = {"kind": self.button.kind, "value": self.button.value, "start_command": start_command}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        校验并转换一条 BOT_CONFIGS 格式的配置字典。
+
+        Raises:
+            ValueError: 配置无效时抛出，说明第一处问题。
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"配置应为字典，实际为 {type(data).__name__}")
+        unknown = [field for field in data if field not in CONFIG_FIELDS]
+        if unknown:
+            raise ValueError(f"未知的字段 {', '.join(map(repr, unknown))}")
+        for field in ("bot_username", "start_command"):
+            value = data.get(field)
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"缺少 {field} 或不是非空字符串")
+
+        checkin_time = data.get("checkin_time")
+        if checkin_time is not None:
+            parse_checkin_time(checkin_time)
+        jitter = data.get("jitter")
+        if jitter is not None:
+            parse_jitter(jitter)
+        for field in KEYWORD_FIELDS:
+            phrases = data.get(field)
+            if phrases is not None and (not isinstance(phrases, (list, tuple)) or not all(isinstance(p, str) for p in phrases)):
+                raise ValueError(f"{field} 应为字符串列表")
+
+        return cls(**data)
+
+    def get(self, field, default=None):
+        """按配置字典的字段名读取。"""
+        if field == "checkin_button":
+            value = self.button.to_def() if self.button else None
+        elif field in CONFIG_FIELDS:
+            value = getattr(self, field)
+        else:
+            value = None
+        return default if value is None else value
+
+    def to_dict(self):
+        """转换回 BOT_CONFIGS 格式的字典，省略未设置的可选字段。"""
+        data = {"bot_username": self.bot_username, "start_command": self.start_command,
+                "checkin_button": self.button.to_def() if self.button else None}
+        for field in ("checkin_time", "jitter") + KEYWORD_FIELDS:
+            value = getattr(self, field)
+            if value is not None and value != ():
+                data[field] = list(value) if isinstance(value, tuple) else value
+        return data
+
+    def __repr__(self):
+        return f"BotConfig({self.to_dict()!r})"
+
+def parse_configs(entries, label="BOT_CONFIGS"):
+    """
+    校验并转换一组配置。
+
+    Returns:
+        list: BotConfig 列表。
+
+    Raises:
+        ConfigError: 任意一条配置无效时抛出，包含所有无效配置的说明。
+    """
+    if not isinstance(entries, (list, tuple)):
+        raise ConfigError(f"{label} 应为配置列表")
+    configs, errors = [], []
+    for index, entry in enumerate(entries, 1):
+        try:
+            configs.append(BotConfig.from_dict(entry))
+        except (TypeError, ValueError) as e:
+            bot_username = entry.get("bot_username") if isinstance(entry, dict) else None
+            errors.append(f"{label} 第 {index} 条配置{f'（{bot_username}）' if bot_username else ''}: {e}")
+    if errors:
+        raise ConfigError(errors)
+    return configs
+
+class ConfigSet:
+    """从一个配置文件加载的所有配置：默认配置（BOT_CONFIGS）和各账户专属的配置。"""
+
+    __slots__ = ("source", "default", "accounts")
+
+    def __init__(self, source, default, accounts=None):
+        self.source = source
+        self.default = default
+        self.accounts = accounts or {}
+
+    def for_account(self, account=None):
+        """返回账户使用的配置：有专属配置时使用专属配置，否则使用默认配置。"""
+        return self.accounts.get(account, self.default) if account else self.default
+
+    def all(self):
+        """依次产生所有配置。"""
+        yield from self.default
+        for configs in self.accounts.values():
+            yield from configs
+
+    def __len__(self):
+        return len(self.default) + sum(len(configs) for configs in self.accounts.values())
+
+def find_config_file(directory="."):
+    """返回要加载的配置文件：优先使用 BOT_CONFIGS_FILE，否则依次查找 bot_configs.toml / .json / .py。"""
+    path = os.environ.get('BOT_CONFIGS_FILE')
+    if path:
+        return path
+    for suffix in CONFIG_SUFFIXES:
+        path = os.path.join(directory, CONFIG_BASENAME + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def read_config_file(path):
+    """
+    读取配置文件中的原始配置。
+
+    Returns:
+        tuple: (默认配置列表, {账户名: 配置列表})
+
+    Raises:
+        ConfigError: 文件无法读取或格式不正确时抛出。
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    try:
+        if suffix == ".py":
+            spec = importlib.util.spec_from_file_location(CONFIG_BASENAME, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return getattr(module, 'BOT_CONFIGS', []), getattr(module, 'ACCOUNT_BOT_CONFIGS', {})
+        if suffix == ".toml":
+            if tomllib is None:
+                raise ConfigError(f"读取 {path} 需要 Python 3.11 或安装 tomli: pip install tomli")
+            with open(path, 'rb') as f:
+                data = tomllib.load(f)
+        elif suffix == ".json":
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                return data, {}
+        else:
+            raise ConfigError(f"不支持的配置文件格式: {path}")
+    except ConfigError:
+        raise
+    except Exception as e:
+        # 配置文件中的语法错误等都在启动时报告
+        raise ConfigError(f"无法读取配置文件 {path}: {e}") from e
+
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} 的顶层应为包含 bots 和 accounts 的对象")
+    return data.get("bots", []), data.get("accounts", {})
+
+def load_config_set(path=None):
+    """
+    加载并校验所有机器人配置。
+
+    Args:
+        path: 配置文件路径，默认由 find_config_file() 决定。
+
+    Returns:
+        ConfigSet: 加载的配置。
+
+    Raises:
+        ConfigError: 找不到配置文件，或有任何一条配置无效时抛出，包含所有问题的说明。
+    """
+    path = path or find_config_file()
+    if not path or not os.path.exists(path):
+        raise ConfigError(f"找不到机器人配置文件（{CONFIG_BASENAME}.toml / .json / .py）: {path or '当前目录'}")
+
+    default_entries, account_entries = read_config_file(path)
+    if not isinstance(account_entries, dict):
+        raise ConfigError(f"{path} 中的账户配置应为 {{账户名: 配置列表}}")
+
+    # 收集所有配置的问题后一起报告，不用每修正一处就重新运行一次
+    errors = []
+
+    def parse(entries, label):
+        try:
+            return parse_configs(entries, label)
+        except ConfigError as e:
+            errors.extend(e.errors)
+            return []
+
+    default = parse(default_entries, "BOT_CONFIGS")
+    accounts = {str(name): parse(entries, f"账户 {name} 的配置") for name, entries in account_entries.items()}
+    if errors:
+        raise ConfigError([f"{path}:"] + errors)
+    return ConfigSet(path, default, accounts)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import pickle
+import time
+
+import pytest
+
+from config_loader import BotConfig, ConfigError, load_config_set
+from fake_telegram import FakeBot, FakeMessage
+from main import find_button, plan_attempts
+from checkin_state import StrategyStore
+
+TOML_CONFIGS = '''
+[[bots]]
+bot_username = "@example_bot"
+start_command = "/start"
+checkin_button = { data = "checkin" }
+
+[[bots]]
+bot_username = "@example_bot"
+start_command = "/sign"
+
+[[accounts.alice]]
+bot_username = "@alice_bot"
+start_command = "/start"
+checkin_button = [1, 1]
+checkin_time = "08:30"
+success_keywords = ["领取成功"]
+'''
+
+def test_toml_and_json_configs(tmp_path):
+    path = tmp_path / "bot_configs.toml"
+    path.write_text(TOML_CONFIGS, encoding='utf-8')
+    config_set = load_config_set(str(path))
+    assert len(config_set) == 3
+    callback, command = config_set.for_account("bob")
+    assert callback.strategy == {"kind": "callback", "value": "checkin", "start_command": "/start"}
+    assert command.button is None and command.strategy["kind"] == "command"
+
+    alice = config_set.for_account("alice")[0]
+    assert alice.get("checkin_button") == [1, 1] and alice.get("checkin_time") == "08:30"
+    assert alice.success_keywords == ("领取成功",)
+
+    # JSON 文件可以直接是配置列表，结果与 TOML 相同
+    json_path = tmp_path / "bot_configs.json"
+    json_path.write_text(json.dumps([c.to_dict() for c in config_set.default]), encoding='utf-8')
+    assert [c.strategy for c in load_config_set(str(json_path)).default] == [callback.strategy, command.strategy]
+
+def test_invalid_configs_are_all_reported(tmp_path):
+    path = tmp_path / "bot_configs.py"
+    path.write_text('''
+BOT_CONFIGS = [
+    {"bot_username": "@ok_bot", "start_command": "/start", "checkin_button": "签到"},
+    {"bot_username": "@typo_bot", "start_comand": "/start", "checkin_button": "签到"},
+    {"bot_username": "@position_bot", "start_command": "/start", "checkin_button": [1, 2, 3]},
+]
+ACCOUNT_BOT_CONFIGS = {"alice": [{"bot_username": "@late_bot", "start_command": "/start", "checkin_time": "25:00"}]}
+''', encoding='utf-8')
+    with pytest.raises(ConfigError) as excinfo:
+        load_config_set(str(path))
+    errors = excinfo.value.errors
+    assert len(errors) == 4
+    assert "@typo_bot" in errors[1] and "start_comand" in errors[1]
+    assert "@position_bot" in errors[2] and "@late_bot" in errors[3]
+
+def test_precompiled_config_finds_button_and_pickles():
+    config = BotConfig.from_dict({"bot_username": "@fake_bot", "start_command": "/start", "checkin_button": "签到"})
+    bot = FakeBot("@fake_bot")
+    message = FakeMessage(1, bot.user_id, bot.user_id, "菜单", reply_markup=bot.reply_markup())
+    assert find_button(message, config.button).text == "🎯 签到"
+    assert find_button(message, BotConfig("@fake_bot", "/start", [1, 0]).button).text == "🎁 邀请"
+
+    # 多账户在工作进程中运行时配置需要能被序列化
+    restored = pickle.loads(pickle.dumps(config))
+    assert restored.strategy == config.strategy and find_button(message, restored.button).text == "🎯 签到"
+
+def test_learned_strategy_matches_loaded_config():
+    configs = [BotConfig("@bot", "/start", [0, 1]), BotConfig("@bot", "/start", "签到")]
+    strategies = StrategyStore()
+    strategies.record_success("@bot", configs[1].strategy)
+    assert [c.strategy for c in plan_attempts("@bot", configs, strategies)] == [configs[1].strategy, configs[0].strategy]
+
+def test_large_config_set_loads_quickly(tmp_path):
+    entries = [{"bot_username": f"@bot_{i}", "start_command": "/start", "checkin_button": f"签到 {i % 50}"}
+               for i in range(5000)]
+    path = tmp_path / "bot_configs.json"
+    path.write_text(json.dumps({"bots": entries, "accounts": {"alice": entries[:1000]}}), encoding='utf-8')
+    started = time.perf_counter()
+    config_set = load_config_set(str(path))
+    assert len(config_set) == 6000 and time.perf_counter() - started < 1.0
+    assert not hasattr(config_set.default[0], "__dict__")
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线测试用的 Telegram 替身。
+
+FakeTelegramClient 在进程内实现了 main.py 用到的那一小部分 TelegramClient 接口：
+send_message、get_messages、用于 GetBotCallbackAnswerRequest 的 __call__、on /
+add_event_handler / remove_event_handler、get_me 以及实体解析。FakeBot 是可脚本化的机器人，
+可以按配置的延迟回复内联键盘或回复键盘，并通过弹窗、编辑原消息或发送新消息返回签到结果。
+
+直接运行本文件会在没有网络的情况下模拟一次多机器人签到并输出耗时：
+    python fake_telegram.py --bots 100 --concurrency 20 --delay 0.2
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import itertools
+from types import SimpleNamespace
+
+from telethon import utils
+from telethon.events import NewMessage, MessageEdited
+from telethon.errors.rpcerrorlist import MessageIdInvalidError, DataInvalidError, PeerIdInvalidError
+from telethon.tl.types import (
+    InputPeerUser, ReplyInlineMarkup, ReplyKeyboardMarkup, KeyboardButtonRow,
+    KeyboardButtonCallback, KeyboardButton
+)
+from telethon.tl.types.messages import BotCallbackAnswer
+from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+
+class FakeMessage:
+    """精简的消息对象，只包含 main.py 用到的属性。"""
+
+    def __init__(self, id, chat_id, sender_id, text, out=False, reply_markup=None):
+        self.id = id
+        self.chat_id = chat_id
+        self.sender_id = sender_id
+        self.text = self.message = self.raw_text = text
+        self.out = out
+        self.reply_markup = reply_markup
+        self.date = time.time()
+
+    def __repr__(self):
+        return f"FakeMessage(id={self.id}, text={self.text!r})"
+
+class FakeBot:
+    """
+    可脚本化的假机器人。
+
+    Args:
+        username: 机器人用户名，例如 "@fake_bot"。
+        keyboard: "inline"（回调按钮）、"reply"（回复键盘）或 None（不返回按钮）。
+        buttons: 按钮文本的二维列表。
+        checkin_button: 执行签到的按钮文本。
+        response: 内联按钮签到结果的返回方式，"alert"、"edit" 或 "message"。
+        result_text: 签到结果文本。
+        delay: 每次回复前的延迟秒数，可以是 (最小值, 最大值) 元组表示随机延迟。
+        start_command: 返回按钮面板的命令。
+        commands: {命令: 回复文本}，用于模拟直接签到命令。
+        silent: 为 True 时机器人从不回复（模拟失效的机器人）。
+    """
+
+    _ids = itertools.count(7000000001)
+
+    def __init__(self, username, *, keyboard="inline", buttons=None, checkin_button="🎯 签到",
+                 response="alert", result_text="签到成功，获得 10 积分", delay=0.2,
+                 start_command="/start", commands=None, silent=False):
+        self.username = username if username.startswith('@') else f"@{username}"
+        self.user_id = next(self._ids)
+        self.access_hash = self.user_id * 31
+        self.keyboard = keyboard
+        self.buttons = buttons or [["💰 余额", "📢 公告"], ["🎁 邀请", checkin_button]]
+        self.checkin_button = checkin_button
+        self.response = response
+        self.result_text = result_text
+        self.delay = delay
+        self.start_command = start_command
+        self.commands = commands or {}
+        self.silent = silent
+
+    def callback_data(self, text):
+        """按钮文本对应的回调数据，签到按钮固定为 b"checkin"。"""
+        if text == self.checkin_button:
+            return b"checkin"
+        return f"btn_{abs(hash(text)) % 10000}".encode()
+
+    def reply_markup(self):
+        if self.keyboard == "inline":
+            return ReplyInlineMarkup(rows=[
+                KeyboardButtonRow(buttons=[KeyboardButtonCallback(text=t, data=self.callback_data(t)) for t in row])
+                for row in self.buttons
+            ])
+        if self.keyboard == "reply":
+            return ReplyKeyboardMarkup(rows=[
+                KeyboardButtonRow(buttons=[KeyboardButton(text=t) for t in row])
+                for row in self.buttons
+            ])
+        return None
+
+    async def wait(self):
+        delay = random.uniform(*self.delay) if isinstance(self.delay, tuple) else self.delay
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def handle_text(self, client, text):
+        """处理用户发来的文本消息。"""
+        if self.silent:
+            return
+        await self.wait()
+        if text == self.start_command:
+            client.bot_send(self, "欢迎使用，请选择操作：", self.reply_markup())
+        elif self.keyboard == "reply" and text == self.checkin_button:
+            client.bot_send(self, self.result_text)
+        elif text in self.commands:
+            client.bot_send(self, self.commands[text])
+        else:
+            client.bot_send(self, "未知命令，请使用 /start")
+
+    async def handle_callback(self, client, request):
+        """处理回调查询，返回 BotCallbackAnswer。"""
+        message = client.find_message(self, request.msg_id)
+        if message is None:
+            raise MessageIdInvalidError(request)
+        if self.silent:
+            # 真实的 Telegram 会在机器人不应答时让回调请求超时
+            await asyncio.sleep(3600)
+        await self.wait()
+        if request.data != b"checkin":
+            return BotCallbackAnswer(cache_time=0, message="暂不支持该操作")
+        if not message.reply_markup:
+            raise DataInvalidError(request)
+
+        if self.response == "alert":
+            return BotCallbackAnswer(cache_time=0, alert=True, message=self.result_text)
+        if self.response == "edit":
+            client.bot_edit(self, message, self.result_text)
+        else:
+            client.bot_send(self, self.result_text)
+        return BotCallbackAnswer(cache_time=0)
+
+class FakeEvent:
+    """事件处理器收到的事件对象。"""
+
+    def __init__(self, message, chat):
+        self.message = message
+        self.chat_id = message.chat_id
+        self.sender_id = message.sender_id
+        self.is_private = True
+        self.out = message.out
+        self.text = self.raw_text = message.text
+        self.chat = chat
+
+    async def get_chat(self):
+        return self.chat
+
+class FakeTelegramClient:
+    """
+    TelegramClient 的进程内替身，可以与 main.py 中的签到逻辑一起使用。
+
+    rpc_counts 统计各类模拟 RPC 的调用次数，便于对比不同实现发出的请求数量。
+    """
+
+    def __init__(self, bots, me=None):
+        self.bots = {bot.username.lower(): bot for bot in bots}
+        self.bots_by_id = {bot.user_id: bot for bot in bots}
+        self.me = me or SimpleNamespace(id=1000, first_name="Fake", username="fake_user")
+        self.chats = {bot.user_id: [] for bot in bots}
+        self.handlers = []
+        self.rpc_counts = {"send_message": 0, "get_messages": 0, "callback": 0, "resolve": 0}
+        self._message_ids = itertools.count(1)
+        self._tasks = set()
+        self._connected = False
+
+    # --- 连接 ---
+    async def connect(self):
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+        for task in list(self._tasks):
+            task.cancel()
+
+    def is_connected(self):
+        return self._connected
+
+    async def is_user_authorized(self):
+        return True
+
+    async def start(self):
+        await self.connect()
+        return self
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args):
+        await self.disconnect()
+
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+
+    async def get_me(self):
+        return self.me
+
+    # --- 实体解析 ---
+    def _bot(self, entity):
+        if isinstance(entity, InputPeerUser):
+            bot = self.bots_by_id.get(entity.user_id)
+            if bot is None or bot.access_hash != entity.access_hash:
+                raise PeerIdInvalidError(None)
+            return bot
+        if isinstance(entity, int):
+            bot = self.bots_by_id.get(entity)
+        else:
+            bot = self.bots.get(f"@{str(entity).lstrip('@')}".lower())
+        if bot is None:
+            raise ValueError(f'No user has "{entity}" as username')
+        return bot
+
+    async def get_input_entity(self, entity):
+        if isinstance(entity, InputPeerUser):
+            return entity
+        self.rpc_counts["resolve"] += 1
+        bot = self._bot(entity)
+        return InputPeerUser(user_id=bot.user_id, access_hash=bot.access_hash)
+
+    async def get_entity(self, entity):
+        bot = self._bot(entity)
+        return SimpleNamespace(id=bot.user_id, username=bot.username.lstrip('@'), bot=True)
+
+    async def get_peer_id(self, entity):
+        return utils.get_peer_id(await self.get_input_entity(entity))
+
+    # --- 事件处理器 ---
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append((callback, event or NewMessage()))
+
+    def on(self, event):
+        def decorator(callback):
+            self.add_event_handler(callback, event)
+            return callback
+        return decorator
+
+    def remove_event_handler(self, callback, event=None):
+        before = len(self.handlers)
+        self.handlers = [
+            (cb, ev) for cb, ev in self.handlers
+            if not (cb == callback and (event is None or ev is event))
+        ]
+        return before - len(self.handlers)
+
+    def _matches_users(self, users, bot):
+        if users is None:
+            return True
+        if not isinstance(users, (list, tuple, set)):
+            users = [users]
+        for user in users:
+            if user == bot.user_id or (isinstance(user, str) and user.lstrip('@').lower() == bot.username.lstrip('@').lower()):
+                return True
+        return False
+
+    def _dispatch(self, kind, message, bot):
+        chat = SimpleNamespace(id=bot.user_id, username=bot.username.lstrip('@'))
+        for callback, builder in list(self.handlers):
+            if kind == "edit" and not isinstance(builder, MessageEdited):
+                continue
+            if kind == "message" and (type(builder) is not NewMessage):
+                continue
+            if builder.incoming and message.out:
+                continue
+            if builder.outgoing and not message.out:
+                continue
+            if not message.out and not self._matches_users(builder.from_users, bot):
+                continue
+            if not self._matches_users(builder.chats, bot):
+                continue
+            self._spawn(callback(FakeEvent(message, chat)))
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # --- 机器人使用的接口 ---
+    def bot_send(self, bot, text, reply_markup=None):
+        message = FakeMessage(next(self._message_ids), bot.user_id, bot.user_id, text, reply_markup=reply_markup)
+        self.chats[bot.user_id].append(message)
+        self._dispatch("message", message, bot)
+        return message
+
+    def bot_edit(self, bot, message, text):
+        message.text = message.message = message.raw_text = text
+        self._dispatch("edit", message, bot)
+
+    def find_message(self, bot, message_id):
+        return next((m for m in self.chats[bot.user_id] if m.id == message_id), None)
+
+    # --- 用户使用的接口 ---
+    async def send_message(self, entity, text):
+        self.rpc_counts["send_message"] += 1
+        bot = self._bot(entity)
+        message = FakeMessage(next(self._message_ids), bot.user_id, self.me.id, text, out=True)
+        self.chats[bot.user_id].append(message)
+        self._dispatch("message", message, bot)
+        self._spawn(bot.handle_text(self, text))
+        return message
+
+    async def get_messages(self, entity, limit=1):
+        self.rpc_counts["get_messages"] += 1
+        bot = self._bot(entity)
+        return list(reversed(self.chats[bot.user_id][-limit:]))
+
+    async def __call__(self, request):
+        if isinstance(request, GetBotCallbackAnswerRequest):
+            self.rpc_counts["callback"] += 1
+            return await self._bot(request.peer).handle_callback(self, request)
+        raise NotImplementedError(f"FakeTelegramClient 不支持 {type(request).__name__}")
+
+def build_fleet(count, delay):
+    """生成 count 个不同类型的假机器人及对应的 BOT_CONFIGS。"""
+    kinds = [
+        ("inline", "alert", {"data": "checkin"}),
+        ("inline", "edit", "签到"),
+        ("inline", "message", [1, 1]),
+        ("reply", "message", "签到"),
+        (None, "message", None),
+    ]
+    bots, configs = [], []
+    for i in range(count):
+        keyboard, response, button_def = kinds[i % len(kinds)]
+        username = f"@fake_bot_{i}"
+        if keyboard is None:
+            bots.append(FakeBot(username, keyboard=None, delay=delay, commands={"/sign": "今日已签到"}))
+            configs.append({"bot_username": username, "start_command": "/sign", "checkin_button": None})
+        else:
+            bots.append(FakeBot(username, keyboard=keyboard, response=response, delay=delay))
+            configs.append({"bot_username": username, "start_command": "/start", "checkin_button": button_def})
+    return bots, configs
+
+# 模拟时使用的限速：足够宽松，使结果反映签到引擎本身的延迟而不是生产环境的请求限速
+SIMULATION_RATE = "10000/10000"
+
+async def simulate(count, concurrency, delay, verbose=False, rate=SIMULATION_RATE):
+    """
+    Args:
+        rate: 各类请求使用的限速（"每秒请求数/突发上限"），为 None 时使用 CHECKIN_RATE_* 或生产环境的默认限速。
+    """
+    import main
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if rate:
+        for budget in ("SEND", "READ", "CALLBACK"):
+            os.environ[f'CHECKIN_RATE_{budget}'] = rate
+
+    bots, configs = build_fleet(count, delay)
+    client = FakeTelegramClient(bots)
+    async with client:
+        started = time.perf_counter()
+        results = await main.run_checkins(client, configs, concurrency=concurrency, retry_delay=0)
+        elapsed = time.perf_counter() - started
+
+    succeeded = sum(1 for r in results if r["success"])
+    print(f"\n模拟签到: {count} 个机器人, 并发 {concurrency}, 机器人延迟 {delay}")
+    print(f"成功 {succeeded} / {len(results)}, 总耗时 {elapsed:.2f} 秒, 平均每个机器人 {elapsed / max(count, 1):.3f} 秒")
+    print(f"RPC 次数: {client.rpc_counts}")
+    return results, elapsed
+
+def parse_delay(value):
+    if ',' in value:
+        low, high = value.split(',', 1)
+        return (float(low), float(high))
+    return float(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用假 Telegram 客户端离线模拟多机器人签到")
+    parser.add_argument("--bots", type=int, default=100, help="机器人数量")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发上限")
+    parser.add_argument("--delay", type=parse_delay, default=0.2, help="机器人回复延迟秒数，或 '最小值,最大值'")
+    parser.add_argument("--rate", default=SIMULATION_RATE,
+                        help="模拟使用的限速（每秒请求数/突发上限），'default' 表示使用 CHECKIN_RATE_* 或生产环境的默认限速")
+    parser.add_argument("--verbose", action="store_true", help="输出签到过程的 INFO 日志")
+    args = parser.parse_args()
+
+    # 模拟运行不应读写真实的状态目录
+    os.environ.setdefault('CHECKIN_STATE_DIR', tempfile.mkdtemp(prefix="fake_checkin_"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    rate = None if args.rate == "default" else args.rate
+    asyncio.run(simulate(args.bots, args.concurrency, args.delay, args.verbose, rate))
@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import re
+from types import SimpleNamespace
+
+from main import ButtonMatcher, KeyboardIndex, describe_message, find_button, fuzzy_text_match
 
 # 设置日志格式
 logging.basicConfig(
@@ -11,97 +13,96 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-def fuzzy_text_match(text1, text2):
-    """
-    实现模糊文本匹配，忽略大小写、空格、标点符号和表情符号前后的差异
-    
-    Args:
-        text1: 第一个文本字符串
-        text2: 第二个文本字符串
-    
-    Returns:
-        bool: 如果两个字符串模糊匹配则返回True
-    """
-    if not text1 or not text2:
-        return False
-    
-    # 原始文本记录
-    original_text1 = text1
-    original_text2 = text2
-    
-    # 将两个字符串都转为小写
-    text1 = text1.lower()
-    text2 = text2.lower()
-    
-    # 去除常见标点符号和空白
-    pattern = r'[\s.,，。:：;；!！?？_\-—～~()]'
-    text1 = re.sub(pattern, '', text1)
-    text2 = re.sub(pattern, '', text2)
-    
-    # 清除表情符号和其他特殊字符
-    emoji_pattern = r'[\U00010000-\U0010ffff]'
-    text1 = re.sub(emoji_pattern, '', text1, flags=re.UNICODE)
-    text2 = re.sub(emoji_pattern, '', text2, flags=re.UNICODE)
-    
-    # 基础检查：一个字符串是否包含在另一个字符串中
-    base_match = text1 in text2 or text2 in text1
-    
-    # 如果基础检查失败，进行关键词匹配
-    if not base_match:
-        # 签到关键词匹配
-        checkin_keywords = ["签到", "打卡", "checkin", "check", "签", "到"]
-        
-        # 提取文本中的关键词
-        text1_keywords = [kw for kw in checkin_keywords if kw in text1]
-        text2_keywords = [kw for kw in checkin_keywords if kw in text2]
-        
-        # 如果两边都有共同的签到关键词，认为匹配成功
-        keyword_match = bool(set(text1_keywords) & set(text2_keywords))
-        
-        result = keyword_match
-    else:
-        result = base_match
-    
-    if result:
-        print(f"模糊匹配成功: '{original_text1}' 与 '{original_text2}'")
-        print(f"  处理后: '{text1}' 与 '{text2}'")
-    else:
-        print(f"模糊匹配失败: '{original_text1}' 与 '{original_text2}'")
-        print(f"  处理后: '{text1}' 与 '{text2}'")
-    
-    return result
+TEST_CASES = [
+    # 按钮定义, 按钮实际文本, 预期结果
+    ("签到", "🎯 签到", True),
+    ("签到", "每日签到", True),
+    ("签到", "签 到", True),
+    ("签到", "签.到", True),
+    ("签到", "点击签到", True),
+    ("签到", "登录", False),
+    ("签到", "📅 到期提醒", False),
+    ("check in", "Check-In", True),
+    ("check in", "Daily Check In", True),
+    ("check in", "登录", False),
+    ("签  到", "🎯 签到", True),
+    ("每日签到", "🎯 签到", True),
+    ("打卡", "签到打卡", True),
+    ("打卡", "打卡签到", True),
+    ("打卡", "每日打卡", True),
+]
 
 def test_fuzzy_match():
     """测试模糊匹配功能"""
     print("开始测试模糊匹配功能...")
-    
-    test_cases = [
-        # 按钮定义, 按钮实际文本, 预期结果
-        ("签到", "🎯 签到", True),
-        ("签到", "每日签到", True),
-        ("签到", "签 到", True),
-        ("签到", "签.到", True),
-        ("签到", "点击签到", True),
-        ("签到", "登录", False),
-        ("check in", "Check-In", True),
-        ("check in", "Daily Check In", True),
-        ("check in", "登录", False),
-        ("签  到", "🎯 签到", True),
-        ("每日签到", "🎯 签到", True),
-        ("打卡", "签到打卡", True),
-        ("打卡", "打卡签到", True),
-        ("打卡", "每日打卡", True),
-    ]
-    
-    for i, (button_def, button_text, expected) in enumerate(test_cases):
+    failures = []
+
+    for i, (button_def, button_text, expected) in enumerate(TEST_CASES):
         print(f"\n测试案例 {i+1}:")
         result = fuzzy_text_match(button_def, button_text)
         if result == expected:
             print(f"✅ 测试通过: '{button_def}' 与 '{button_text}' {'匹配' if expected else '不匹配'}")
         else:
             print(f"❌ 测试失败: '{button_def}' 与 '{button_text}' {'应该匹配' if expected else '不应该匹配'}")
-    
+            failures.append((button_def, button_text))
+
     print("\n模糊匹配功能测试完成")
+    assert not failures, f"模糊匹配结果不符合预期: {failures}"
+
+def test_best_button_ranking():
+    """测试按置信度选择按钮，而不是第一个勉强匹配的按钮"""
+    buttons = [SimpleNamespace(text=text) for text in ["📅 到期提醒", "签", "🎯 每日签到", "登录"]]
+
+    button, confidence = ButtonMatcher("签到").best(buttons)
+    assert button.text == "🎯 每日签到"
+    assert 0 < confidence < ButtonMatcher.EXACT
+
+    button, confidence = ButtonMatcher("签到").best(buttons + [SimpleNamespace(text="签到")])
+    assert button.text == "签到"
+    assert confidence == ButtonMatcher.EXACT
+
+    # 只有单字关键词相同的按钮置信度很低，可以通过 min_confidence 排除
+    assert ButtonMatcher("签到", min_confidence=0.3).best(buttons[:1]) == (None, 0.0)
+    assert ButtonMatcher("签到").best([SimpleNamespace(text="登录")]) == (None, 0.0)
+
+def test_keyboard_index_lookups():
+    """同一个面板索引支持按位置、回调数据和文本查找，结果与逐个打分一致"""
+    def button(text, data=None):
+        return SimpleNamespace(text=text, data=data) if data is not None else SimpleNamespace(text=text)
+    rows = [
+        SimpleNamespace(buttons=[button("💰 余额", b"balance"), button("\u200b", b"\xff\xfe")]),
+        SimpleNamespace(buttons=[button("签 到", b"checkin"), button("签到"), button("🎯 每日签到", b"checkin")]),
+    ]
+    message = SimpleNamespace(id=1, text="菜单", reply_markup=SimpleNamespace(rows=rows))
+    keyboard = KeyboardIndex(message.reply_markup)
+
+    assert len(keyboard) == 5
+    assert keyboard.at(1, 2).text == "🎯 每日签到" and keyboard.at(2, 0) is None
+    # 相同回调数据取第一个按钮，无法解码的回调数据被忽略
+    assert keyboard.find_data("checkin").text == "签 到" and keyboard.decoded[1] is None
+    for target in ["签到", "签.到", "每日签到", "余额", "打卡"]:
+        matcher = ButtonMatcher(target)
+        assert keyboard.find_text(matcher) == matcher.best(keyboard.buttons)
+    assert keyboard.position_of(keyboard.find_data("balance")) == [0, 0]
+    assert keyboard.find_text(ButtonMatcher("签.到")) == (keyboard.at(1, 0), ButtonMatcher.NORMALIZED_EXACT)
+
+    assert find_button(message, [1, 1], keyboard).text == "签到"
+    assert find_button(message, "每日签到", keyboard).text == "🎯 每日签到"
+    assert find_button(message, {"data": "checkin"}, keyboard).text == "签 到"
+    buttons = describe_message(message, keyboard)["按钮"]
+    assert buttons[2] == {"类型": "SimpleNamespace", "文本": "签 到", "数据": "checkin", "位置": [1, 0]}
+
+def test_find_button_ignores_single_character_matches():
+    """只有单字关键词相同的按钮不会被当作签到按钮"""
+    def message(*texts):
+        rows = [SimpleNamespace(buttons=[SimpleNamespace(text=text) for text in texts])]
+        return SimpleNamespace(id=1, text="菜单", reply_markup=SimpleNamespace(rows=rows))
+
+    assert find_button(message("📅 到期提醒", "💰 余额"), "签到") is None
+    assert find_button(message("📅 到期提醒", "✍️ 签 到"), "签到").text == "✍️ 签 到"
 
 if __name__ == "__main__":
-    test_fuzzy_match() 
\ No newline at end of file
+    test_fuzzy_match()
+    test_best_button_ranking()
+    test_keyboard_index_lookups()
+    test_find_button_ignores_single_character_matches()
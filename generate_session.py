@@ -1,3 +1,5 @@
+import sys
+import json
 import asyncio
 from telethon import TelegramClient
 from telethon.sessions import StringSession
@@ -18,9 +20,12 @@ def get_config():
         print("请确保在 `config.py` 中正确设置了这两个变量。")
         exit(1)
 
-async def main():
+async def main(account_name=None):
     """
     主函数，用于生成和打印 session 字符串。
+
+    Args:
+        account_name: 可选的账户名称。提供时额外输出一条可加入 TELEGRAM_SESSIONS 的 JSON 配置。
     """
     print("--- Telegram Session 生成器 ---")
     
@@ -45,7 +50,12 @@ async def main():
         print("这是您的 Session 字符串，请妥善保管，不要泄露给任何人：\n")
         print(f"TELEGRAM_SESSION=\n{session_string}\n")
         print("请将此字符串复制并粘贴到您 GitHub 仓库的 Secrets 中。")
+        if account_name:
+            entry = json.dumps({"name": account_name, "session": session_string}, ensure_ascii=False)
+            print("\n多账户签到时，请将下面这一项加入 TELEGRAM_SESSIONS 的 JSON 列表中：\n")
+            print(f"{entry}\n")
         print("有关详细步骤，请参阅 README.md 文件。")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # 可选参数：账户名称，例如 `python generate_session.py alice`
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None)) 
\ No newline at end of file
@@ -1,12 +1,37 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import json
 import asyncio
+import collections
+import contextlib
+import datetime
 import logging
-from telethon import TelegramClient
+import sys
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from telethon import TelegramClient, utils
 from telethon.sessions import StringSession
-from telethon.errors.rpcerrorlist import SessionPasswordNeededError
-from telethon.tl.types import Message, MessageService, KeyboardButtonCallback, KeyboardButton, ReplyInlineMarkup
-from telethon.events import NewMessage, MessageEdited, CallbackQuery
+from telethon.errors.rpcerrorlist import (
+    SessionPasswordNeededError, PeerIdInvalidError, UserIdInvalidError, InputUserDeactivatedError, FloodWaitError,
+    MessageIdInvalidError, MsgIdInvalidError, DataInvalidError, ButtonDataInvalidError
+)
+from telethon.tl.types import MessageService
+from telethon.events import NewMessage, MessageEdited
 from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+from checkin_state import (
+    PeerCache, StrategyStore, KeyboardMemory, CheckinLedger, LatencyTracker, BotHealth, HEALTH_OPEN, HEALTH_PROBE,
+    account_state_path, state_path, bot_key, checkin_day
+)
+from button_matcher import ButtonMatcher, KeyboardIndex, get_button_matcher
+from config_loader import BotConfig, ButtonSpec, ConfigError, load_config_set
+from scheduler import CheckinScheduler
+from rate_limiter import AccountRateLimiter
+import metrics
+
+# 导入本模块（主要是 Telethon）所用的秒数，计入启动耗时
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # --- 日志记录设置 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,7 +46,8 @@ def get_credentials():
     api_hash = os.environ.get('API_HASH')
     session_string = os.environ.get('TELEGRAM_SESSION')
 
-    if not all([api_id, api_hash, session_string]):
+    # 多账户时会话字符串来自 TELEGRAM_SESSIONS，见 get_accounts()
+    if not all([api_id, api_hash, session_string or os.environ.get('TELEGRAM_SESSIONS')]):
         logging.info("未找到环境变量，尝试从 config.py 加载...")
         try:
             from config import API_ID, API_HASH
@@ -34,17 +60,119 @@ def get_credentials():
     
     return api_id, api_hash, session_string
 
-def get_bot_configs():
-    """从 bot_configs.py 加载机器人配置。"""
-    try:
-        from bot_configs import BOT_CONFIGS
-        return BOT_CONFIGS
-    except (ImportError, AttributeError):
-        logging.error("无法从 bot_configs.py 加载 BOT_CONFIGS。请确保文件存在且配置正确。")
-        return []
+def get_bot_configs(account=None, config_set=None):
+    """
+    返回账户使用的机器人配置（BotConfig 列表）。
+
+    配置从 bot_configs.py、bot_configs.toml 或 bot_configs.json 加载（见 config_loader）；
+    如果定义了该账户专属的配置（ACCOUNT_BOT_CONFIGS 或配置文件中的 accounts），则使用专属的配置列表。
+
+    Args:
+        config_set: 已加载的 ConfigSet，为 None 时重新加载。
+    """
+    if config_set is None:
+        try:
+            config_set = load_config_set()
+        except ConfigError as e:
+            logging.error(f"无法加载机器人配置:\n{e}")
+            return []
+    return config_set.for_account(account)
+
+def get_accounts(session_string, config_set=None):
+    """
+    获取要签到的账户列表。
 
-def analyze_button(button):
-    """分析按钮的详细信息"""
+    优先读取环境变量 TELEGRAM_SESSIONS（JSON 列表，每项形如
+    {"name": "alice", "session": "...", "concurrency": 3}），否则使用单个 TELEGRAM_SESSION
+    或本地的 telegram_session 文件作为名为 "default" 的账户。
+
+    Returns:
+        list: 每个账户一个字典，包含 name、session、concurrency 和 bot_configs。
+    """
+    sessions_json = os.environ.get('TELEGRAM_SESSIONS')
+    if sessions_json:
+        try:
+            entries = json.loads(sessions_json)
+        except ValueError as e:
+            logging.error(f"TELEGRAM_SESSIONS 不是有效的 JSON: {e}")
+            return []
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            logging.error('TELEGRAM_SESSIONS 应为 JSON 列表，每项形如 {"name": "alice", "session": "..."}')
+            return []
+    else:
+        entries = [{"name": "default", "session": session_string}]
+
+    accounts = []
+    for index, entry in enumerate(entries):
+        name = str(entry.get("name") or f"account{index + 1}")
+        if any(account["name"] == name for account in accounts):
+            logging.warning(f"账户名称 {name} 重复，跳过后面的配置。")
+            continue
+        bot_configs = get_bot_configs(name, config_set)
+        if not bot_configs:
+            logging.warning(f"账户 {name} 没有机器人配置，跳过。")
+            continue
+        concurrency = entry.get("concurrency")
+        if concurrency is not None and (type(concurrency) is not int or concurrency < 1):
+            logging.warning(f"账户 {name} 的 concurrency 不是正整数: {concurrency!r}，使用 CHECKIN_CONCURRENCY。")
+            concurrency = None
+        accounts.append({
+            "name": name,
+            "session": entry.get("session"),
+            "concurrency": concurrency,
+            "bot_configs": bot_configs,
+        })
+    return accounts
+
+def make_session(account):
+    """根据账户配置创建 Telethon 会话：有会话字符串时使用 StringSession，否则使用本地会话文件。"""
+    if account["session"]:
+        return StringSession(account["session"])
+    if account["name"] == "default":
+        return "telegram_session"
+    return f"telegram_session_{account['name']}"
+
+def make_client(account, api_id, api_hash):
+    """创建签到使用的 TelegramClient。"""
+    # FloodWait 交给 AccountRateLimiter 按请求类型处理，不让 Telethon 在单个请求内部自行等待
+    return TelegramClient(make_session(account), api_id, api_hash, flood_sleep_threshold=0)
+
+# --- 消息分析 ---
+class LazyRepr:
+    """
+    延迟计算的日志参数。
+
+    作为 %s 参数传给 logging 时，只有日志记录真正被输出才会调用 func 生成结构化结果并格式化，
+    且只计算一次；日志级别未启用时不会产生任何分析开销。
+    """
+
+    __slots__ = ("_func", "_args", "_value", "_done")
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+        self._value = None
+        self._done = False
+
+    def value(self):
+        """返回（并缓存）结构化的分析结果。"""
+        if not self._done:
+            self._value = self._func(*self._args)
+            self._done = True
+        return self._value
+
+    def __str__(self):
+        return str(self.value())
+
+    __repr__ = __str__
+
+def analyze_button(button, data=None):
+    """
+    分析按钮的详细信息
+
+    Args:
+        data: KeyboardIndex 中已经解码的回调数据，提供时不再重复解码。
+    """
     button_type = type(button).__name__
     button_info = {
         "类型": button_type,
@@ -52,18 +180,26 @@ def analyze_button(button):
     }
     
     if hasattr(button, 'data'):
-        try:
-            button_info["数据"] = button.data.decode('utf-8')
-        except:
-            button_info["数据"] = str(button.data)
+        if data is not None:
+            button_info["数据"] = data
+        else:
+            try:
+                button_info["数据"] = button.data.decode('utf-8')
+            except (UnicodeDecodeError, AttributeError):
+                button_info["数据"] = str(button.data)
     
     if hasattr(button, 'url'):
         button_info["URL"] = button.url
         
     return button_info
 
-async def analyze_message(message):
-    """分析消息的详细内容，包括按钮结构"""
+def describe_message(message, keyboard=None):
+    """
+    分析消息的详细内容，包括按钮结构
+
+    Args:
+        keyboard: 该消息已经构建的 KeyboardIndex，为 None 时在这里构建。
+    """
     if not message:
         return "消息为空"
     
@@ -75,79 +211,626 @@ async def analyze_message(message):
     
     # 分析按钮
     if hasattr(message, 'reply_markup') and message.reply_markup:
-        markup_type = type(message.reply_markup).__name__
-        result["按钮面板类型"] = markup_type
+        keyboard = keyboard or KeyboardIndex(message.reply_markup)
+        result["按钮面板类型"] = keyboard.markup_type
         result["按钮"] = []
         
-        for i, row in enumerate(message.reply_markup.rows):
-            for j, button in enumerate(row.buttons):
-                btn_info = analyze_button(button)
-                btn_info["位置"] = [i, j]
-                result["按钮"].append(btn_info)
+        for button, (i, j), _, data in keyboard.entries():
+            btn_info = analyze_button(button, data)
+            btn_info["位置"] = [i, j]
+            result["按钮"].append(btn_info)
     
     return result
 
-# 添加一个新的工具函数用于智能模糊匹配
+# --- 按钮文本匹配 ---
+# 匹配器定义在 button_matcher.py，这里保留两两比较的旧接口
+
 def fuzzy_text_match(text1, text2):
     """
     实现模糊文本匹配，忽略大小写、空格、标点符号和表情符号前后的差异
     
     Args:
-        text1: 第一个文本字符串
-        text2: 第二个文本字符串
+        text1: 第一个文本字符串（按钮定义）
+        text2: 第二个文本字符串（按钮实际文本）
     
     Returns:
         bool: 如果两个字符串模糊匹配则返回True
     """
-    if not text1 or not text2:
-        return False
-    
-    # 原始文本记录
-    original_text1 = text1
-    original_text2 = text2
-    
-    # 将两个字符串都转为小写
-    text1 = text1.lower()
-    text2 = text2.lower()
-    
-    # 去除常见标点符号和空白
-    import re
-    pattern = r'[\s.,，。:：;；!！?？_\-—～~()]'
-    text1 = re.sub(pattern, '', text1)
-    text2 = re.sub(pattern, '', text2)
-    
-    # 清除表情符号和其他特殊字符
-    emoji_pattern = r'[\U00010000-\U0010ffff]'
-    text1 = re.sub(emoji_pattern, '', text1, flags=re.UNICODE)
-    text2 = re.sub(emoji_pattern, '', text2, flags=re.UNICODE)
-    
-    # 基础检查：一个字符串是否包含在另一个字符串中
-    base_match = text1 in text2 or text2 in text1
-    
-    # 如果基础检查失败，进行关键词匹配
-    if not base_match:
-        # 签到关键词匹配
-        checkin_keywords = ["签到", "打卡", "checkin", "check", "签", "到"]
-        
-        # 提取文本中的关键词
-        text1_keywords = [kw for kw in checkin_keywords if kw in text1]
-        text2_keywords = [kw for kw in checkin_keywords if kw in text2]
-        
-        # 如果两边都有共同的签到关键词，认为匹配成功
-        keyword_match = bool(set(text1_keywords) & set(text2_keywords))
-        
-        result = keyword_match
+    result = get_button_matcher(text1).match(text2) if text1 else False
+    logging.debug(f"模糊匹配{'成功' if result else '失败'}: '{text1}' 与 '{text2}'")
+    return result
+
+# --- 签到结果判断 ---
+# 全局的判定短语，不区分大小写。机器人配置中的 success_keywords / done_keywords / failure_keywords
+# 可以为单个机器人补充短语，命中机器人自己的短语时优先按这些短语判定。
+SUCCESS_KEYWORDS = ["签到成功", "签到奖励", "打卡成功", "check-in successful", "checked in successfully"]
+DONE_KEYWORDS = ["已经签到", "已签到", "今日已签", "已经打卡", "已打卡", "already checked in", "already signed"]
+FAILURE_KEYWORDS = ["签到失败", "打卡失败", "失败", "出错", "错误", "failed", "error"]
+
+# 同一文本命中多类短语时的优先级：已签到 > 签到成功 > 失败
+OUTCOME_SUCCESS, OUTCOME_DONE, OUTCOME_FAILURE = "success", "done", "failure"
+OUTCOME_PRIORITY = {OUTCOME_DONE: 0, OUTCOME_SUCCESS: 1, OUTCOME_FAILURE: 2}
+OUTCOME_LABELS = {OUTCOME_SUCCESS: "签到成功", OUTCOME_DONE: "已签到", OUTCOME_FAILURE: "签到失败"}
+
+# 机器人配置中补充判定短语的字段
+CONFIG_KEYWORD_FIELDS = {
+    "success_keywords": OUTCOME_SUCCESS,
+    "done_keywords": OUTCOME_DONE,
+    "failure_keywords": OUTCOME_FAILURE,
+}
+
+class ResponseClassifier:
+    """
+    基于 Aho-Corasick 自动机的签到结果分类器，启动时构建一次。
+
+    全局短语和各机器人的短语都编译进同一个自动机，对弹窗、新消息或编辑后的消息只需扫描一遍文本，
+    就能得到所有命中的短语，再按优先级给出三态结果。
+    """
+
+    def __init__(self, phrases):
+        """
+        Args:
+            phrases: (短语, 类别, 机器人) 元组的可迭代对象；机器人为 None 表示全局短语。
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for phrase, category, bot_username in phrases:
+            phrase = phrase.lower()
+            if not phrase:
+                continue
+            node = 0
+            for char in phrase:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = next_node
+            scope = bot_key(bot_username) if bot_username else None
+            self._out[node].append((category, scope, phrase))
+
+        # 按广度优先构建失败指针，并把失败指针指向节点的输出合并进来
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(char, 0) if node else 0
+                self._out[next_node] = self._out[next_node] + self._out[self._fail[next_node]]
+
+    @classmethod
+    def from_configs(cls, bot_configs=()):
+        """用全局短语和机器人配置中补充的短语构建分类器。"""
+        phrases = [(p, OUTCOME_SUCCESS, None) for p in SUCCESS_KEYWORDS]
+        phrases += [(p, OUTCOME_DONE, None) for p in DONE_KEYWORDS]
+        phrases += [(p, OUTCOME_FAILURE, None) for p in FAILURE_KEYWORDS]
+        for config in bot_configs:
+            for field, category in CONFIG_KEYWORD_FIELDS.items():
+                for phrase in config.get(field) or []:
+                    phrases.append((phrase, category, config.get("bot_username")))
+        return cls(phrases)
+
+    def scan(self, text):
+        """单次扫描文本，依次产生命中的 (类别, 机器人, 短语)。"""
+        node = 0
+        for char in text.lower():
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            yield from self._out[node]
+
+    def classify(self, text, bot_username=None):
+        """
+        判断机器人的响应文本代表的签到结果。
+
+        Returns:
+            tuple: (outcome, category, phrase)。outcome 为 True（签到成功或已签到）、
+            False（明确失败）或 None（无法判断）；category 和 phrase 为决定结果的短语类别和短语。
+        """
+        if not text:
+            return None, None, None
+
+        scope = bot_key(bot_username) if bot_username else None
+        best = {None: None, scope: None}
+        for match in self.scan(text):
+            category, match_scope, _ = match
+            if match_scope not in best:
+                continue
+            current = best[match_scope]
+            if current is None or OUTCOME_PRIORITY[category] < OUTCOME_PRIORITY[current[0]]:
+                best[match_scope] = match
+
+        decision = (best[scope] if scope else None) or best[None]
+        if decision is None:
+            return None, None, None
+        category, _, phrase = decision
+        return category != OUTCOME_FAILURE, category, phrase
+
+DEFAULT_CLASSIFIER = ResponseClassifier.from_configs()
+
+def classify_response(text, bot_username=None, classifier=None):
+    """
+    判断机器人的响应文本代表的签到结果。
+
+    Returns:
+        True 表示签到成功或已签到，False 表示明确失败，None 表示无法判断。
+    """
+    return (classifier or DEFAULT_CLASSIFIER).classify(text, bot_username)[0]
+
+# Telegram 拒绝缓存的 peer（access_hash 过期、机器人被删除等）时抛出的错误
+STALE_PEER_ERRORS = (PeerIdInvalidError, UserIdInvalidError, InputUserDeactivatedError)
+# 按钮面板消息已被删除或按钮已失效时，机器人拒绝回调查询抛出的错误
+STALE_KEYBOARD_ERRORS = (MessageIdInvalidError, MsgIdInvalidError, DataInvalidError, ButtonDataInvalidError)
+
+# wait_for_outcome 返回的响应来源对应的日志名称
+RESPONSE_SOURCES = {"alert": "回调弹窗", "message": "新消息", "edit": "编辑消息", "timeout": "超时", "rejected": "回调被拒绝",
+                    "error": "回调出错"}
+
+# 找不到按钮或按钮无响应时依次尝试的通用签到命令
+DIRECT_COMMANDS = ["/sign", "/checkin", "/签到", "/打卡", "签到", "打卡", "check in"]
+
+# --- 更新分发 ---
+class UpdateDispatcher:
+    """
+    每个客户端一个的长期更新分发器。
+
+    只在客户端上注册一次 NewMessage 和 MessageEdited 处理器，按消息所在会话的 peer id
+    把更新投递到订阅了该机器人的队列中。无论同时处理多少个机器人，路由一条更新都只是一次字典查找。
+    """
+
+    def __init__(self, client: TelegramClient):
+        self._subscribers = {}
+        client.add_event_handler(self._on_new_message, NewMessage(incoming=True))
+        client.add_event_handler(self._on_edited_message, MessageEdited(incoming=True))
+
+    def _route(self, kind, event):
+        queues = self._subscribers.get(event.chat_id)
+        if not queues:
+            return
+        for queue in queues:
+            queue.put_nowait((kind, event.message))
+
+    async def _on_new_message(self, event):
+        self._route("message", event)
+
+    async def _on_edited_message(self, event):
+        self._route("edit", event)
+
+    @contextlib.contextmanager
+    def subscribe(self, peer_id):
+        """
+        订阅某个会话的更新。
+
+        Yields:
+            asyncio.Queue: 依次收到 (kind, message) 元组，kind 为 "message" 或 "edit"。
+        """
+        queue = asyncio.Queue()
+        queues = self._subscribers.setdefault(peer_id, [])
+        queues.append(queue)
+        try:
+            yield queue
+        finally:
+            queues.remove(queue)
+            if not queues:
+                del self._subscribers[peer_id]
+
+class StartupTimer:
+    """记录冷启动关键路径上各阶段的耗时：导入、连接、授权检查、到第一次向机器人发送请求。"""
+
+    LABELS = {"import": "导入", "connect": "连接", "auth": "授权检查", "first_send": "首次发送"}
+
+    def __init__(self, account="default"):
+        self.account = account
+        self.durations = {"import": IMPORT_SECONDS}
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        """记录从上一个阶段结束到现在的耗时。"""
+        now = time.perf_counter()
+        self.durations[phase] = now - self._last
+        self._last = now
+
+    def report(self):
+        parts = ", ".join(f"{self.LABELS[phase]} {seconds:.2f}s" for phase, seconds in self.durations.items())
+        logging.info(f"账户 {self.account} 启动耗时: {parts}，合计 {sum(self.durations.values()):.2f}s")
+
+class ClientRuntime:
+    """
+    绑定到单个 TelegramClient 的运行时状态：更新分发器、peer 缓存、学到的签到方法和按钮面板、
+    响应延迟和机器人健康状况。
+    """
+
+    def __init__(self, client: TelegramClient, account="default"):
+        self.account = account
+        self.dispatcher = UpdateDispatcher(client)
+        # 该账户的所有出站请求都经过同一个限速器
+        self.limiter = AccountRateLimiter()
+        self.peers = PeerCache(account_state_path(account, "peers"), limiter=self.limiter)
+        self.strategies = StrategyStore(account_state_path(account, "strategies"))
+        self.keyboards = KeyboardMemory(account_state_path(account, "keyboards"))
+        self.ledger = CheckinLedger(state_path("ledger.sqlite3"))
+        self.latency = LatencyTracker(account_state_path(account, "latency"))
+        self.health = BotHealth(account_state_path(account, "health"))
+        self.classifier = DEFAULT_CLASSIFIER
+        # 由 connect_account 设置：启动计时在第一次向机器人发送请求时输出；me 为后台获取账户信息的任务
+        self.startup = None
+        self.me = None
+
+    def note_send(self):
+        """在每次向机器人发送请求前调用，第一次调用时结束启动计时。"""
+        if self.startup is not None:
+            self.startup.mark("first_send")
+            self.startup.report()
+            self.startup = None
+
+    def span(self, bot_username: str, phase: str):
+        """记录某个机器人一个签到阶段的耗时，见 metrics.RunMetrics。"""
+        return metrics.RUN.span(self.account, bot_username, phase)
+
+    def observe(self, bot_username: str, phase: str, seconds: float):
+        metrics.RUN.observe(self.account, bot_username, phase, seconds)
+
+    def count_timeout(self, bot_username: str, phase: str):
+        metrics.RUN.timeout(self.account, bot_username, phase)
+
+    def save(self):
+        """保存需要跨运行保留的状态。"""
+        self.peers.save()
+        self.strategies.save()
+        self.keyboards.save()
+        self.latency.save()
+        self.health.save()
+
+    def timeout_for(self, bot_username: str, default: float, label: str):
+        """根据该机器人的历史响应延迟决定一次等待的超时时间，并记录选择的结果。"""
+        timeout, reason = self.latency.timeout(bot_username, default)
+        logging.info(f"等待 {bot_username} 的{label}，超时 {timeout:.1f} 秒（{reason}）")
+        return timeout
+
+    async def resolve_peer(self, client: TelegramClient, bot_username: str):
+        """
+        返回机器人的 InputPeer 和 peer id。
+
+        Returns:
+            tuple: (peer, peer_id)
+        """
+        peer = await self.peers.resolve(client, bot_username)
+        return peer, utils.get_peer_id(peer)
+
+_runtimes = weakref.WeakKeyDictionary()
+
+def get_runtime(client: TelegramClient, account="default"):
+    """获取客户端的运行时状态，首次调用时按账户名创建。"""
+    runtime = _runtimes.get(client)
+    if runtime is None:
+        runtime = _runtimes[client] = ClientRuntime(client, account)
+    return runtime
+
+class RequestTimer:
+    """
+    记录请求实际发出的时刻。
+
+    等待限速令牌和 FloodWait 暂停的时间不计入机器人的响应时间：超时从请求发出时开始计算，
+    记录的响应延迟也只包括请求发出之后的时间。
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.started = None
+
+    def wrap(self, func):
+        """包装传给 AccountRateLimiter.call 的请求函数，在每次实际发出请求时重新开始计时。"""
+        async def send():
+            self.started = self.loop.time()
+            try:
+                return await func()
+            except FloodWaitError:
+                # 请求没有被处理，限速器暂停后会重新发出
+                self.started = None
+                raise
+        return send
+
+    def elapsed(self):
+        """请求发出后经过的秒数，尚未发出时为 0。"""
+        return 0.0 if self.started is None else self.loop.time() - self.started
+
+    def remaining(self, timeout):
+        """距离超时还剩的秒数，尚未发出时为 None（不限时）。"""
+        return None if self.started is None else self.started + timeout - self.loop.time()
+
+async def wait_for_reply(client: TelegramClient, bot_username: str, text: str, timeout: float):
+    """
+    向机器人发送文本，并等待它回复的第一条非服务消息。
+
+    Returns:
+        Message: 机器人的回复；超时则返回 None。
+    """
+    loop = asyncio.get_running_loop()
+    runtime = get_runtime(client)
+    peer, peer_id = await runtime.resolve_peer(client, bot_username)
+
+    with runtime.dispatcher.subscribe(peer_id) as updates:
+        timer = RequestTimer(loop)
+        runtime.note_send()
+        with runtime.span(bot_username, "send_start"):
+            await runtime.limiter.call("send", timer.wrap(lambda: client.send_message(peer, text)))
+        while True:
+            try:
+                kind, message = await asyncio.wait_for(updates.get(), timeout=timer.remaining(timeout))
+            except asyncio.TimeoutError:
+                runtime.latency.observe(bot_username, timeout)
+                runtime.count_timeout(bot_username, "first_response")
+                return None
+            # 忽略服务消息和编辑
+            if kind == "message" and not isinstance(message, MessageService):
+                elapsed = timer.elapsed()
+                runtime.latency.observe(bot_username, elapsed)
+                runtime.health.note_response(bot_username)
+                runtime.observe(bot_username, "first_response", elapsed)
+                return message
+
+async def wait_for_outcome(client: TelegramClient, bot_username: str, message_id=None, *,
+                           callback_data=None, text=None, timeout=15.0, first_response=False, phase="outcome",
+                           stop_on_rejection=False):
+    """
+    触发一次动作（点击回调按钮或发送文本），并等待第一个能判断签到结果的响应。
+
+    同时监听回调弹窗 (BotCallbackAnswer)、机器人的新消息，以及机器人对按钮消息的原地编辑，
+    哪个先给出明确结果就返回哪个，因此一次签到只需要大约一次机器人往返的时间。
+
+    Args:
+        client: TelegramClient 实例。
+        bot_username: 机器人的用户名。
+        message_id: 作为参照的消息 ID（通常是带按钮的消息）。只接受 ID 更大的新消息，
+            以及对该消息或其后消息的编辑；为 None 时接受所有新消息。
+        callback_data: 回调按钮的数据，提供时对 message_id 发起回调查询。
+        text: 要发送给机器人的文本（命令或回复键盘按钮的文本）。
+        timeout: 最长等待秒数，从请求实际发出时开始计算。
+        first_response: 为 True 时第一条响应即结束等待，即使无法从中判断结果。
+        phase: 记录这次等待耗时和超时次数时使用的阶段名称。
+        stop_on_rejection: 为 True 时回调请求出错立即结束等待，而不是继续等待消息：消息或回调数据已失效
+            （STALE_KEYBOARD_ERRORS）时返回 "rejected"，FloodWait 原样抛出，其他错误返回 "error"。
+
+    Returns:
+        tuple: (outcome, source, response_text)。outcome 为 True（成功或已签到）、
+        False（明确失败）或 None（无法判断）；source 为 "alert"、"message"、"edit"、"timeout"
+        "rejected"（回调被拒绝）或 "error"（回调出错）；超时时 response_text 为最后收到的响应文本，没有任何响应则为 None。
+    """
+    loop = asyncio.get_running_loop()
+    runtime = get_runtime(client)
+    peer, peer_id = await runtime.resolve_peer(client, bot_username)
+    last_text = None
+    responded = False
+    callback_task = None
+
+    with runtime.dispatcher.subscribe(peer_id) as updates:
+        timer = RequestTimer(loop)
+        runtime.note_send()
+        try:
+            if callback_data is not None:
+                callback_task = asyncio.ensure_future(runtime.limiter.call("callback", timer.wrap(lambda: client(
+                    GetBotCallbackAnswerRequest(peer=peer, msg_id=message_id, data=callback_data)
+                ))))
+                # 回调结果与消息更新走同一个队列，按到达顺序处理
+                def on_callback_done(task):
+                    if task.cancelled():
+                        return
+                    runtime.observe(bot_username, "callback_rpc", timer.elapsed())
+                    updates.put_nowait(("alert", task))
+                callback_task.add_done_callback(on_callback_done)
+            elif text is not None:
+                await runtime.limiter.call("send", timer.wrap(lambda: client.send_message(peer, text)))
+            else:
+                timer.started = loop.time()
+
+            while True:
+                try:
+                    # 回调请求还在等待限速令牌时不限时，回调任务结束时会放入队列
+                    source, item = await asyncio.wait_for(updates.get(), timeout=timer.remaining(timeout))
+                except asyncio.TimeoutError:
+                    if not responded:
+                        runtime.latency.observe(bot_username, timeout)
+                    runtime.count_timeout(bot_username, phase)
+                    return None, "timeout", last_text
+
+                if source == "alert":
+                    if item.exception():
+                        if stop_on_rejection:
+                            if isinstance(item.exception(), FloodWaitError):
+                                raise item.exception()
+                            if isinstance(item.exception(), STALE_KEYBOARD_ERRORS):
+                                logging.info(f"{bot_username} 拒绝了回调请求: {item.exception()}")
+                                return None, "rejected", None
+                            logging.info(f"{bot_username} 的回调请求出错: {item.exception()}")
+                            return None, "error", None
+                        logging.info(f"回调请求未返回结果: {item.exception()} - 继续等待消息响应")
+                        if timer.started is None:
+                            # 请求没有发出（FloodWait 超过上限），从现在开始计算超时
+                            timer.started = loop.time()
+                        continue
+                    response_text = getattr(item.result(), 'message', None)
+                elif isinstance(item, MessageService):
+                    continue
+                elif source == "message" and (message_id is None or item.id > message_id):
+                    response_text = item.text
+                elif source == "edit" and message_id is not None and item.id >= message_id:
+                    response_text = item.text
+                else:
+                    continue
+
+                if not responded:
+                    # 第一个有效响应的到达时间即为这次的往返延迟
+                    responded = True
+                    runtime.latency.observe(bot_username, timer.elapsed())
+                    runtime.health.note_response(bot_username)
+                if not response_text:
+                    continue
+                last_text = response_text
+                outcome, category, phrase = runtime.classifier.classify(response_text, bot_username)
+                if outcome is not None:
+                    logging.info(f"{bot_username} 的{RESPONSE_SOURCES[source]}判定为{OUTCOME_LABELS[category]}（命中 '{phrase}'）")
+                if outcome is not None or first_response:
+                    return outcome, source, response_text
+        finally:
+            runtime.observe(bot_username, phase, timer.elapsed())
+            if callback_task and not callback_task.done():
+                callback_task.cancel()
+
+def find_button(message, button_def, keyboard=None):
+    """
+    在消息的按钮面板中查找按钮定义对应的按钮。
+
+    Args:
+        message: 带按钮面板的消息。
+        button_def: 配置中解析好的 ButtonSpec，或者按钮文本、[行, 列] 坐标、{"data": "回调数据"}。
+        keyboard: 该消息已经构建的 KeyboardIndex，为 None 时在这里构建。
+
+    Returns:
+        找到的按钮，找不到时返回 None。
+    """
+    if not message.reply_markup:
+        return None
+    try:
+        button = ButtonSpec.parse(button_def)
+    except ValueError as e:
+        logging.warning(f"无效的按钮定义: {e}")
+        return None
+
+    if button is None:
+        return None
+
+    keyboard = keyboard or KeyboardIndex(message.reply_markup)
+    target_button = None
+
+    if button.kind == "text":
+        # 按文本查找按钮：先查完全相同和规范化后相同的按钮，否则对所有按钮打分，取置信度最高的一个
+        logging.info(f"尝试按文本匹配按钮: '{button.value}'")
+        target_button, confidence = keyboard.find_text(button.matcher)
+        if target_button:
+            if confidence == ButtonMatcher.EXACT:
+                method = "完全匹配"
+            elif confidence >= 0.7:
+                method = "部分匹配"
+            else:
+                method = "模糊匹配"
+            logging.info(f"通过{method}找到按钮: '{target_button.text}' (置信度 {confidence:.2f})")
+
+    elif button.kind == "position":
+        # 按位置查找按钮
+        target_button = keyboard.at(*button.value)
+
     else:
-        result = base_match
-    
-    if result:
-        logging.debug(f"模糊匹配成功: '{original_text1}' 与 '{original_text2}'")
-        logging.debug(f"  处理后: '{text1}' 与 '{text2}'")
+        # 按回调数据查找按钮
+        target_button = keyboard.find_data(button.value)
+        if target_button:
+            logging.info(f"通过回调数据 '{button.value}' 找到按钮: '{target_button.text}'")
+
+    return target_button
+
+# --- 签到方法 ---
+# 每条 BotConfig 加载时已经生成了对应的签到方法（BotConfig.strategy）
+def strategy_to_config(bot_username, strategy):
+    """把学到的方法转换回机器人配置，以便和普通配置一样执行。"""
+    kind, value = strategy["kind"], strategy["value"]
+    if kind == "command":
+        return BotConfig(bot_username, value)
+    button_def = {"callback": {"data": value}, "position": value}.get(kind, value)
+    return BotConfig(bot_username, strategy["start_command"], button_def)
+
+def plan_attempts(bot_username, configs, strategies):
+    """
+    安排同一机器人的尝试顺序：先按历史成功情况尝试学到的方法，再按顺序尝试其余的配置。
+    """
+    learned = [strategy_to_config(bot_username, s) for s in strategies.strategies(bot_username)]
+    learned_keys = [c.strategy for c in learned]
+    remaining = [c for c in configs if c.strategy not in learned_keys]
+    if learned:
+        logging.info(f"{bot_username} 有 {len(learned)} 个学到的签到方法，将优先尝试。")
+    return learned + remaining
+
+def remember_strategy(client: TelegramClient, bot_username: str, kind, value, start_command=None):
+    """记录实际签到成功的方法，下次运行优先使用。"""
+    get_runtime(client).strategies.record_success(
+        bot_username, {"kind": kind, "value": value, "start_command": start_command}
+    )
+
+async def try_direct_commands(client: TelegramClient, bot_username: str):
+    """
+    依次发送通用签到命令，收到第一条响应后即停止。以前成功过的命令会排在前面。
+
+    Returns:
+        bool: 如果某个命令的响应表明签到成功或已签到则返回True。
+    """
+    runtime = get_runtime(client)
+    for cmd in runtime.strategies.ordered_commands(bot_username, DIRECT_COMMANDS):
+        logging.info(f"尝试发送命令: {cmd}")
+        timeout = runtime.timeout_for(bot_username, 8.0, f"命令 '{cmd}' 响应")
+        outcome, _, response_text = await wait_for_outcome(
+            client, bot_username, text=cmd, timeout=timeout, first_response=True, phase=f"fallback_command:{cmd}"
+        )
+        if response_text is None:
+            logging.info(f"命令 '{cmd}' 无响应，尝试下一个命令...")
+            continue
+
+        logging.info(f"✅ 命令 '{cmd}' 收到响应: {response_text.strip()}")
+        if outcome:
+            logging.info(f"通过命令 '{cmd}' 检测到签到成功或已签到信息，任务完成！")
+            remember_strategy(client, bot_username, "command", cmd)
+            return True
+        # 成功收到响应，不再尝试其他命令
+        break
+    return False
+
+def keyboard_replay_enabled():
+    """是否允许直接点击上一次的按钮面板（CHECKIN_KEYBOARD_REPLAY，默认启用）。"""
+    return os.environ.get('CHECKIN_KEYBOARD_REPLAY', 'true').lower() in ('true', '1', 'yes')
+
+async def replay_keyboard(client: TelegramClient, bot_username: str, button):
+    """
+    直接对上一次签到成功的按钮面板消息发起回调查询，不重新发送启动命令。
+
+    只用于按回调数据定义的按钮，且回调数据与上一次成功时相同。没有成功时由调用方在同一次尝试中
+    按正常流程发送启动命令：机器人拒绝回调（消息或按钮已失效）或没有给出成功结果时遗忘这条记录；
+    其他回调错误（如 BotResponseTimeout、网络错误）保留记录，下次运行仍会先尝试。
+    FloodWait 原样抛出，这时发送启动命令同样会被限流。
+
+    Returns:
+        bool: 签到成功或已签到时返回 True；没有可用的记录或未成功时返回 False。
+    """
+    runtime = get_runtime(client)
+    entry = runtime.keyboards.get(bot_username)
+    if not entry or entry["data"] != button.value or not keyboard_replay_enabled():
+        return False
+
+    logging.info(f"直接点击 {bot_username} 上一次的按钮面板 (消息ID {entry['message_id']})，回调数据: {button.value}")
+    outcome, source, response_text = await wait_for_outcome(
+        client, bot_username, entry["message_id"], callback_data=button.value.encode('utf-8'),
+        timeout=runtime.timeout_for(bot_username, 15.0, "回调结果"),
+        first_response=True, phase="keyboard_replay", stop_on_rejection=True
+    )
+    if outcome:
+        logging.info(f"✅ 通过{RESPONSE_SOURCES[source]}检测到签到成功或已签到信息，任务完成！响应: {response_text}")
+        return True
+
+    if source == "error":
+        logging.info(f"{bot_username} 上一次的按钮面板回调出错，本次改为发送启动命令。")
+        return False
+    if source == "rejected":
+        reason = "机器人拒绝了回调"
+    elif response_text:
+        reason = f"响应未表明签到成功: {response_text}"
     else:
-        logging.debug(f"模糊匹配失败: '{original_text1}' 与 '{original_text2}'")
-        logging.debug(f"  处理后: '{text1}' 与 '{text2}'")
-    
-    return result
+        reason = "没有收到响应"
+    logging.info(f"{bot_username} 上一次的按钮面板不可用（{reason}），改为发送启动命令。")
+    runtime.keyboards.forget(bot_username)
+    return False
 
 async def click_button(client: TelegramClient, bot_username: str, button_def, start_command: str):
     """
@@ -156,448 +839,662 @@ async def click_button(client: TelegramClient, bot_username: str, button_def, st
     Args:
         client: TelegramClient 实例。
         bot_username: 机器人的用户名。
-        button_def: 按钮的定义（文本或 [行, 列] 坐标，或None表示仅发送命令，或字典 {"data": "回调数据"} 表示按回调数据查找）。
+        button_def: 按钮的定义（配置中解析好的 ButtonSpec，或文本、[行, 列] 坐标、字典 {"data": "回调数据"}，None 表示仅发送命令）。
         start_command: 触发按钮面板的命令。
         
+    按回调数据定义的按钮会先尝试直接点击上一次签到成功的按钮面板（见 replay_keyboard），
+    不可用时才发送 start_command 获取新的面板。
+
     Returns:
         bool: 如果签到成功或确认已经签到过则返回True，否则返回False
     """
+    runtime = get_runtime(client)
     try:
+        button = ButtonSpec.parse(button_def)
+        if button is not None and button.kind == "callback" and await replay_keyboard(client, bot_username, button):
+            remember_strategy(client, bot_username, "callback", button.value, start_command)
+            return True
+
         # 如果button_def为None，则只发送命令而不尝试点击按钮
-        if button_def is None:
+        if button is None:
             logging.info(f"配置为仅发送命令模式，向 {bot_username} 发送 '{start_command}'...")
-            
-            # 创建一个 future 来等待新消息
-            response_future = client.loop.create_future()
-            
-            @client.on(NewMessage(from_users=bot_username))
-            async def cmd_handler(event):
-                detailed_msg = await analyze_message(event.message)
-                logging.info(f"命令 '{start_command}' 响应: {detailed_msg}")
-                if not response_future.done():
-                    response_future.set_result(event.message)
-                    client.remove_event_handler(cmd_handler)
-            
-            await client.send_message(bot_username, start_command)
-            
-            try:
-                cmd_response = await asyncio.wait_for(response_future, timeout=10.0)
-                response_text = cmd_response.text.strip()
-                logging.info(f"✅ 命令 '{start_command}' 收到响应: {response_text}")
-                # 检查是否包含签到成功或已签到的关键词
-                if any(keyword in response_text for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                    logging.info("通过直接命令检测到签到成功或已签到信息，任务完成！")
-                    return True
-                return False
-            except asyncio.TimeoutError:
+            outcome, _, response_text = await wait_for_outcome(
+                client, bot_username, text=start_command, first_response=True, phase="command",
+                timeout=runtime.timeout_for(bot_username, 10.0, f"命令 '{start_command}' 响应")
+            )
+            if response_text is None:
                 logging.warning(f"命令 '{start_command}' 等待响应超时。")
-                client.remove_event_handler(cmd_handler)
                 return False
-            except Exception as e:
-                logging.error(f"处理命令 '{start_command}' 时出错: {e}")
-                client.remove_event_handler(cmd_handler)
+
+            logging.info(f"✅ 命令 '{start_command}' 收到响应: {response_text.strip()}")
+            if outcome:
+                logging.info("通过直接命令检测到签到成功或已签到信息，任务完成！")
+                remember_strategy(client, bot_username, "command", start_command)
+                return True
             return False
-            
-        # 创建一个 future 来等待新消息
-        future = client.loop.create_future()
-
-        @client.on(NewMessage(from_users=bot_username))
-        async def handler(event: NewMessage.Event):
-            # 忽略服务消息
-            if isinstance(event.message, MessageService):
-                return
-            
-            # 详细记录所有收到的消息内容
-            message_analysis = await analyze_message(event.message)
-            logging.info(f"从 {bot_username} 收到新消息: {message_analysis}")
-            
-            if not event.message.reply_markup:
-                logging.info(f"消息没有按钮面板: {event.message.text}")
-            
-            future.set_result(event.message)
-            client.remove_event_handler(handler)
-
-        # 监听所有回调查询事件，用于捕获和分析按钮点击
-        @client.on(CallbackQuery())
-        async def callback_handler(event):
-            logging.info(f"检测到回调查询: {event.query}")
-            logging.info(f"回调数据: {event.data.decode('utf-8') if event.data else None}")
-            # 不要在此处设置 future 结果，保留监听以便捕获更多信息
 
         logging.info(f"正在向 {bot_username} 发送 '{start_command}'...")
-        await client.send_message(bot_username, start_command)
-        
-        # 增加2秒延迟，等待机器人响应
-        await asyncio.sleep(2)
+        message = await wait_for_reply(
+            client, bot_username, start_command, timeout=runtime.timeout_for(bot_username, 15.0, "按钮面板")
+        )
+        if message is None:
+            logging.error(f"等待 {bot_username} 响应超时。")
+            return False
 
-        try:
-            # 等待带有按钮的响应，设置超时
-            message: Message = await asyncio.wait_for(future, timeout=15.0)
-            logging.info(f"收到了来自 {bot_username} 的响应。")
-
-            # 详细记录按钮结构
-            if hasattr(message, 'reply_markup') and message.reply_markup:
-                logging.info(f"按钮面板类型: {type(message.reply_markup).__name__}")
-                
-                for i, row in enumerate(message.reply_markup.rows):
-                    for j, button in enumerate(row.buttons):
-                        btn_info = analyze_button(button)
-                        logging.info(f"按钮 [{i},{j}]: {btn_info}")
-
-            buttons = [b for row in message.reply_markup.rows for b in row.buttons] if message.reply_markup else []
-            target_button = None
-
-            if isinstance(button_def, str):
-                # 按文本查找按钮 - 先尝试完全匹配
-                logging.info(f"尝试按文本匹配按钮: '{button_def}'")
-                target_button = next((b for b in buttons if b.text == button_def), None)
-                if target_button:
-                    logging.info(f"通过完全匹配找到按钮: '{target_button.text}'")
-                
-                # 如果完全匹配失败，尝试部分匹配（按钮文本包含定义的文本）
-                if not target_button:
-                    target_button = next((b for b in buttons if button_def in b.text), None)
-                    if target_button:
-                        logging.info(f"通过部分匹配找到按钮: '{target_button.text}'")
-                
-                # 如果部分匹配也失败，尝试高级模糊匹配
-                if not target_button:
-                    logging.info("尝试使用高级模糊匹配...")
-                    for button in buttons:
-                        if fuzzy_text_match(button_def, button.text):
-                            target_button = button
-                            logging.info(f"通过模糊匹配找到按钮: '{target_button.text}'")
-                            break
-
-            elif isinstance(button_def, list) and len(button_def) == 2:
-                # 按位置查找按钮
-                row, col = button_def
-                if message.reply_markup and row < len(message.reply_markup.rows) and col < len(message.reply_markup.rows[row].buttons):
-                    target_button = message.reply_markup.rows[row].buttons[col]
-                    
-            elif isinstance(button_def, dict) and "data" in button_def:
-                # 按回调数据查找按钮
-                callback_data = button_def["data"]
-                for button in buttons:
-                    if hasattr(button, 'data') and button.data:
-                        try:
-                            button_data = button.data.decode('utf-8')
-                            if button_data == callback_data:
-                                target_button = button
-                                logging.info(f"通过回调数据 '{callback_data}' 找到按钮: '{button.text}'")
-                                break
-                        except:
-                            pass
-
-            if target_button:
-                logging.info(f"找到按钮 '{target_button.text}'...")
-                logging.info(f"按钮详细信息: {analyze_button(target_button)}")
-                
-                # 增加延迟，有些机器人可能需要一段时间才能正确处理按钮点击
-                await asyncio.sleep(2)
-                
-                try:
-                    # 优先尝试 .click()，适用于 Inline Keyboard (Callback) buttons
-                    logging.info("尝试使用 .click() 方法 (适用于内联按钮)...")
-                    
-                    # 修复 KeyboardButtonCallback 的点击方法
-                    if hasattr(target_button, 'data') and target_button.data:
-                        # 对于回调按钮，直接发送回调查询
-                        logging.info(f"检测到回调按钮，使用回调数据: {target_button.data.decode('utf-8')}")
-                        try:
-                            click_result = await client(GetBotCallbackAnswerRequest(
-                                peer=bot_username,
-                                msg_id=message.id,
-                                data=target_button.data
-                            ))
-                            
-                            # 等待回调响应
-                            logging.info("等待回调响应...")
-                            await asyncio.sleep(3)  # 等待服务器处理回调
-                        except Exception as e:
-                            logging.info(f"机器人响应超时或出现错误: {str(e)} - 继续检查最新消息")
-                        
-                        # 获取最新消息查看是否有更新
-                        last_msg = await client.get_messages(bot_username, limit=1)
-                        if last_msg and last_msg[0].id != message.id:
-                            response_text = last_msg[0].text
-                            logging.info(f"✅ 收到回调响应: {response_text}")
-                            detailed_msg = await analyze_message(last_msg[0])
-                            logging.info(f"回调响应详情: {detailed_msg}")
-                            
-                            # 检查是否包含签到成功或已签到的关键词
-                            if any(keyword in response_text for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                                logging.info("通过回调响应检测到签到成功或已签到信息，任务完成！")
-                                return True
-                        else:
-                            logging.warning("未检测到新消息回调响应")
-                    else:
-                        # 对于非回调按钮，使用普通的click方法
-                        click_result = await target_button.click()
-                    
-                    # 检查弹窗
-                    alert_message = getattr(click_result, 'message', None)
-                    if alert_message:
-                        logging.info(f"✅ 来自 {bot_username} 的弹窗响应: {alert_message}")
-                        # 检查是否包含签到成功或已签到的关键词
-                        if any(keyword in alert_message for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                            logging.info("检测到签到成功或已签到信息，签到任务完成！")
-                            return True
-                    else:
-                        # 如果没有弹窗，等待片刻后检查聊天中的最新消息
-                        logging.info(f"已点击按钮，未收到弹窗。等待 5 秒后检查最新消息...")
-                        await asyncio.sleep(5)  # 增加等待时间
-                        last_msg = await client.get_messages(bot_username, limit=1)
-                        if last_msg:
-                            response_text = last_msg[0].text.strip()
-                            logging.info(f"✅ 来自 {bot_username} 的最新消息: {response_text}")
-                            detailed_msg = await analyze_message(last_msg[0])
-                            logging.info(f"最新消息详情: {detailed_msg}")
-                            
-                            # 检查是否包含签到成功或已签到的关键词
-                            if any(keyword in response_text for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                                logging.info("通过最新消息检测到签到成功或已签到信息，任务完成！")
-                                return True
-                        else:
-                            logging.warning(f"点击后未在与 {bot_username} 的对话中找到任何新消息。")
-
-                except AttributeError as e:
-                    # .click() 失败，假定为 Reply Keyboard button，发送其文本
-                    logging.warning(f".click() 方法失败: {e}。尝试作为回复键盘按钮处理，发送按钮文本。")
-
-                    # 创建一个 future 来等待机器人的新回复
-                    response_future = client.loop.create_future()
-                    handler = None
-                    new_message_handler = None
-                    edited_message_handler = None
-                    
-                    try:
-                        # 分别注册事件处理器，避免使用列表语法
-                        @client.on(NewMessage(from_users=bot_username))
-                        async def new_message_handler(event):
-                            detailed_msg = await analyze_message(event.message)
-                            logging.info(f"收到新消息响应: {detailed_msg}")
-                            if not response_future.done():
-                                response_future.set_result(event.message)
-                                logging.info("通过新消息事件捕获到响应")
-                                client.remove_event_handler(new_message_handler)
-                                client.remove_event_handler(edited_message_handler)
-                        
-                        @client.on(MessageEdited(from_users=bot_username))
-                        async def edited_message_handler(event):
-                            detailed_msg = await analyze_message(event.message)
-                            logging.info(f"收到编辑消息响应: {detailed_msg}")
-                            if not response_future.done():
-                                response_future.set_result(event.message)
-                                logging.info("通过编辑消息事件捕获到响应")
-                                client.remove_event_handler(new_message_handler)
-                                client.remove_event_handler(edited_message_handler)
-
-                        await client.send_message(bot_username, target_button.text)
-                        logging.info(f"已发送按钮文本，等待 20 秒以接收机器人的回复 (新消息或编辑消息)...")
-                        
-                        # 增加超时时间到20秒
-                        response_message: Message = await asyncio.wait_for(response_future, timeout=20.0)
-                        logging.info(f"✅ 来自 {bot_username} 的响应消息: {response_message.text.strip()}")
-
-                    except asyncio.TimeoutError:
-                        logging.warning(f"发送按钮文本后，等待机器人响应超时。")
-                        
-                        # 按钮点击和发送文本都失败后尝试第三种方法：直接发送通用签到命令
-                        logging.info("尝试第三种方法：直接发送签到命令...")
-                        direct_commands = ["/sign", "/checkin", "/签到", "/打卡", "签到", "打卡", "check in"]
-                        
-                        for cmd in direct_commands:
-                            cmd_future = client.loop.create_future()
-                            
-                            @client.on(NewMessage(from_users=bot_username))
-                            async def cmd_handler(event):
-                                detailed_msg = await analyze_message(event.message)
-                                logging.info(f"命令 '{cmd}' 响应: {detailed_msg}")
-                                if not cmd_future.done():
-                                    cmd_future.set_result(event.message)
-                                    client.remove_event_handler(cmd_handler)
-                            
-                            logging.info(f"尝试发送命令: {cmd}")
-                            await client.send_message(bot_username, cmd)
-                            
-                            try:
-                                # 增加超时时间到8秒
-                                cmd_response = await asyncio.wait_for(cmd_future, timeout=8.0)
-                                response_text = cmd_response.text.strip()
-                                logging.info(f"✅ 命令 '{cmd}' 收到响应: {response_text}")
-                                
-                                # 检查是否包含签到成功或已签到的关键词
-                                if any(keyword in response_text for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                                    logging.info(f"通过命令 '{cmd}' 检测到签到成功或已签到信息，任务完成！")
-                                    return True
-                                
-                                # 成功收到响应，不再尝试其他命令
-                                break
-                            except asyncio.TimeoutError:
-                                logging.info(f"命令 '{cmd}' 无响应，尝试下一个命令...")
-                                client.remove_event_handler(cmd_handler)
-                            except Exception as e:
-                                logging.error(f"处理命令 '{cmd}' 时出错: {e}")
-                                client.remove_event_handler(cmd_handler)
-                        
-                    finally:
-                        # 确保移除所有事件处理器
-                        if new_message_handler:
-                            try:
-                                client.remove_event_handler(new_message_handler)
-                            except:
-                                pass
-                        if edited_message_handler:
-                            try:
-                                client.remove_event_handler(edited_message_handler)
-                            except:
-                                pass
-                
-                except Exception as e:
-                    logging.error(f"处理按钮点击时发生未知错误: {e}")
+        # 消息和按钮的详细内容只在 DEBUG 级别按需生成
+        logging.info(f"收到了来自 {bot_username} 的响应 (消息ID {message.id})。")
+        # 按钮面板只遍历一次，日志分析和查找按钮共用同一个索引
+        keyboard = KeyboardIndex(message.reply_markup)
+        logging.debug("从 %s 收到新消息: %s", bot_username, LazyRepr(describe_message, message, keyboard))
+
+        if not message.reply_markup:
+            logging.info(f"消息没有按钮面板: {message.text}")
 
-                logging.info(f"对 {bot_username} 的操作已完成。")
-                return "签到成功" in str(detailed_msg) or "已签到" in str(detailed_msg) or "已经签到" in str(detailed_msg)
+        with runtime.span(bot_username, "button_resolution"):
+            target_button = find_button(message, button, keyboard)
+        if not target_button:
+            logging.warning(f"在 {bot_username} 的响应中未找到指定的按钮。定义: {button_def}")
+            # 如果找不到按钮，尝试直接发送几个常见的签到命令
+            logging.info("找不到指定按钮，尝试直接发送签到命令...")
+            return await try_direct_commands(client, bot_username)
+
+        logging.info(f"找到按钮 '{target_button.text}'...")
+        logging.debug("按钮详细信息: %s", LazyRepr(analyze_button, target_button))
+
+        if getattr(target_button, 'data', None):
+            # 对于回调按钮，发送回调查询，同时等待弹窗、新消息或原消息被编辑
+            logging.info(f"检测到回调按钮，使用回调数据: {target_button.data.decode('utf-8', 'replace')}")
+            outcome, source, response_text = await wait_for_outcome(
+                client, bot_username, message.id, callback_data=target_button.data,
+                timeout=runtime.timeout_for(bot_username, 15.0, "回调结果")
+            )
+        else:
+            # 回复键盘按钮，发送按钮文本作为消息
+            logging.info("非回调按钮，作为回复键盘按钮处理，发送按钮文本。")
+            outcome, source, response_text = await wait_for_outcome(
+                client, bot_username, message.id, text=target_button.text,
+                timeout=runtime.timeout_for(bot_username, 20.0, "按钮文本响应")
+            )
+            if response_text is None:
+                logging.warning("发送按钮文本后，等待机器人响应超时。")
+                # 按钮点击和发送文本都失败后尝试第三种方法：直接发送通用签到命令
+                logging.info("尝试第三种方法：直接发送签到命令...")
+                return await try_direct_commands(client, bot_username)
+
+        if outcome:
+            logging.info(f"✅ 通过{RESPONSE_SOURCES[source]}检测到签到成功或已签到信息，任务完成！响应: {response_text}")
+            if getattr(target_button, 'data', None):
+                try:
+                    data = target_button.data.decode('utf-8')
+                    remember_strategy(client, bot_username, "callback", data, start_command)
+                    runtime.keyboards.remember(bot_username, message.id, data)
+                except UnicodeDecodeError:
+                    remember_strategy(client, bot_username, "position", keyboard.position_of(target_button), start_command)
             else:
-                logging.warning(f"在 {bot_username} 的响应中未找到指定的按钮。定义: {button_def}")
-                
-                # 如果找不到按钮，尝试直接发送几个常见的签到命令
-                logging.info("找不到指定按钮，尝试直接发送签到命令...")
-                direct_commands = ["/sign", "/checkin", "/签到", "/打卡", "签到", "打卡", "check in"]
-                
-                for cmd in direct_commands:
-                    cmd_future = client.loop.create_future()
-                    
-                    @client.on(NewMessage(from_users=bot_username))
-                    async def cmd_handler(event):
-                        detailed_msg = await analyze_message(event.message)
-                        logging.info(f"命令 '{cmd}' 响应: {detailed_msg}")
-                        if not cmd_future.done():
-                            cmd_future.set_result(event.message)
-                            client.remove_event_handler(cmd_handler)
-                    
-                    logging.info(f"尝试发送命令: {cmd}")
-                    await client.send_message(bot_username, cmd)
-                    
-                    try:
-                        # 增加超时时间到8秒
-                        cmd_response = await asyncio.wait_for(cmd_future, timeout=8.0)
-                        response_text = cmd_response.text.strip()
-                        logging.info(f"✅ 命令 '{cmd}' 收到响应: {response_text}")
-                        
-                        # 检查是否包含签到成功或已签到的关键词
-                        if any(keyword in response_text for keyword in ["签到成功", "已经签到", "已签到", "签到奖励"]):
-                            logging.info(f"通过命令 '{cmd}' 检测到签到成功或已签到信息，任务完成！")
-                            return True
-                        
-                        # 成功收到响应，不再尝试其他命令
-                        break
-                    except asyncio.TimeoutError:
-                        logging.info(f"命令 '{cmd}' 无响应，尝试下一个命令...")
-                        client.remove_event_handler(cmd_handler)
-                    except Exception as e:
-                        logging.error(f"处理命令 '{cmd}' 时出错: {e}")
-                        client.remove_event_handler(cmd_handler)
+                remember_strategy(client, bot_username, "text", target_button.text, start_command)
+            return True
+        if outcome is False:
+            logging.warning(f"{bot_username} 返回了签到失败信息: {response_text}")
+        elif response_text:
+            logging.warning(f"未能从 {bot_username} 的响应中判断签到结果，最后的响应: {response_text}")
+        else:
+            logging.warning(f"点击后未收到 {bot_username} 的任何响应。")
 
-        except asyncio.TimeoutError:
-            logging.error(f"等待 {bot_username} 响应超时。")
-            return False
-        finally:
-            # 确保事件处理器被移除
-            if not future.done():
-                client.remove_event_handler(handler)
-                
-        # 如果所有尝试都未明确检测到签到成功或已签到，但没有出错，返回False
+        logging.info(f"对 {bot_username} 的操作已完成。")
         return False
 
+    except STALE_PEER_ERRORS as e:
+        logging.error(f"Telegram 拒绝了 {bot_username} 的缓存 peer: {e}")
+        get_runtime(client).peers.invalidate(bot_username)
+        return False
+    except FloodWaitError as e:
+        logging.error(f"向 {bot_username} 发送的请求被 Telegram 限流，需要等待 {e.seconds} 秒，本次放弃。")
+        runtime.health.note_throttled(bot_username)
+        return False
     except Exception as e:
         logging.error(f"处理 {bot_username} 时发生错误: {e}")
         return False
 
 
-async def monitor_mode(client, bot_username):
-    """监听模式：记录与特定机器人的所有交互"""
-    logging.info(f"启动监听模式，监听与 {bot_username} 的所有交互...")
-    
-    @client.on(NewMessage(from_users=bot_username))
-    async def bot_handler(event):
-        detailed_msg = await analyze_message(event.message)
-        logging.info(f"监听到来自 {bot_username} 的新消息: {detailed_msg}")
-    
-    @client.on(NewMessage(outgoing=True, to_users=bot_username))
-    async def user_handler(event):
-        logging.info(f"监听到用户向 {bot_username} 发送消息: {event.message.text}")
-    
-    @client.on(CallbackQuery())
-    async def callback_handler(event):
-        if hasattr(event, 'chat') and event.chat and hasattr(event.chat, 'username') and event.chat.username == bot_username.replace('@', ''):
-            logging.info(f"监听到回调查询事件: {event.query}")
+async def monitor_mode(client, bot_configs):
+    """
+    监听模式：在同一个客户端中记录与所有已配置机器人的交互，每个机器人写入各自的记录文件。
+    """
+    # 监听相关的代码只有监听模式会用到，不在签到路径上导入
+    from monitor import CaptureStreams, DEFAULT_CAPTURE_DIR, rotation_options, rotation_settings, watch_bots
+
+    groups = group_configs_by_bot(bot_configs)
+    start_commands = {bot_username: configs[0].start_command for bot_username, configs in groups.items()}
+    capture_dir = os.environ.get('MONITOR_CAPTURE_DIR', DEFAULT_CAPTURE_DIR)
+    logging.info(f"启动监听模式，监听 {len(groups)} 个机器人，交互记录保存到 {capture_dir} 目录...")
+
+    streams = CaptureStreams(capture_dir, list(groups), **rotation_options(**rotation_settings()))
+    try:
+        await watch_bots(client, list(groups), streams, start_commands)
+    finally:
+        streams.close()
+
+
+# --- 并发签到引擎 ---
+def get_engine_settings():
+    """
+    从环境变量读取并发引擎的参数。
+
+    Returns:
+        tuple: (concurrency, retry_delay)，分别为同时处理的机器人数量上限，
+        以及同一机器人的备用配置之间的等待秒数。
+    """
+    try:
+        concurrency = max(1, int(os.environ.get('CHECKIN_CONCURRENCY', '5')))
+    except ValueError:
+        logging.warning("CHECKIN_CONCURRENCY 不是有效的整数，使用默认值 5。")
+        concurrency = 5
+    try:
+        retry_delay = max(0.0, float(os.environ.get('CHECKIN_RETRY_DELAY', '5')))
+    except ValueError:
+        logging.warning("CHECKIN_RETRY_DELAY 不是有效的数字，使用默认值 5。")
+        retry_delay = 5.0
+    return concurrency, retry_delay
+
+def get_account_settings():
+    """
+    从环境变量读取多账户运行的参数。
+
+    Returns:
+        tuple: (account_concurrency, workers)，分别为同时在线的账户数量上限（0 表示不限制）
+        和工作进程数量。
+    """
+    try:
+        account_concurrency = max(0, int(os.environ.get('ACCOUNT_CONCURRENCY', '0') or 0))
+    except ValueError:
+        logging.warning("ACCOUNT_CONCURRENCY 不是有效的整数，使用默认值 0（不限制）。")
+        account_concurrency = 0
+    try:
+        workers = max(1, int(os.environ.get('ACCOUNT_WORKERS', '1') or 1))
+    except ValueError:
+        logging.warning("ACCOUNT_WORKERS 不是有效的整数，使用默认值 1。")
+        workers = 1
+    return account_concurrency, workers
+
+def group_configs_by_bot(bot_configs):
+    """
+    按 bot_username 对配置分组，组内保持配置文件中的先后顺序（即备用顺序）。
+
+    配置通常已经由 config_loader 在启动时校验过；直接传入的配置字典会在这里转换为 BotConfig，
+    无效的配置记录警告后跳过。
+
+    Returns:
+        dict: {bot_username: [BotConfig, ...]}，按机器人首次出现的顺序排列。
+    """
+    groups = {}
+    for config in bot_configs:
+        if not isinstance(config, BotConfig):
             try:
-                data = event.data.decode('utf-8') if event.data else None
-                logging.info(f"回调数据: {data}")
-            except:
-                logging.info(f"回调数据 (原始): {event.data}")
-    
-    # 只是开始监听，不发送任何命令
-    await client.send_message(bot_username, "您好，我正在进行签到分析，请手动执行签到操作以便我记录操作细节。")
-    logging.info("监听已启动，请手动与机器人互动，系统将记录所有交互。输入 Ctrl+C 结束监听。")
-    
-    # 保持脚本运行
-    while True:
-        await asyncio.sleep(60)
+                config = BotConfig.from_dict(config)
+            except ValueError as e:
+                logging.warning(f"跳过一个无效的机器人配置: {config}（{e}）")
+                continue
+        groups.setdefault(config.bot_username, []).append(config)
+    return groups
 
+async def probe_bot(client: TelegramClient, bot_username: str, start_command: str):
+    """
+    向熔断中的机器人发送一次启动命令，检查它是否恢复响应。只等待一条回复，不尝试任何备用命令。
 
-async def main():
-    """主执行函数"""
-    api_id, api_hash, session_string = get_credentials()
-    if not api_id:
-        return
+    Returns:
+        bool: 机器人有回复时返回 True。
+    """
+    runtime = get_runtime(client)
+    logging.info(f"{bot_username} 处于熔断状态，发送 '{start_command}' 探测是否恢复...")
+    try:
+        with runtime.span(bot_username, "probe"):
+            message = await wait_for_reply(
+                client, bot_username, start_command, timeout=runtime.timeout_for(bot_username, 15.0, "探测响应")
+            )
+    except FloodWaitError as e:
+        logging.error(f"探测 {bot_username} 的请求被 Telegram 限流，需要等待 {e.seconds} 秒，本次放弃。")
+        runtime.health.note_throttled(bot_username)
+        return False
+    except Exception as e:
+        logging.error(f"探测 {bot_username} 时发生错误: {e}")
+        return False
+    return message is not None
 
-    bot_configs = get_bot_configs()
-    if not bot_configs:
-        return
+async def run_bot_chain(client, bot_username, configs, semaphore, retry_delay, day=None, probe=False):
+    """
+    按顺序尝试同一个机器人的所有配置，直到其中一个签到成功。结果会立即写入签到台账和机器人健康记录。
 
-    session = StringSession(session_string) if session_string else "telegram_session"
-    
-    async with TelegramClient(session, api_id, api_hash) as client:
-        user = await client.get_me()
-        logging.info(f"成功登录账户：{user.first_name} (@{user.username})")
+    Args:
+        probe: 为 True 时机器人处于熔断状态，先发送一次探测，有响应才继续签到。
 
-        # 检查命令行参数是否包含 --monitor
-        monitor_mode_enabled = os.environ.get('MONITOR_MODE', '').lower() in ('true', '1', 'yes')
-        
-        if monitor_mode_enabled:
-            # 监听模式
-            first_bot = bot_configs[0]["bot_username"] if bot_configs else "@micu_user_bot"
-            await monitor_mode(client, first_bot)
-        else:
-            # 正常签到模式
-            success = False
-            for config in bot_configs:
-                bot_username = config.get("bot_username")
-                start_command = config.get("start_command")
-                button_def = config.get("checkin_button")
-
-                if not all([bot_username, start_command]):
-                    logging.warning(f"跳过一个不完整的机器人配置: {config}")
+    Returns:
+        dict: 该机器人的签到结果，包含 bot_username、success、attempts 和 error。
+    """
+    result = {"bot_username": bot_username, "success": False, "attempts": 0, "error": None}
+    runtime = get_runtime(client)
+    strategies = runtime.strategies
+    started = runtime.health.clock()
+
+    async with semaphore:
+        if probe and not await probe_bot(client, bot_username, configs[0].start_command):
+            if runtime.health.throttled_since(bot_username, started):
+                result["error"] = "熔断探测被限流"
+            else:
+                runtime.health.record(bot_username, "timeout")
+                result["error"] = "熔断探测无响应"
+            return result
+
+        with runtime.span(bot_username, "checkin"):
+            for index, config in enumerate(plan_attempts(bot_username, configs, strategies)):
+                if index > 0 and retry_delay:
+                    logging.info(f"{bot_username} 的上一个配置未成功，等待 {retry_delay:g} 秒后尝试下一个配置...")
+                    await asyncio.sleep(retry_delay)
+
+                result["attempts"] += 1
+                try:
+                    success = await click_button(client, bot_username, config.button, config.start_command)
+                except Exception as e:
+                    logging.error(f"处理 {bot_username} 的第 {index + 1} 个配置时发生错误: {e}")
+                    result["error"] = str(e)
                     continue
-                
-                success = await click_button(client, bot_username, button_def, start_command)
+
                 if success:
-                    logging.info(f"✅ {bot_username} 签到成功或确认已签到，不再尝试其他配置。")
+                    logging.info(f"✅ {bot_username} 签到成功或确认已签到，不再尝试该机器人的其他配置。")
+                    result["success"] = True
+                    result["error"] = None
                     break
-                    
-                logging.info(f"已完成对 {bot_username} 的处理。等待 5 秒进入下一个任务...")
-                await asyncio.sleep(5)
-            
-            if success:
-                logging.info("签到任务已成功完成！")
+                strategies.record_failure(bot_username, config.strategy)
+
+    if result["success"]:
+        runtime.health.record(bot_username, "success")
+    elif runtime.health.responded_since(bot_username, started):
+        runtime.health.record(bot_username, "failure")
+    elif runtime.health.throttled_since(bot_username, started):
+        # 请求被账户级别的 FloodWait 拦下，没有到达机器人，不能说明机器人无响应
+        logging.info(f"{bot_username} 本轮的请求被限流，结果不计入机器人健康记录。")
+    else:
+        # 整轮都没有任何响应才算作 timeout，计入熔断
+        runtime.health.record(bot_username, "timeout")
+    runtime.ledger.record(runtime.account, bot_username, result["success"], result["attempts"], day or checkin_day())
+    return result
+
+async def run_checkins(client, bot_configs, concurrency=None, retry_delay=None):
+    """
+    并发执行所有机器人的签到：不同机器人并行，同一机器人的配置按顺序作为备用。
+
+    Args:
+        client: 已连接的 TelegramClient 实例。
+        bot_configs: BOT_CONFIGS 格式的配置列表。
+        concurrency: 同时处理的机器人数量上限，默认读取 CHECKIN_CONCURRENCY。
+        retry_delay: 同一机器人两次尝试之间的等待秒数，默认读取 CHECKIN_RETRY_DELAY。
+
+    Returns:
+        list: 每个机器人一条结果，顺序与配置中机器人首次出现的顺序一致。
+    """
+    default_concurrency, default_retry_delay = get_engine_settings()
+    concurrency = concurrency or default_concurrency
+    retry_delay = default_retry_delay if retry_delay is None else retry_delay
+
+    groups = group_configs_by_bot(bot_configs)
+    if not groups:
+        logging.warning("没有可用的机器人配置。")
+        return []
+
+    runtime = get_runtime(client)
+    runtime.classifier = ResponseClassifier.from_configs(config for configs in groups.values() for config in configs)
+    order = list(groups)
+    results = {}
+
+    # 跳过今天已经签到成功的机器人（重新运行或中途崩溃后只处理未完成的部分）
+    day = checkin_day()
+    if os.environ.get('CHECKIN_FORCE', '').lower() not in ('true', '1', 'yes'):
+        done = runtime.ledger.done_bots(runtime.account, day)
+        for bot_username in order:
+            if bot_key(bot_username) in done:
+                results[bot_username] = {"bot_username": bot_username, "success": True, "attempts": 0,
+                                         "error": None, "skipped": True}
+                del groups[bot_username]
+        if results:
+            logging.info(f"{len(results)} 个机器人在 {day} 已签到成功，本次跳过。")
+
+    # 熔断中的机器人本次跳过，到了探测时间的只先发送一次探测
+    probes = set()
+    for bot_username in list(groups):
+        state = runtime.health.state(bot_username)
+        if state == HEALTH_OPEN:
+            probe_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(runtime.health.open_until(bot_username)))
+            results[bot_username] = {"bot_username": bot_username, "success": False, "attempts": 0,
+                                     "error": f"连续无响应，已暂停签到，{probe_at} 后探测", "circuit_open": True}
+            del groups[bot_username]
+        elif state == HEALTH_PROBE:
+            probes.add(bot_username)
+
+    # 一次性并发解析所有机器人，之后的调用都直接使用缓存的 InputPeer
+    resolved = await runtime.peers.resolve_all(client, groups)
+    for bot_username, peer in resolved.items():
+        if isinstance(peer, Exception):
+            results[bot_username] = {"bot_username": bot_username, "success": False, "attempts": 0, "error": str(peer)}
+            # 解析请求被限流时无法判断机器人是否可用，不计入熔断
+            if not isinstance(peer, FloodWaitError):
+                runtime.health.record(bot_username, "timeout")
+            del groups[bot_username]
+
+    # 最近健康的机器人先占用并发名额，经常无响应的机器人排在后面，不拖慢其它机器人
+    def health_rank(bot_username):
+        score = runtime.health.score(bot_username)
+        return -1.0 if score is None else -score
+
+    logging.info(f"共 {len(groups)} 个机器人待签到，并发上限为 {concurrency}。")
+    semaphore = asyncio.Semaphore(concurrency)
+    for result in await asyncio.gather(*(
+        run_bot_chain(client, bot_username, groups[bot_username], semaphore, retry_delay, day,
+                      probe=bot_username in probes)
+        for bot_username in sorted(groups, key=health_rank)
+    )):
+        results[result["bot_username"]] = result
+    runtime.save()
+    return [results[bot_username] for bot_username in order]
+
+# --- 多账户运行 ---
+async def connect_account(client, account):
+    """
+    连接并检查账户授权，返回该客户端的运行时状态。
+
+    连接在后台进行的同时加载本地状态（peer 缓存、学到的签到方法等），随后只做一次授权检查；
+    get_me() 只用于记录账户名称，放到后台与签到并行执行，不占用启动的关键路径。
+
+    Raises:
+        RuntimeError: 会话无效或已过期时抛出。
+    """
+    name = account["name"]
+    startup = StartupTimer(name)
+    connecting = asyncio.ensure_future(client.connect())
+    await asyncio.sleep(0)
+    runtime = get_runtime(client, name)
+    runtime.startup = startup
+    await connecting
+    startup.mark("connect")
+
+    if not await client.is_user_authorized():
+        raise RuntimeError("会话无效或已过期，请重新生成会话字符串")
+    startup.mark("auth")
+
+    def log_user(task):
+        if not task.cancelled() and task.exception() is None and task.result():
+            user = task.result()
+            logging.info(f"账户 {name} 成功登录：{user.first_name} (@{user.username})")
+
+    runtime.me = asyncio.ensure_future(client.get_me())
+    runtime.me.add_done_callback(log_user)
+    return runtime
+
+async def run_account(api_id, api_hash, account):
+    """
+    连接单个账户并执行它的所有机器人签到。
+
+    Returns:
+        list: 该账户每个机器人的签到结果，每条结果都带有 account 字段。
+    """
+    name = account["name"]
+    client = make_client(account, api_id, api_hash)
+    try:
+        await connect_account(client, account)
+        results = await run_checkins(client, account["bot_configs"], concurrency=account["concurrency"])
+    except Exception as e:
+        logging.error(f"账户 {name} 运行失败: {e}")
+        results = [
+            {"bot_username": bot_username, "success": False, "attempts": 0, "error": str(e)}
+            for bot_username in group_configs_by_bot(account["bot_configs"])
+        ]
+    finally:
+        await client.disconnect()
+
+    for result in results:
+        result["account"] = name
+    return results
+
+async def run_accounts(api_id, api_hash, accounts):
+    """
+    在同一个事件循环中并发运行多个账户，同时在线的账户数由 ACCOUNT_CONCURRENCY 限制（0 表示不限制）。
+
+    Returns:
+        list: 所有账户的签到结果，按账户顺序合并。
+    """
+    limit, _ = get_account_settings()
+    semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def run_limited(account):
+        if semaphore is None:
+            return await run_account(api_id, api_hash, account)
+        async with semaphore:
+            return await run_account(api_id, api_hash, account)
+
+    account_results = await asyncio.gather(*(run_limited(account) for account in accounts))
+    return [result for results in account_results for result in results]
+
+def _run_accounts_in_process(api_id, api_hash, accounts):
+    """
+    工作进程入口：在独立的事件循环中运行一批账户。
+
+    Returns:
+        tuple: (签到结果, 该批账户的 metrics 快照)，由主进程合并。
+    """
+    metrics.RUN.clear()
+    results = asyncio.run(run_accounts(api_id, api_hash, accounts))
+    return results, metrics.RUN.snapshot()
+
+async def run_all_accounts(api_id, api_hash, accounts):
+    """
+    运行所有账户。ACCOUNT_WORKERS 大于 1 时把账户平均分配到多个工作进程，
+    每个进程在自己的事件循环中运行分到的账户；否则全部在当前事件循环中运行。
+    """
+    workers = min(get_account_settings()[1], len(accounts))
+    if workers <= 1:
+        return await run_accounts(api_id, api_hash, accounts)
+
+    logging.info(f"共 {len(accounts)} 个账户，使用 {workers} 个工作进程。")
+    batches = [accounts[i::workers] for i in range(workers)]
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batch_results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _run_accounts_in_process, api_id, api_hash, batch)
+            for batch in batches
+        ))
+
+    # 按原始账户顺序合并结果
+    by_account = {}
+    for results, snapshot in batch_results:
+        metrics.RUN.merge(snapshot)
+        for result in results:
+            by_account.setdefault(result["account"], []).append(result)
+    return [result for account in accounts for result in by_account.get(account["name"], [])]
+
+# --- 守护进程模式 ---
+# 连接断开后重新连接的等待秒数，依次递增，之后一直使用最后一个值
+DAEMON_RECONNECT_DELAYS = (5, 15, 30, 60, 120, 300)
+# 空闲时最长的睡眠秒数，到点后检查一次连接和计划
+DAEMON_TICK = 60
+
+def get_daemon_retry_delay():
+    """读取守护进程模式下签到失败后的重试间隔（秒），默认 1800。"""
+    try:
+        return max(0.0, float(os.environ.get('CHECKIN_DAEMON_RETRY', '1800')))
+    except ValueError:
+        logging.warning("CHECKIN_DAEMON_RETRY 不是有效的数字，使用默认值 1800。")
+        return 1800.0
+
+async def ensure_connected(client, name):
+    """确保客户端处于连接状态，断开时按 DAEMON_RECONNECT_DELAYS 退避重连，直到成功。"""
+    attempt = 0
+    while not client.is_connected():
+        if attempt:
+            delay = DAEMON_RECONNECT_DELAYS[min(attempt, len(DAEMON_RECONNECT_DELAYS)) - 1]
+            logging.info(f"账户 {name} 将在 {delay} 秒后重新连接...")
+            await asyncio.sleep(delay)
+        attempt += 1
+        try:
+            await client.connect()
+        except (OSError, ConnectionError) as e:
+            logging.warning(f"账户 {name} 连接失败: {e}")
+            continue
+        if attempt > 1:
+            logging.info(f"账户 {name} 已重新连接到 Telegram。")
+
+async def daemon_loop(client, account, scheduler, stop=None):
+    """
+    守护进程的主循环：保持客户端在线，按计划执行到期的签到，直到 stop 被设置。
+
+    启动时已经错过计划时间且今天尚未签到成功的机器人会立即执行；签到失败的机器人在
+    CHECKIN_DAEMON_RETRY 秒后重试。
+    """
+    name = account["name"]
+    runtime = get_runtime(client, name)
+    stop = stop or asyncio.Event()
+    retry_delay = get_daemon_retry_delay()
+    scheduler.describe(datetime.datetime.now(datetime.timezone.utc))
+
+    while not stop.is_set():
+        await ensure_connected(client, name)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        done = runtime.ledger.done_bots(name, checkin_day(now=now))
+        due = scheduler.due(now, done)
+
+        if due:
+            logging.info(f"账户 {name} 有 {len(due)} 个机器人到达签到时间: {', '.join(due)}")
+            due_configs = [config for config in account["bot_configs"] if config.get("bot_username") in due]
+            try:
+                results = await run_checkins(client, due_configs, concurrency=account["concurrency"])
+            except Exception as e:
+                logging.error(f"账户 {name} 执行签到时发生错误: {e}")
+                results = [{"bot_username": bot_username, "success": False} for bot_username in due]
             else:
-                logging.warning("所有配置都已尝试，但未检测到明确的签到成功信息。")
+                for result in results:
+                    result["account"] = name
+                log_checkin_report(results)
+                metrics.RUN.record_results(results)
+                export_metrics()
+
+            finished = datetime.datetime.now(datetime.timezone.utc)
+            for result in results:
+                if not result["success"]:
+                    # 熔断中的机器人等到下一次探测时间再处理
+                    probe_at = runtime.health.open_until(result["bot_username"])
+                    delay = max(retry_delay, probe_at - finished.timestamp()) if probe_at else retry_delay
+                    scheduler.defer(result["bot_username"], finished, delay)
+            continue
+
+        wakeup = scheduler.next_wakeup(now, done)
+        timeout = DAEMON_TICK if wakeup is None else min(DAEMON_TICK, max(0.0, (wakeup - now).total_seconds()))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_account_daemon(api_id, api_hash, account, stop=None):
+    """为单个账户保持一个长期连接的客户端并运行守护进程循环。"""
+    name = account["name"]
+    scheduler = CheckinScheduler(account["bot_configs"])
+    client = make_client(account, api_id, api_hash)
+    try:
+        # 常驻运行时不在意冷启动耗时，先确保连接成功（失败时退避重试）再检查授权
+        await ensure_connected(client, name)
+        await connect_account(client, account)
+        logging.info(f"账户 {name} 进入守护进程模式。")
+        await daemon_loop(client, account, scheduler, stop)
+    except RuntimeError as e:
+        logging.error(f"账户 {name} 无法进入守护进程模式: {e}")
+    finally:
+        await client.disconnect()
+
+async def daemon_mode(api_id, api_hash, accounts):
+    """守护进程模式：所有账户在同一个事件循环中各自保持连接并按计划签到。"""
+    await asyncio.gather(*(run_account_daemon(api_id, api_hash, account) for account in accounts))
+
+def export_metrics():
+    """导出本次运行的分阶段耗时统计，并在日志中列出每个阶段的 p95。"""
+    try:
+        summary = metrics.RUN.export()
+    except OSError as e:
+        logging.warning(f"无法写入签到统计文件: {e}")
+        return
+    logging.info(f"签到各阶段耗时（运行 {summary['duration']:.1f} 秒）:")
+    for phase, stats in sorted(summary["phases"].items()):
+        logging.info(f"  阶段 {phase}: {stats['count']} 次, p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s")
+
+def log_checkin_report(results):
+    """输出每个机器人的签到结果汇总，多账户时注明所属账户。"""
+    succeeded = [r for r in results if r["success"]]
+    logging.info(f"签到结果汇总: 成功 {len(succeeded)} / {len(results)}")
+    multi_account = len({r.get("account") for r in results}) > 1
+    for result in results:
+        label = f"[{result['account']}] {result['bot_username']}" if multi_account else result['bot_username']
+        if result.get("skipped"):
+            logging.info(f"  ⏭️ {label}: 今日已签到，跳过")
+        elif result.get("circuit_open"):
+            logging.warning(f"  ⏸️ {label}: {result['error']}")
+        elif result["success"]:
+            logging.info(f"  ✅ {label}: 成功 (尝试 {result['attempts']} 次)")
+        else:
+            reason = f", 错误: {result['error']}" if result["error"] else ""
+            logging.warning(f"  ❌ {label}: 失败 (尝试 {result['attempts']} 次{reason})")
+
+
+async def main(daemon=False):
+    """
+    主执行函数
+
+    Args:
+        daemon: 为 True 时进入守护进程模式，常驻运行并按计划每天签到。
+    """
+    api_id, api_hash, session_string = get_credentials()
+    if not api_id:
+        return
+
+    # 在连接 Telegram 之前校验所有机器人配置，配置有误时直接退出
+    try:
+        config_set = load_config_set()
+    except ConfigError as e:
+        logging.error(f"机器人配置有误，请修正后重新运行:\n{e}")
+        return
+    logging.info(f"已从 {config_set.source} 加载 {len(config_set)} 条机器人配置。")
+
+    accounts = get_accounts(session_string, config_set)
+    if not accounts:
+        return
+
+    # 检查环境变量是否启用监听模式
+    monitor_mode_enabled = os.environ.get('MONITOR_MODE', '').lower() in ('true', '1', 'yes')
+
+    if monitor_mode_enabled:
+        # 监听模式：只使用第一个账户
+        account = accounts[0]
+        async with TelegramClient(make_session(account), api_id, api_hash) as client:
+            user = await client.get_me()
+            logging.info(f"成功登录账户：{user.first_name} (@{user.username})")
+            await monitor_mode(client, account["bot_configs"])
+        return
+
+    if daemon:
+        await daemon_mode(api_id, api_hash, accounts)
+        return
+
+    # 正常签到模式：不同账户、不同机器人并发执行
+    results = await run_all_accounts(api_id, api_hash, accounts)
+    log_checkin_report(results)
+    metrics.RUN.record_results(results)
+    export_metrics()
+
+    if results and all(r["success"] for r in results):
+        logging.info("签到任务已成功完成！")
+    else:
+        logging.warning("部分机器人未检测到明确的签到成功信息。")
 
     logging.info("所有签到任务已完成。")
 
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    if "--debug" in sys.argv:
+        # 输出消息和按钮的详细分析；Telethon 自身的调试日志过多，保持 INFO
+        logging.getLogger().setLevel(logging.DEBUG)
+        logging.getLogger('telethon').setLevel(logging.INFO)
+    asyncio.run(main(daemon="--daemon" in sys.argv)) 
\ No newline at end of file
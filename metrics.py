@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+签到过程的分阶段耗时统计。
+
+click_button 等函数在关键阶段（发送启动命令、等待第一条响应、查找按钮、回调请求、判断结果、
+备用命令等）记录耗时，按账户、机器人和阶段汇总。运行结束时导出为 JSON 摘要和 Prometheus
+textfile（可由 node_exporter 的 textfile collector 采集），用于按机器人监控 p95 延迟和超时次数。
+"""
+
+import os
+import json
+import math
+import time
+import contextlib
+
+from checkin_state import state_path
+
+# 每个 (账户, 机器人, 阶段) 最多保留的样本数，守护进程长期运行时内存不会无限增长
+MAX_SAMPLES = 1000
+QUANTILES = (0.5, 0.95)
+PROMETHEUS_PREFIX = "tg_checkin"
+
+def percentile(values, p):
+    """最近秩法计算百分位数，p 取 0~100。"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(len(ordered) * p / 100) - 1))
+    return ordered[index]
+
+def summarize(samples):
+    """返回一组耗时样本（秒）的统计信息。"""
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "sum": round(total, 4),
+        "mean": round(total / len(samples), 4),
+        "p50": round(percentile(samples, 50), 4),
+        "p95": round(percentile(samples, 95), 4),
+        "max": round(max(samples), 4),
+    }
+
+class RunMetrics:
+    """
+    一次运行中各阶段的耗时样本、超时次数和每个机器人的签到结果。
+
+    样本按 (账户, 机器人, 阶段) 分组；多个工作进程的数据通过 snapshot() / merge() 合并。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.started = time.time()
+        self.samples = {}   # {(account, bot, phase): [秒, ...]}
+        self.timeouts = {}  # {(account, bot, phase): 次数}
+        self.results = {}   # {(account, bot): {"success": bool, "attempts": int, "skipped": bool}}
+
+    def observe(self, account, bot_username, phase, seconds):
+        samples = self.samples.setdefault((account, bot_username, phase), [])
+        samples.append(seconds)
+        del samples[:-MAX_SAMPLES]
+
+    @contextlib.contextmanager
+    def span(self, account, bot_username, phase):
+        """记录 with 代码块的耗时。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(account, bot_username, phase, time.perf_counter() - started)
+
+    def timeout(self, account, bot_username, phase):
+        """记录一次等待超时。"""
+        key = (account, bot_username, phase)
+        self.timeouts[key] = self.timeouts.get(key, 0) + 1
+
+    def record_results(self, results):
+        """记录 run_checkins / run_all_accounts 返回的签到结果。"""
+        for result in results:
+            self.results[(result.get("account", "default"), result["bot_username"])] = {
+                "success": result["success"],
+                "attempts": result.get("attempts", 0),
+                "skipped": bool(result.get("skipped")),
+            }
+
+    def snapshot(self):
+        """返回可以在进程之间传递的数据副本。"""
+        return {
+            "samples": {key: list(values) for key, values in self.samples.items()},
+            "timeouts": dict(self.timeouts),
+        }
+
+    def merge(self, snapshot):
+        """合并另一个进程的 snapshot()。"""
+        for key, values in snapshot["samples"].items():
+            for seconds in values:
+                self.observe(*key, seconds)
+        for key, count in snapshot["timeouts"].items():
+            self.timeouts[key] = self.timeouts.get(key, 0) + count
+
+    def summary(self):
+        """
+        汇总为 JSON 可序列化的字典。
+
+        Returns:
+            dict: phases 为整次运行按阶段汇总的统计；bots 为每个机器人的结果、各阶段统计和超时次数。
+        """
+        finished = time.time()
+        by_phase = {}
+        bots = {}
+        for (account, bot_username, phase), samples in self.samples.items():
+            by_phase.setdefault(phase, []).extend(samples)
+            bots.setdefault((account, bot_username), {"phases": {}, "timeouts": {}})["phases"][phase] = summarize(samples)
+        for (account, bot_username, phase), count in self.timeouts.items():
+            bots.setdefault((account, bot_username), {"phases": {}, "timeouts": {}})["timeouts"][phase] = count
+        for key, result in self.results.items():
+            bots.setdefault(key, {"phases": {}, "timeouts": {}}).update(result)
+
+        return {
+            "started_at": round(self.started, 3),
+            "finished_at": round(finished, 3),
+            "duration": round(finished - self.started, 3),
+            "phases": {phase: summarize(samples) for phase, samples in by_phase.items()},
+            "bots": [
+                {"account": account, "bot_username": bot_username, **data}
+                for (account, bot_username), data in bots.items()
+            ],
+        }
+
+    def to_prometheus(self, summary=None):
+        """按 Prometheus 文本格式输出指标。"""
+        summary = summary or self.summary()
+
+        def labels(**values):
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values.values())
+            return "{" + ",".join(f'{name}="{value}"' for name, value in zip(values, escaped)) + "}"
+
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_phase_seconds 签到各阶段的耗时",
+            f"# TYPE {p}_phase_seconds summary",
+        ]
+        for (account, bot_username, phase), samples in sorted(self.samples.items()):
+            for q in QUANTILES:
+                value = percentile(samples, q * 100)
+                lines.append(f"{p}_phase_seconds{labels(account=account, bot=bot_username, phase=phase, quantile=q)} {value:.6f}")
+            common = labels(account=account, bot=bot_username, phase=phase)
+            lines.append(f"{p}_phase_seconds_sum{common} {sum(samples):.6f}")
+            lines.append(f"{p}_phase_seconds_count{common} {len(samples)}")
+
+        lines += [f"# HELP {p}_timeouts_total 等待机器人响应超时的次数", f"# TYPE {p}_timeouts_total counter"]
+        for (account, bot_username, phase), count in sorted(self.timeouts.items()):
+            lines.append(f"{p}_timeouts_total{labels(account=account, bot=bot_username, phase=phase)} {count}")
+
+        lines += [f"# HELP {p}_success 最近一次签到是否成功（1 成功或已签到，0 失败）", f"# TYPE {p}_success gauge"]
+        for (account, bot_username), result in sorted(self.results.items()):
+            lines.append(f"{p}_success{labels(account=account, bot=bot_username)} {int(result['success'])}")
+        lines += [f"# HELP {p}_attempts 最近一次签到尝试的配置数", f"# TYPE {p}_attempts gauge"]
+        for (account, bot_username), result in sorted(self.results.items()):
+            lines.append(f"{p}_attempts{labels(account=account, bot=bot_username)} {result['attempts']}")
+
+        lines += [
+            f"# HELP {p}_run_duration_seconds 最近一次运行的总耗时",
+            f"# TYPE {p}_run_duration_seconds gauge",
+            f"{p}_run_duration_seconds {summary['duration']:.3f}",
+            f"# HELP {p}_last_run_timestamp_seconds 最近一次运行结束的时间",
+            f"# TYPE {p}_last_run_timestamp_seconds gauge",
+            f"{p}_last_run_timestamp_seconds {summary['finished_at']:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path=None, prom_path=None):
+        """
+        把汇总写入 JSON 文件和 Prometheus textfile。
+
+        路径默认读取 CHECKIN_METRICS_JSON 和 CHECKIN_METRICS_PROM，未设置时写入状态目录下的
+        metrics.json 和 checkin.prom；设为空字符串则不写该文件。
+
+        Returns:
+            dict: 写入的汇总。
+        """
+        if json_path is None:
+            json_path = os.environ.get('CHECKIN_METRICS_JSON', state_path("metrics.json"))
+        if prom_path is None:
+            prom_path = os.environ.get('CHECKIN_METRICS_PROM', state_path("checkin.prom"))
+
+        summary = self.summary()
+        if json_path:
+            _write_atomic(json_path, json.dumps(summary, ensure_ascii=False, indent=2))
+        if prom_path:
+            _write_atomic(prom_path, self.to_prometheus(summary))
+        return summary
+
+def _write_atomic(path, text):
+    """先写临时文件再替换，采集程序不会读到写了一半的文件。"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# 当前进程的运行统计
+RUN = RunMetrics()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+
+import pytest
+
+import checkin_state
+import main
+import metrics
+from fake_telegram import FakeBot, FakeTelegramClient
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkin_state, "STATE_DIR", str(tmp_path))
+    metrics.RUN.clear()
+    return metrics.RUN
+
+def run_fleet(bots, configs):
+    async def go():
+        async with FakeTelegramClient(bots) as client:
+            return await main.run_checkins(client, configs, retry_delay=0)
+    return asyncio.run(go())
+
+def test_phases_are_recorded_per_bot(tmp_path):
+    bots = [
+        FakeBot("@callback_bot", delay=0.01),
+        FakeBot("@fallback_bot", checkin_button="领取", keyboard="reply", delay=0.01, commands={"/sign": "签到成功"}),
+    ]
+    configs = [
+        {"bot_username": "@callback_bot", "start_command": "/start", "checkin_button": {"data": "checkin"}},
+        {"bot_username": "@fallback_bot", "start_command": "/start", "checkin_button": "签到"},
+    ]
+    results = run_fleet(bots, configs)
+    assert all(r["success"] for r in results)
+    metrics.RUN.record_results(results)
+
+    summary = metrics.RUN.export(str(tmp_path / "metrics.json"), str(tmp_path / "checkin.prom"))
+    bots = {b["bot_username"]: b for b in summary["bots"]}
+    assert {"send_start", "first_response", "button_resolution", "callback_rpc", "outcome", "checkin"} <= set(bots["@callback_bot"]["phases"])
+    assert "fallback_command:/sign" in bots["@fallback_bot"]["phases"]
+    assert bots["@callback_bot"]["success"] and summary["phases"]["checkin"]["count"] == 2
+
+    assert json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8")) == summary
+    prom = (tmp_path / "checkin.prom").read_text(encoding="utf-8")
+    assert 'tg_checkin_phase_seconds{account="default",bot="@callback_bot",phase="outcome",quantile="0.95"}' in prom
+    assert 'tg_checkin_success{account="default",bot="@fallback_bot"} 1' in prom
+
+def test_timeouts_are_counted_and_merged():
+    bot = FakeBot("@silent_bot", silent=True)
+    configs = [{"bot_username": "@silent_bot", "start_command": "/start", "checkin_button": None}]
+    worker = metrics.RunMetrics()
+    worker.timeout("alt", "@silent_bot", "command")
+
+    async def go():
+        async with FakeTelegramClient([bot]) as client:
+            # 把等待超时压缩到 0.05 秒
+            latency = main.get_runtime(client).latency
+            latency.floor = latency.ceiling = 0.05
+            return await main.run_checkins(client, configs, retry_delay=0)
+
+    assert not asyncio.run(go())[0]["success"]
+    metrics.RUN.merge(worker.snapshot())
+    assert metrics.RUN.timeouts == {("default", "@silent_bot", "command"): 1, ("alt", "@silent_bot", "command"): 1}
+    assert 'tg_checkin_timeouts_total{account="default",bot="@silent_bot",phase="command"} 1' in metrics.RUN.to_prometheus()
@@ -2,22 +2,28 @@ import os
 import asyncio
 import logging
 import json
-import sys
-from telethon import TelegramClient
+import base64
+import argparse
+from collections import OrderedDict
+from telethon import TelegramClient, utils
 from telethon.sessions import StringSession
 from telethon.tl.types import Message, MessageService, KeyboardButtonCallback, KeyboardButton
-from telethon.events import NewMessage, CallbackQuery, MessageEdited
+from telethon.events import NewMessage, MessageEdited
+from capture import CaptureWriter
+from checkin_state import bot_key
+from config_loader import ConfigError, load_config_set
 
 # --- 日志记录设置 ---
+# 控制台输出便于阅读的日志；完整的交互记录由 CaptureWriter 在后台线程写入 JSON Lines 文件
 logging.basicConfig(
     level=logging.INFO, 
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("monitor_logs.txt", mode='w'),
-        logging.StreamHandler()
-    ]
 )
 
+DEFAULT_CAPTURE_DIR = "monitor_captures"
+# 每个机器人在内存中保留的最近按钮面板数量
+MESSAGE_INDEX_SIZE = 256
+
 # --- 配置加载 ---
 def get_credentials():
     """从配置文件中获取凭据"""
@@ -47,7 +53,7 @@ def analyze_button(button):
         
     return button_info
 
-async def analyze_message(message):
+def analyze_message(message):
     """分析消息的详细内容，包括按钮结构"""
     if not message:
         return "消息为空"
@@ -72,8 +78,239 @@ async def analyze_message(message):
     
     return result
 
-async def monitor_bot(bot_username):
-    """监听指定机器人的所有交互"""
+def encode_data(data):
+    """回调数据能按 UTF-8 解码时记录为文本，否则记录为 base64。"""
+    try:
+        return {"data": data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {"data_b64": base64.b64encode(data).decode('ascii')}
+
+def message_record(kind, bot_username, message):
+    """
+    把一条消息转换为紧凑的记录。
+
+    Args:
+        kind: "message"（机器人的新消息）、"edit"（机器人编辑消息）或 "outgoing"（发给机器人的消息）。
+    """
+    record = {
+        "type": kind,
+        "bot": bot_username,
+        "chat_id": message.chat_id,
+        "message_id": message.id,
+        "text": message.text if hasattr(message, 'text') else None,
+    }
+    markup = getattr(message, 'reply_markup', None)
+    if markup and hasattr(markup, 'rows'):
+        record["markup"] = type(markup).__name__
+        record["buttons"] = []
+        for i, row in enumerate(markup.rows):
+            for j, button in enumerate(row.buttons):
+                button_record = {"row": i, "col": j, "type": type(button).__name__, "text": button.text}
+                if getattr(button, 'data', None):
+                    button_record.update(encode_data(button.data))
+                record["buttons"].append(button_record)
+    return record
+
+def capture_path(capture_dir, bot_username):
+    """返回机器人的交互记录文件路径，每个机器人一个文件。"""
+    return os.path.join(capture_dir, f"{bot_key(bot_username)}.jsonl")
+
+def env_number(name):
+    """读取数字类型的环境变量，未设置或无效时返回 None。"""
+    value = os.environ.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"{name} 不是有效的数字，忽略该设置。")
+        return None
+
+def rotation_settings():
+    """
+    从环境变量读取记录文件的轮转设置，monitor.py 的命令行参数和 main.py 的监听模式共用。
+
+    Returns:
+        dict: {"rotate_mb", "rotate_minutes", "gzip"}，分别来自 MONITOR_ROTATE_MB、MONITOR_ROTATE_MINUTES
+        和 MONITOR_GZIP。
+    """
+    return {
+        "rotate_mb": env_number('MONITOR_ROTATE_MB'),
+        "rotate_minutes": env_number('MONITOR_ROTATE_MINUTES'),
+        "gzip": os.environ.get('MONITOR_GZIP', '').lower() in ('true', '1', 'yes'),
+    }
+
+def rotation_options(rotate_mb=None, rotate_minutes=None, gzip=False):
+    """把轮转设置转换为 CaptureWriter 的参数（max_bytes、interval、compress）。"""
+    return {
+        "max_bytes": int(rotate_mb * 1024 * 1024) if rotate_mb else None,
+        "interval": rotate_minutes * 60 if rotate_minutes else None,
+        "compress": gzip,
+    }
+
+class CaptureStreams:
+    """为每个被监听的机器人维护一个独立的 CaptureWriter。"""
+
+    def __init__(self, capture_dir, bot_usernames, **options):
+        """
+        Args:
+            capture_dir: 记录文件所在的目录。
+            bot_usernames: 要监听的机器人用户名列表。
+            options: 传给 CaptureWriter 的轮转参数（max_bytes、interval、compress）。
+        """
+        self.writers = {bot: CaptureWriter(capture_path(capture_dir, bot), **options) for bot in bot_usernames}
+
+    def write(self, bot_username, record):
+        self.writers[bot_username].write(record)
+
+    def close(self):
+        for bot_username, writer in self.writers.items():
+            writer.close()
+            logging.info(f"{bot_username}: 共写入 {writer.records} 条交互记录 ({writer.path})")
+
+class MessageIndex:
+    """
+    单个机器人最近的按钮面板消息的有界索引。
+
+    Telegram 只把 CallbackQuery 事件发给机器人账户，用户账户的监听会话看不到按钮点击本身。
+    机器人通常通过编辑带按钮的消息来响应点击，因此收到对索引中面板消息的编辑时，
+    把它视为对该面板按钮点击的响应，并记下编辑前的文本和按钮，不需要调用 get_messages()。
+    点击后机器人发送的新消息无法与点击关联，按普通消息记录。
+    """
+
+    def __init__(self, limit=MESSAGE_INDEX_SIZE):
+        self.limit = limit
+        self.messages = OrderedDict()   # {message_id: 记录}
+
+    def remember(self, record):
+        """记录一条带按钮面板的消息（新消息或编辑后的消息），没有按钮的消息会从索引中移除。"""
+        message_id = record["message_id"]
+        if not record.get("buttons"):
+            self.messages.pop(message_id, None)
+            return
+        self.messages[message_id] = record
+        self.messages.move_to_end(message_id)
+        while len(self.messages) > self.limit:
+            self.messages.popitem(last=False)
+
+    def before_edit(self, record):
+        """返回编辑前的面板消息记录；被编辑的消息不是索引中的面板时返回 None。"""
+        return self.messages.get(record["message_id"])
+
+async def resolve_bots(client, bot_usernames):
+    """
+    一次性解析所有机器人，返回 {peer_id: bot_username}，之后按 peer id 过滤更新。
+
+    无法解析的机器人会被记录并跳过。
+    """
+    peers = {}
+    entities = await asyncio.gather(*(client.get_input_entity(bot) for bot in bot_usernames), return_exceptions=True)
+    for bot_username, entity in zip(bot_usernames, entities):
+        if isinstance(entity, Exception):
+            logging.error(f"无法解析 {bot_username}，不监听该机器人: {entity}")
+            continue
+        peers[utils.get_peer_id(entity)] = bot_username
+    return peers
+
+def log_message_details(title, message):
+    """在控制台输出消息的详细内容和按钮面板，便于人工阅读。"""
+    logging.info(title)
+    logging.info(json.dumps(analyze_message(message), ensure_ascii=False, indent=2))
+
+    if getattr(message, 'reply_markup', None) and hasattr(message.reply_markup, 'rows'):
+        logging.info("检测到按钮面板，详细信息如下:")
+        for i, row in enumerate(message.reply_markup.rows):
+            for j, button in enumerate(row.buttons):
+                logging.info(f"按钮[{i},{j}] - 文本: '{button.text}', 类型: {type(button).__name__}")
+
+                # 针对不同类型按钮的详细信息
+                if isinstance(button, KeyboardButtonCallback):
+                    try:
+                        data = button.data.decode('utf-8')
+                        logging.info(f"  回调数据: {data}")
+                    except UnicodeDecodeError:
+                        logging.info(f"  回调数据(二进制): {button.data}")
+
+async def watch_bots(client, bot_usernames, streams, start_commands=None):
+    """
+    在一个客户端中同时监听多个机器人的所有交互，直到被取消。
+
+    所有机器人共用一组事件处理器，按事件的 chat_id 查找所属的机器人，不属于被监听机器人的更新直接忽略；
+    每个机器人的事件写入各自的记录文件。
+
+    Args:
+        client: 已连接的 TelegramClient 实例。
+        bot_usernames: 要监听的机器人用户名列表。
+        streams: CaptureStreams 实例。
+        start_commands: {bot_username: 命令}，开始监听后发送给各机器人的命令，默认 "/start"。
+    """
+    peers = await resolve_bots(client, bot_usernames)
+    if not peers:
+        logging.error("没有可以监听的机器人。")
+        return
+    start_commands = start_commands or {}
+    indexes = {bot_username: MessageIndex() for bot_username in peers.values()}
+    logging.info(f"开始监听 {len(peers)} 个机器人的所有交互: {', '.join(peers.values())}")
+
+    def record_response(kind, bot_username, message):
+        """写入机器人的新消息或编辑；编辑的是按钮面板消息时，在记录中附上编辑前的文本和按钮。"""
+        record = message_record(kind, bot_username, message)
+        index = indexes[bot_username]
+        if kind == "edit":
+            before = index.before_edit(record)
+            if before:
+                record["before"] = {k: before[k] for k in ("text", "markup", "buttons") if k in before}
+                logging.info(f"{bot_username} 编辑了按钮面板消息 {record['message_id']}，视为对面板按钮点击的响应")
+        index.remember(record)
+        streams.write(bot_username, record)
+
+    # 监听机器人发送的消息
+    @client.on(NewMessage(incoming=True))
+    async def bot_message_handler(event):
+        bot_username = peers.get(event.chat_id)
+        if bot_username is None:
+            return
+        record_response("message", bot_username, event.message)
+        log_message_details(f"收到来自 {bot_username} 的[新]消息:", event.message)
+
+    # 监听机器人发送的编辑消息
+    @client.on(MessageEdited(incoming=True))
+    async def bot_edited_message_handler(event):
+        bot_username = peers.get(event.chat_id)
+        if bot_username is None:
+            return
+        record_response("edit", bot_username, event.message)
+        log_message_details(f"检测到 {bot_username} 编辑了消息:", event.message)
+
+    # 监听发送给机器人的消息
+    @client.on(NewMessage(outgoing=True))
+    async def outgoing_message_handler(event):
+        bot_username = peers.get(event.chat_id)
+        if bot_username is None:
+            return
+        streams.write(bot_username, message_record("outgoing", bot_username, event.message))
+        logging.info(f"发送给 {bot_username} 的消息: {event.message.text}")
+
+    # 发送开始消息
+    for bot_username in peers.values():
+        command = start_commands.get(bot_username, "/start")
+        await client.send_message(bot_username, command)
+        logging.info(f"已发送 {command} 命令给 {bot_username}")
+    logging.info("请手动与机器人互动并进行签到操作，系统会记录所有交互。")
+    logging.info("按 Ctrl+C 结束监听。")
+
+    # 保持客户端运行
+    while True:
+        await asyncio.sleep(3600)
+
+async def monitor_bots(bot_usernames, streams):
+    """
+    使用 config.py 中的凭据登录，监听指定机器人的所有交互
+
+    Args:
+        bot_usernames: 要监听的机器人用户名列表。
+        streams: CaptureStreams 实例。
+    """
     api_id, api_hash = get_credentials()
     if not api_id:
         logging.error("未找到API凭据，请确保config.py文件正确配置")
@@ -87,96 +324,56 @@ async def monitor_bot(bot_username):
     
     user = await client.get_me()
     logging.info(f"已登录账户: {user.first_name} (@{user.username})")
-    logging.info(f"开始监听 {bot_username} 的所有交互...")
-    
-    # 监听机器人发送的消息
-    @client.on(NewMessage(from_users=bot_username))
-    async def bot_message_handler(event):
-        message_details = await analyze_message(event.message)
-        logging.info(f"收到来自 {bot_username} 的[新]消息:")
-        logging.info(json.dumps(message_details, ensure_ascii=False, indent=2))
-        
-        # 特别关注按钮
-        if hasattr(event.message, 'reply_markup') and event.message.reply_markup:
-            logging.info("检测到按钮面板，详细信息如下:")
-            for i, row in enumerate(event.message.reply_markup.rows):
-                for j, button in enumerate(row.buttons):
-                    btn_info = analyze_button(button)
-                    logging.info(f"按钮[{i},{j}] - 文本: '{button.text}', 类型: {type(button).__name__}")
-                    
-                    # 针对不同类型按钮的详细信息
-                    if isinstance(button, KeyboardButtonCallback):
-                        try:
-                            data = button.data.decode('utf-8')
-                            logging.info(f"  回调数据: {data}")
-                        except:
-                            logging.info(f"  回调数据(二进制): {button.data}")
-    
-    # 监听机器人发送的编辑消息
-    @client.on(MessageEdited(from_users=bot_username))
-    async def bot_edited_message_handler(event):
-        message_details = await analyze_message(event.message)
-        logging.info(f"检测到 {bot_username} 编辑了消息:")
-        logging.info(json.dumps(message_details, ensure_ascii=False, indent=2))
-    
-    # 监听发送给机器人的消息
-    @client.on(NewMessage(outgoing=True, chats=bot_username))
-    async def outgoing_message_handler(event):
-        logging.info(f"发送给 {bot_username} 的消息: {event.message.text}")
-
-    # 监听按钮回调
-    @client.on(CallbackQuery)
-    async def callback_handler(event):
-        if not event.chat:
-            return
-            
-        chat_username = event.chat.username if hasattr(event.chat, 'username') else None
-        if chat_username and (f"@{chat_username}" == bot_username or chat_username == bot_username.replace('@', '')):
-            logging.info(f"检测到按钮回调事件")
-            try:
-                data = event.data.decode('utf-8') if event.data else None
-                logging.info(f"按钮回调数据: {data}")
-                
-                # 记录回调后的响应（添加短暂延迟等待响应）
-                await asyncio.sleep(1)
-                messages = await client.get_messages(bot_username, limit=1)
-                if messages:
-                    message_details = await analyze_message(messages[0])
-                    logging.info(f"按钮回调后的最新消息:")
-                    logging.info(json.dumps(message_details, ensure_ascii=False, indent=2))
-            except Exception as e:
-                logging.error(f"处理回调数据时出错: {e}")
 
-    # 发送开始消息
-    await client.send_message(bot_username, "/start")
-    logging.info(f"已发送 /start 命令给 {bot_username}")
-    logging.info("请手动与机器人互动并进行签到操作，系统会记录所有交互。")
-    logging.info("监控日志将保存到 monitor_logs.txt 文件")
-    logging.info("按 Ctrl+C 结束监听。")
-    
-    # 保持客户端运行
     try:
-        while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
+        await watch_bots(client, bot_usernames, streams)
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logging.info("监听结束，正在关闭客户端...")
     finally:
         await client.disconnect()
 
+def configured_bots():
+    """返回机器人配置（bot_configs.py / .toml / .json）中的所有机器人（去重并保持顺序）。"""
+    try:
+        config_set = load_config_set()
+    except ConfigError as e:
+        logging.warning(f"无法加载机器人配置: {e}")
+        return []
+    return list(dict.fromkeys(config.bot_username for config in config_set.all()))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="监听机器人的交互并记录到 JSON Lines 文件")
+    # 轮转参数的默认值来自环境变量，与 MONITOR_MODE 的监听模式一致
+    parser.set_defaults(**rotation_settings())
+    parser.add_argument("bots", nargs="*", help="要监听的机器人用户名，默认监听机器人配置中的所有机器人")
+    parser.add_argument("--capture-dir", default=DEFAULT_CAPTURE_DIR, help="交互记录目录，每个机器人一个文件")
+    parser.add_argument("--rotate-mb", type=float, help="记录文件达到该大小（MB）后轮转")
+    parser.add_argument("--rotate-minutes", type=float, help="记录文件写入超过该分钟数后轮转")
+    parser.add_argument("--gzip", action="store_true", help="用 gzip 压缩轮转出的记录文件")
+    return parser.parse_args()
+
+async def run_monitor(args, bot_usernames):
+    streams = CaptureStreams(
+        args.capture_dir, bot_usernames,
+        **rotation_options(args.rotate_mb, args.rotate_minutes, args.gzip),
+    )
+    logging.info(f"交互记录将保存到 {args.capture_dir} 目录，每个机器人一个文件")
+    try:
+        await monitor_bots(bot_usernames, streams)
+    finally:
+        streams.close()
+
 if __name__ == "__main__":
-    # 默认监听的机器人用户名
-    target_bot = "@micu_user_bot"
-    
-    # 如果命令行参数提供了机器人用户名，则使用提供的用户名
-    if len(sys.argv) > 1:
-        target_bot = sys.argv[1]
-        if not target_bot.startswith('@'):
-            target_bot = '@' + target_bot
-    
-    logging.info(f"将监听机器人: {target_bot}")
-    
+    args = parse_args()
+    bot_usernames = [b if b.startswith('@') else '@' + b for b in args.bots] or configured_bots()
+    if not bot_usernames:
+        logging.error("请在命令行中指定要监听的机器人，或在机器人配置文件中配置机器人。")
+        raise SystemExit(1)
+
+    logging.info(f"将监听机器人: {', '.join(bot_usernames)}")
+
     # 运行监听
     try:
-        asyncio.run(monitor_bot(target_bot))
+        asyncio.run(run_monitor(args, bot_usernames))
     except KeyboardInterrupt:
-        logging.info("程序被用户中断") 
\ No newline at end of file
+        logging.info("程序被用户中断")
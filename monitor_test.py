@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+
+from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+
+from fake_telegram import FakeBot, FakeTelegramClient
+from monitor import CaptureStreams, MessageIndex, capture_path, rotation_options, rotation_settings, watch_bots
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_watch_bots_writes_one_stream_per_bot(tmp_path):
+    bots = [FakeBot("@bot_a", delay=0.01), FakeBot("@bot_b", keyboard="reply", start_command="/menu", delay=0.01),
+            FakeBot("@other_bot", delay=0.01)]
+    watched = ["@bot_a", "@bot_b", "@missing_bot"]
+
+    async def go():
+        streams = CaptureStreams(str(tmp_path), ["@bot_a", "@bot_b"])
+        async with FakeTelegramClient(bots) as client:
+            task = asyncio.ensure_future(watch_bots(client, watched, streams, {"@bot_b": "/menu"}))
+            await asyncio.sleep(0.05)
+            # 未被监听的机器人的消息不会写入任何记录
+            await client.send_message("@other_bot", "/start")
+            await asyncio.sleep(0.05)
+            task.cancel()
+        streams.close()
+
+    asyncio.run(go())
+
+    a = read_records(capture_path(str(tmp_path), "@bot_a"))
+    b = read_records(capture_path(str(tmp_path), "@bot_b"))
+    assert [r["type"] for r in a] == ["outgoing", "message"]
+    assert any(b["text"] == "🎯 签到" for b in a[1]["buttons"]) and all(r["bot"] == "@bot_a" for r in a)
+    assert b[0]["text"] == "/menu" and b[1]["markup"] == "ReplyKeyboardMarkup"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bot_a.jsonl", "bot_b.jsonl"]
+
+def test_keyboard_edit_is_recorded_as_click_response(tmp_path):
+    bot = FakeBot("@edit_bot", response="edit", delay=0.01)
+
+    async def go():
+        streams = CaptureStreams(str(tmp_path), ["@edit_bot"])
+        async with FakeTelegramClient([bot]) as client:
+            task = asyncio.ensure_future(watch_bots(client, ["@edit_bot"], streams))
+            await asyncio.sleep(0.05)
+            keyboard = client.chats[bot.user_id][-1]
+
+            # 用户在其他客户端点击按钮：监听端收不到点击，只能看到机器人随后编辑了这条消息
+            peer = await client.get_input_entity("@edit_bot")
+            await client(GetBotCallbackAnswerRequest(peer=peer, msg_id=keyboard.id, data=b"checkin"))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            gets = client.rpc_counts["get_messages"]
+        streams.close()
+        return keyboard.id, gets
+
+    keyboard_id, gets = asyncio.run(go())
+    records = read_records(capture_path(str(tmp_path), "@edit_bot"))
+    edit = next(r for r in records if r["type"] == "edit")
+    assert edit["message_id"] == keyboard_id
+    assert any(b["text"] == "🎯 签到" and b["data"] == "checkin" for b in edit["before"]["buttons"])
+    assert gets == 0
+
+def test_message_index_is_bounded():
+    index = MessageIndex(limit=3)
+    for message_id in range(10):
+        index.remember({"message_id": message_id, "buttons": [{"text": "签到"}]})
+    assert list(index.messages) == [7, 8, 9]
+    assert index.before_edit({"message_id": 8})["message_id"] == 8
+    assert index.before_edit({"message_id": 5}) is None
+    # 编辑后不再带按钮的消息从索引中移除
+    index.remember({"message_id": 8})
+    assert index.before_edit({"message_id": 8}) is None
+
+def test_rotation_settings_from_env(monkeypatch):
+    """MONITOR_MODE 和 monitor.py 从同一组环境变量读取轮转设置"""
+    monkeypatch.setenv("MONITOR_ROTATE_MB", "50")
+    monkeypatch.setenv("MONITOR_ROTATE_MINUTES", "abc")
+    monkeypatch.setenv("MONITOR_GZIP", "true")
+    settings = rotation_settings()
+    assert settings == {"rotate_mb": 50.0, "rotate_minutes": None, "gzip": True}
+    assert rotation_options(**settings) == {"max_bytes": 50 * 1024 * 1024, "interval": None, "compress": True}
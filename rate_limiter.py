@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+账户级别的出站请求限速。
+
+同一账户的所有出站请求都经过 AccountRateLimiter，按类型使用独立的令牌桶：发送消息（send）、
+读取/解析（read）和回调查询（callback）。某一类请求收到 FloodWait 时只暂停该类的令牌桶，
+其它类型的请求和其它机器人的签到照常进行。
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+from telethon.errors import FloodWaitError
+
+# 默认速率：每秒请求数/突发上限
+DEFAULT_RATES = {"send": "1/3", "read": "5/10", "callback": "2/5"}
+BUDGET_LABELS = {"send": "发送消息", "read": "读取", "callback": "回调查询"}
+
+def parse_rate(value):
+    """
+    解析 "速率/突发上限" 格式的限速设置，例如 "2/5" 表示每秒 2 个请求、最多连续 5 个。
+    只写速率时突发上限为 1。
+
+    Raises:
+        ValueError: 格式不正确或数值不是正数时抛出。
+    """
+    rate, _, burst = str(value).partition("/")
+    rate, burst = float(rate), float(burst or 1)
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"限速设置必须为正数: {value!r}")
+    return rate, burst
+
+class TokenBucket:
+    """令牌桶：以固定速率补充令牌，等待的请求按先来先得的顺序获取令牌。"""
+
+    def __init__(self, name, rate, burst, clock=time.monotonic):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """取得一个令牌，令牌不足或处于 FloodWait 暂停期间时等待。"""
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """暂停该令牌桶 seconds 秒，并清空已积累的令牌，恢复后从头开始补充。"""
+        now = self.clock()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+class AccountRateLimiter:
+    """
+    一个账户的出站请求调度器。
+
+    通过 call(budget, func) 发出请求：先从对应的令牌桶取得令牌再调用 func()；收到 FloodWait 时暂停
+    该令牌桶所要求的秒数后重试。要求等待的时间超过 max_flood_wait 时直接抛出 FloodWaitError。
+    """
+
+    def __init__(self, rates=None, max_flood_wait=None):
+        """
+        Args:
+            rates: {budget: "速率/突发上限"}，未给出的类型读取 CHECKIN_RATE_<BUDGET> 或使用 DEFAULT_RATES。
+            max_flood_wait: 可以接受的最长 FloodWait 秒数，默认读取 CHECKIN_FLOOD_MAX_WAIT（300）。
+        """
+        rates = rates or {}
+        self.buckets = {}
+        for budget, default in DEFAULT_RATES.items():
+            value = rates.get(budget) or os.environ.get(f'CHECKIN_RATE_{budget.upper()}', default)
+            try:
+                rate, burst = parse_rate(value)
+            except ValueError:
+                logging.warning(f"CHECKIN_RATE_{budget.upper()} 的值 {value!r} 无效，使用默认值 {default}。")
+                rate, burst = parse_rate(default)
+            self.buckets[budget] = TokenBucket(budget, rate, burst)
+
+        if max_flood_wait is None:
+            try:
+                max_flood_wait = float(os.environ.get('CHECKIN_FLOOD_MAX_WAIT', '300'))
+            except ValueError:
+                logging.warning("CHECKIN_FLOOD_MAX_WAIT 不是有效的数字，使用默认值 300。")
+                max_flood_wait = 300.0
+        self.max_flood_wait = max_flood_wait
+        self.flood_waits = {budget: 0 for budget in self.buckets}
+
+    async def call(self, budget, func):
+        """
+        按 budget 限速后调用 func() 并返回其结果。
+
+        Args:
+            budget: "send"、"read" 或 "callback"。
+            func: 返回协程的无参函数，FloodWait 后重试时会再次调用。
+        """
+        bucket = self.buckets[budget]
+        while True:
+            await bucket.acquire()
+            try:
+                return await func()
+            except FloodWaitError as e:
+                self.flood_waits[budget] += 1
+                if e.seconds > self.max_flood_wait:
+                    logging.error(f"{BUDGET_LABELS[budget]}请求触发 FloodWait，需要等待 {e.seconds} 秒，"
+                                  f"超过上限 {self.max_flood_wait:g} 秒，放弃本次请求。")
+                    raise
+                logging.warning(f"{BUDGET_LABELS[budget]}请求触发 FloodWait，暂停该类请求 {e.seconds} 秒后重试。")
+                bucket.pause(e.seconds)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+
+import pytest
+from telethon.errors import FloodWaitError
+
+from rate_limiter import AccountRateLimiter, parse_rate
+
+def test_parse_rate():
+    assert parse_rate("2/5") == (2.0, 5.0)
+    assert parse_rate("0.5") == (0.5, 1.0)
+    with pytest.raises(ValueError):
+        parse_rate("0/3")
+
+def test_bucket_paces_requests_after_burst():
+    limiter = AccountRateLimiter({"send": "20/2"}, max_flood_wait=10)
+
+    async def go():
+        started = time.monotonic()
+        for _ in range(4):
+            await limiter.call("send", lambda: asyncio.sleep(0))
+        return time.monotonic() - started
+
+    # 前两个请求使用突发额度，之后每个请求等待约 1/20 秒
+    assert asyncio.run(go()) >= 0.09
+
+def test_flood_wait_pauses_only_its_budget():
+    limiter = AccountRateLimiter({"send": "100/5", "read": "100/5", "callback": "100/5"}, max_flood_wait=10)
+    attempts = []
+    finished = []
+
+    async def flooded_send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FloodWaitError(request=None, capture=1)
+        finished.append("send")
+
+    async def read():
+        finished.append("read")
+
+    async def go():
+        send = asyncio.ensure_future(limiter.call("send", flooded_send))
+        await asyncio.sleep(0.1)
+        # send 暂停期间 read 请求不受影响
+        await limiter.call("read", read)
+        assert finished == ["read"]
+        await send
+
+    asyncio.run(go())
+    assert finished == ["read", "send"]
+    assert attempts[1] - attempts[0] >= 1
+    assert limiter.flood_waits == {"send": 1, "read": 0, "callback": 0}
+
+def test_flood_wait_over_limit_is_raised():
+    limiter = AccountRateLimiter(max_flood_wait=5)
+
+    async def flooded():
+        raise FloodWaitError(request=None, capture=60)
+
+    with pytest.raises(FloodWaitError):
+        asyncio.run(limiter.call("callback", flooded))
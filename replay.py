@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线回放 monitor.py 的交互记录，自动推导机器人的签到配置。
+
+按时间顺序流式读取记录文件（包括轮转出的分段和 gzip 压缩的分段），为每个机器人重建
+"命令 → 按钮面板 → 点击/发送 → 响应" 的过程，统计哪个按钮或命令之后收到了签到成功的响应，
+最后输出可以直接粘贴到 bot_configs.py 的 BOT_CONFIGS 条目。
+
+每个机器人只保留最近的少量按钮面板和一个等待响应的动作，内存占用与记录文件的大小无关，
+可以分析几个月的记录。
+
+用法:
+    python replay.py monitor_captures/
+    python replay.py monitor_captures/example_bot.jsonl --json
+"""
+
+import os
+import sys
+import gzip
+import json
+import logging
+import argparse
+from collections import OrderedDict
+
+from capture import capture_files
+from button_matcher import CHECKIN_KEYWORDS, get_button_matcher
+from main import DEFAULT_CLASSIFIER
+
+# 动作之后多少秒内的响应被视为该动作的结果
+RESPONSE_WINDOW = 30.0
+# 每个机器人保留的最近按钮面板数量
+MAX_KEYBOARDS = 64
+# 没有记录到点击动作时，用于推断被点击按钮的文本
+INFERRED_TARGET = CHECKIN_KEYWORDS[0]
+
+def expand_paths(paths):
+    """
+    把命令行给出的路径展开为按时间顺序排列的记录文件分段，每个文件只出现一次。
+
+    目录会展开为其中的所有记录文件；当前记录文件的路径会同时展开为它轮转出的所有分段。
+    """
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.endswith(".jsonl") or n.endswith(".jsonl.gz"))
+            candidates = [os.path.join(path, name) for name in names]
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            segments = capture_files(candidate) if os.path.exists(candidate) and not candidate.endswith(".gz") else [candidate]
+            for segment in segments:
+                if segment not in seen:
+                    seen.add(segment)
+                    yield segment
+
+def iter_records(paths):
+    """按顺序逐行读取记录文件，产生每条记录。无法解析的行会被跳过。"""
+    for segment in expand_paths(paths):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, 'rt', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning(f"跳过 {segment} 第 {line_no} 行：不是有效的 JSON")
+
+def button_def(button):
+    """把记录中的按钮转换为 checkin_button 定义：优先回调数据，其次文本，二进制回调数据使用位置。"""
+    if "data" in button:
+        return {"data": button["data"]}
+    if "data_b64" in button:
+        return [button["row"], button["col"]]
+    return button["text"]
+
+def config_key(config):
+    return json.dumps([config["start_command"], config["checkin_button"]], ensure_ascii=False)
+
+class BotTrace:
+    """单个机器人的回放状态和候选配置的统计。"""
+
+    def __init__(self, bot_username, classifier):
+        self.bot_username = bot_username
+        self.classifier = classifier
+        self.keyboards = OrderedDict()   # {message_id: (记录, 触发该面板的命令)}
+        self.last_command = None
+        self.pending = None              # (候选配置, 方法, 动作时间)
+        self.candidates = {}             # {config_key: 统计}
+
+    def _remember_keyboard(self, record):
+        self.keyboards[record["message_id"]] = (record, self.last_command)
+        self.keyboards.move_to_end(record["message_id"])
+        while len(self.keyboards) > MAX_KEYBOARDS:
+            self.keyboards.popitem(last=False)
+
+    def _act(self, config, method, ts):
+        self.pending = (config, method, ts)
+
+    def _tally(self, config, method, outcome, ts):
+        stats = self.candidates.setdefault(config_key(config), {
+            "config": config, "method": method, "success": 0, "failure": 0, "last_success": None,
+        })
+        if outcome:
+            stats["success"] += 1
+            stats["last_success"] = ts
+        else:
+            stats["failure"] += 1
+
+    def _infer_click(self, keyboard_record, start_command):
+        """没有记录到点击时，从面板中推断最像签到按钮的按钮。"""
+        matcher = get_button_matcher(INFERRED_TARGET)
+        scored = [(matcher.score(b["text"]), b) for b in keyboard_record["buttons"]]
+        confidence, button = max(scored, key=lambda item: item[0], default=(0.0, None))
+        if not button or confidence <= 0 or confidence < matcher.min_confidence or not start_command:
+            return None
+        return {"bot_username": self.bot_username, "start_command": start_command,
+                "checkin_button": button_def(button)}
+
+    def _on_response(self, record):
+        ts = record.get("ts", 0)
+        outcome = self.classifier.classify(record.get("text") or "", self.bot_username)[0]
+        if self.pending and ts - self.pending[2] > RESPONSE_WINDOW:
+            self.pending = None
+
+        if self.pending:
+            if outcome is not None:
+                config, method, _ = self.pending
+                self._tally(config, method, outcome, ts)
+                self.pending = None
+            return
+
+        # 监听会话看不到按钮点击本身；monitor.py 在机器人编辑面板消息时记下了编辑前的面板，
+        # 编辑即是对该面板按钮点击的响应
+        if outcome and record.get("before"):
+            keyboard = self.keyboards.get(record["message_id"])
+            start_command = keyboard[1] if keyboard else self.last_command
+            config = self._infer_click(record["before"], start_command)
+            if config:
+                self._tally(config, "编辑面板", outcome, ts)
+            return
+
+        if outcome and self.keyboards:
+            # 在官方客户端中点击回调按钮不会产生记录，只能看到机器人的响应
+            message_id = record["message_id"] if record["message_id"] in self.keyboards else next(reversed(self.keyboards))
+            keyboard_record, start_command = self.keyboards[message_id]
+            if ts - keyboard_record.get("ts", 0) <= RESPONSE_WINDOW:
+                config = self._infer_click(keyboard_record, start_command)
+                if config:
+                    self._tally(config, "推断", outcome, ts)
+
+    def feed(self, record):
+        kind, ts = record.get("type"), record.get("ts", 0)
+
+        if kind == "outgoing":
+            text = (record.get("text") or "").strip()
+            if not text:
+                return
+            # 与最近的回复键盘按钮文本相同，视为点击了该按钮
+            for message_id in reversed(self.keyboards):
+                keyboard_record, start_command = self.keyboards[message_id]
+                if keyboard_record.get("markup") == "ReplyKeyboardMarkup":
+                    if any(b["text"] == text for b in keyboard_record["buttons"]) and start_command:
+                        self._act({"bot_username": self.bot_username, "start_command": start_command,
+                                   "checkin_button": text}, "回复键盘", ts)
+                        return
+                    break
+            self.last_command = text
+            self._act({"bot_username": self.bot_username, "start_command": text, "checkin_button": None}, "命令", ts)
+
+        elif kind in ("message", "edit"):
+            # 编辑消息时先用编辑前的面板推断点击，再更新面板
+            self._on_response(record)
+            if record.get("buttons"):
+                # 命令的响应是按钮面板，说明它只是打开菜单，签到要靠之后的点击
+                if self.pending and self.pending[0]["checkin_button"] is None:
+                    self.pending = None
+                self._remember_keyboard(record)
+
+    def best(self):
+        """返回成功次数最多（相同时最近成功）的候选配置的统计，没有成功记录时返回 None。"""
+        successful = [s for s in self.candidates.values() if s["success"]]
+        if not successful:
+            return None
+        return max(successful, key=lambda s: (s["success"] - s["failure"], s["last_success"]))
+
+class ReplayAnalyzer:
+    """把记录按机器人分发给各自的 BotTrace。"""
+
+    def __init__(self, classifier=None, bots=None):
+        self.classifier = classifier or DEFAULT_CLASSIFIER
+        self.only = {b.lower() for b in bots} if bots else None
+        self.traces = {}
+        self.records = 0
+
+    def feed(self, record):
+        bot_username = record.get("bot")
+        if not bot_username or (self.only and bot_username.lower() not in self.only):
+            return
+        self.records += 1
+        trace = self.traces.get(bot_username)
+        if trace is None:
+            trace = self.traces[bot_username] = BotTrace(bot_username, self.classifier)
+        trace.feed(record)
+
+    def results(self):
+        """返回 {bot_username: 最佳候选配置的统计或 None}。"""
+        return {bot_username: trace.best() for bot_username, trace in self.traces.items()}
+
+def format_config(config):
+    """按 bot_configs.py 的写法格式化一条配置。"""
+    def literal(value):
+        return "None" if value is None else json.dumps(value, ensure_ascii=False)
+    return "    {\n" + ",\n".join(f'        "{key}": {literal(value)}' for key, value in config.items()) + "\n    },"
+
+def main():
+    parser = argparse.ArgumentParser(description="回放监听记录，推导机器人的签到配置")
+    parser.add_argument("paths", nargs="+", help="monitor.py 生成的记录文件或记录目录")
+    parser.add_argument("--bot", action="append", help="只分析指定的机器人，可以重复使用")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出配置列表")
+    args = parser.parse_args()
+
+    analyzer = ReplayAnalyzer(bots=args.bot)
+    for record in iter_records(args.paths):
+        analyzer.feed(record)
+    results = analyzer.results()
+    logging.info(f"共回放 {analyzer.records} 条记录，涉及 {len(results)} 个机器人。")
+
+    configs = [stats["config"] for stats in results.values() if stats]
+    if args.json:
+        print(json.dumps(configs, ensure_ascii=False, indent=2))
+    else:
+        print("BOT_CONFIGS = [")
+        for bot_username, stats in results.items():
+            if stats:
+                print(f"    # {bot_username}: {stats['method']}，成功 {stats['success']} 次，失败 {stats['failure']} 次")
+                print(format_config(stats["config"]))
+            else:
+                print(f"    # {bot_username}: 记录中没有找到签到成功的响应")
+        print("]")
+    return 0 if configs else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
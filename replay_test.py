@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+
+from fake_telegram import FakeBot, FakeTelegramClient
+from monitor import CaptureStreams, watch_bots
+from replay import ReplayAnalyzer, iter_records, format_config
+
+def capture_session(capture_dir):
+    """用 watch_bots 记录一次真实的交互：点击内联面板的签到按钮，以及先后发送两个命令。"""
+    inline_bot = FakeBot("@inline_bot", response="edit", delay=0.01)
+    command_bot = FakeBot("@command_bot", keyboard=None, delay=0.01, commands={"/sign": "您今天已经签到过了"})
+    bots = [inline_bot.username, command_bot.username]
+
+    async def go():
+        # 分成多个轮转分段写入
+        streams = CaptureStreams(capture_dir, bots, max_bytes=500, compress=True)
+        async with FakeTelegramClient([inline_bot, command_bot]) as client:
+            task = asyncio.ensure_future(watch_bots(client, bots, streams))
+            await asyncio.sleep(0.05)
+            # 用户在其他客户端点击签到按钮，监听端只能看到机器人编辑了面板消息
+            keyboard = client.chats[inline_bot.user_id][-1]
+            peer = await client.get_input_entity(inline_bot.username)
+            await client(GetBotCallbackAnswerRequest(peer=peer, msg_id=keyboard.id, data=b"checkin"))
+            await client.send_message(command_bot.username, "/sign")
+            await asyncio.sleep(0.05)
+            task.cancel()
+        streams.close()
+        return sum(writer.records for writer in streams.writers.values())
+
+    return asyncio.run(go())
+
+def test_replay_derives_configs(tmp_path):
+    records = capture_session(str(tmp_path))
+
+    analyzer = ReplayAnalyzer()
+    for record in iter_records([str(tmp_path)]):
+        analyzer.feed(record)
+    results = analyzer.results()
+
+    assert any(name.endswith(".gz") for name in (p.name for p in tmp_path.iterdir()))
+    assert analyzer.records == records
+    assert results["@inline_bot"]["method"] == "编辑面板"
+    assert results["@inline_bot"]["config"] == {
+        "bot_username": "@inline_bot", "start_command": "/start", "checkin_button": {"data": "checkin"},
+    }
+    assert results["@command_bot"]["config"] == {"bot_username": "@command_bot", "start_command": "/sign", "checkin_button": None}
+    assert '"checkin_button": None' in format_config(results["@command_bot"]["config"])
+
+def test_reply_keyboard_and_failure():
+    buttons = [{"row": 0, "col": 0, "type": "KeyboardButton", "text": "签到"}]
+    analyzer = ReplayAnalyzer(bots=["@reply_bot"])
+    for record in [
+        {"type": "outgoing", "bot": "@reply_bot", "message_id": 1, "text": "/menu", "ts": 0},
+        {"type": "message", "bot": "@reply_bot", "message_id": 2, "text": "请选择", "markup": "ReplyKeyboardMarkup",
+         "buttons": buttons, "ts": 1},
+        {"type": "outgoing", "bot": "@reply_bot", "message_id": 3, "text": "签到", "ts": 2},
+        {"type": "message", "bot": "@reply_bot", "message_id": 4, "text": "签到成功", "ts": 3},
+        {"type": "outgoing", "bot": "@other_bot", "message_id": 5, "text": "/sign", "ts": 4},
+        {"type": "outgoing", "bot": "@reply_bot", "message_id": 6, "text": "/daily", "ts": 5},
+        {"type": "message", "bot": "@reply_bot", "message_id": 7, "text": "签到失败", "ts": 6},
+    ]:
+        analyzer.feed(record)
+
+    results = analyzer.results()
+    assert list(results) == ["@reply_bot"]
+    assert results["@reply_bot"]["config"] == {"bot_username": "@reply_bot", "start_command": "/menu", "checkin_button": "签到"}
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+守护进程模式使用的签到计划。
+
+每个机器人每天在配置的时间（checkin_time，按 CHECKIN_TIMEZONE 计算）加上一个随机延迟（jitter）
+后到期。计划本身不访问 Telegram，只根据当前时间和签到台账中今天已完成的机器人给出到期的机器人
+和下一次需要唤醒的时间，由 main.py 的守护进程循环负责执行。
+"""
+
+import os
+import random
+import logging
+import datetime as dt
+
+from checkin_state import bot_key, checkin_tz
+
+# 未在机器人配置中指定时使用的默认签到时间和随机延迟上限（秒）
+DEFAULT_CHECKIN_TIME = os.environ.get('CHECKIN_TIME', '00:00')
+DEFAULT_JITTER = os.environ.get('CHECKIN_JITTER', '30')
+
+def parse_checkin_time(value):
+    """
+    解析 "HH:MM" 或 "HH:MM:SS" 格式的签到时间。
+
+    Raises:
+        ValueError: 格式不正确时抛出。
+    """
+    parts = str(value).strip().split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"签到时间格式应为 HH:MM 或 HH:MM:SS: {value!r}")
+    return dt.time(*(int(part) for part in parts))
+
+def parse_jitter(value):
+    """解析随机延迟上限（秒），不能为负数。"""
+    jitter = float(value)
+    if jitter < 0:
+        raise ValueError(f"随机延迟不能为负数: {value!r}")
+    return jitter
+
+class CheckinScheduler:
+    """
+    计算每个机器人每天的签到时间。
+
+    同一机器人的多条配置中，第一条设置了 checkin_time / jitter 的配置生效。
+    随机延迟在每个机器人每天第一次用到时抽取一次，之后保持不变。
+    """
+
+    def __init__(self, bot_configs, timezone=None, default_time=None, default_jitter=None, rng=None):
+        self.tz = checkin_tz(timezone)
+        self.rng = rng or random.Random()
+        default_time = parse_checkin_time(default_time or DEFAULT_CHECKIN_TIME)
+        default_jitter = parse_jitter(DEFAULT_JITTER if default_jitter is None else default_jitter)
+
+        # {bot_username: (签到时间, 随机延迟上限)}，按机器人首次出现的顺序排列
+        self.plans = {}
+        for config in bot_configs:
+            bot_username = config.get("bot_username")
+            if not bot_username:
+                continue
+            checkin_time, jitter = self.plans.get(bot_username, (None, None))
+            if checkin_time is None and config.get("checkin_time"):
+                checkin_time = parse_checkin_time(config["checkin_time"])
+            if jitter is None and config.get("jitter") is not None:
+                jitter = parse_jitter(config["jitter"])
+            self.plans[bot_username] = (checkin_time, jitter)
+        self.plans = {
+            bot_username: (checkin_time or default_time, default_jitter if jitter is None else jitter)
+            for bot_username, (checkin_time, jitter) in self.plans.items()
+        }
+
+        self._offsets = {}   # {(bot_username, date): 随机延迟秒数}
+        self._deferred = {}  # {bot_username: (失败的日期, 重试时间)}
+
+    def planned_at(self, bot_username, date):
+        """返回机器人在某一天（签到时区的日期）的计划签到时间。"""
+        checkin_time, jitter = self.plans[bot_username]
+        key = (bot_username, date)
+        if key not in self._offsets:
+            self._offsets[key] = self.rng.uniform(0, jitter) if jitter else 0.0
+        start = dt.datetime.combine(date, checkin_time, tzinfo=self.tz)
+        return start + dt.timedelta(seconds=self._offsets[key])
+
+    def defer(self, bot_username, now, delay):
+        """签到失败后推迟 delay 秒再重试；重试只在当天有效，第二天按新的计划时间签到。"""
+        self._deferred[bot_username] = (self._local_date(now), now + dt.timedelta(seconds=delay))
+
+    def _local_date(self, now):
+        return now.astimezone(self.tz).date()
+
+    def _prune(self, today):
+        """丢弃已经过去的日期的随机延迟和重试时间。"""
+        self._offsets = {key: offset for key, offset in self._offsets.items() if key[1] >= today}
+        self._deferred = {bot: entry for bot, entry in self._deferred.items() if entry[0] >= today}
+
+    def due(self, now, done=()):
+        """
+        返回当前已经到期、今天尚未签到成功的机器人。
+
+        Args:
+            now: 带时区的当前时间。
+            done: 今天已签到成功的机器人（bot_key 格式），通常来自签到台账。
+
+        Returns:
+            list: 到期的 bot_username 列表，启动时已经错过签到时间的机器人也会立即到期。
+        """
+        today = self._local_date(now)
+        self._prune(today)
+        due = []
+        for bot_username in self.plans:
+            if bot_key(bot_username) in done or self.planned_at(bot_username, today) > now:
+                continue
+            deferred = self._deferred.get(bot_username)
+            if deferred and deferred[0] == today and deferred[1] > now:
+                continue
+            due.append(bot_username)
+        return due
+
+    def next_wakeup(self, now, done=()):
+        """
+        返回下一个机器人到期的时间；没有任何机器人时返回 None。
+
+        今天已签到成功的机器人按明天的计划时间计算。
+        """
+        today = self._local_date(now)
+        candidates = []
+        for bot_username in self.plans:
+            if bot_key(bot_username) in done:
+                candidates.append(self.planned_at(bot_username, today + dt.timedelta(days=1)))
+                continue
+            planned = self.planned_at(bot_username, today)
+            deferred = self._deferred.get(bot_username)
+            if planned <= now and deferred and deferred[0] == today and deferred[1] > now:
+                # 今天的重试时间超过了今天的范围时，等到明天的计划时间
+                tomorrow = self.planned_at(bot_username, today + dt.timedelta(days=1))
+                candidates.append(min(deferred[1], tomorrow))
+            else:
+                candidates.append(planned)
+        return min(candidates) if candidates else None
+
+    def describe(self, now):
+        """记录每个机器人今天的计划签到时间。"""
+        today = self._local_date(now)
+        for bot_username in self.plans:
+            planned = self.planned_at(bot_username, today)
+            logging.info(f"{bot_username} 的计划签到时间: {planned.strftime('%Y-%m-%d %H:%M:%S %Z')}")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import datetime as dt
+
+import pytest
+
+from scheduler import CheckinScheduler, parse_checkin_time
+
+TZ = dt.timezone(dt.timedelta(hours=8))
+
+def at(hour, minute=0, second=0, day=1):
+    return dt.datetime(2024, 5, day, hour, minute, second, tzinfo=TZ)
+
+def make_scheduler(configs, jitter=0):
+    return CheckinScheduler(configs, timezone="Asia/Shanghai", default_time="00:00",
+                            default_jitter=jitter, rng=random.Random(1))
+
+def test_parse_checkin_time():
+    assert parse_checkin_time("08:30") == dt.time(8, 30)
+    assert parse_checkin_time("00:00:05") == dt.time(0, 0, 5)
+    with pytest.raises(ValueError):
+        parse_checkin_time("8")
+
+def test_due_uses_per_bot_times_and_ledger():
+    scheduler = make_scheduler([
+        {"bot_username": "@early_bot"},
+        {"bot_username": "@late_bot", "checkin_time": "09:00"},
+        {"bot_username": "@late_bot", "checkin_time": "12:00"},
+    ])
+    assert scheduler.due(at(8)) == ["@early_bot"]
+    assert scheduler.next_wakeup(at(8), done={"early_bot"}) == at(9)
+    # 启动时已经错过计划时间的机器人立即到期，今天已签到的不再执行
+    assert scheduler.due(at(10), done={"early_bot"}) == ["@late_bot"]
+    assert scheduler.next_wakeup(at(10), done={"early_bot", "late_bot"}) == at(0, day=2)
+
+def test_failed_bot_is_deferred_within_the_day():
+    scheduler = make_scheduler([{"bot_username": "@flaky_bot"}])
+    scheduler.defer("@flaky_bot", at(1), 1800)
+    assert scheduler.due(at(1, 10)) == []
+    assert scheduler.next_wakeup(at(1, 10)) == at(1, 30)
+    assert scheduler.due(at(1, 30)) == ["@flaky_bot"]
+
+    # 跨过零点的重试让位于第二天的计划时间
+    scheduler.defer("@flaky_bot", at(23, 50), 1800)
+    assert scheduler.next_wakeup(at(23, 55)) == at(0, day=2)
+    assert scheduler.due(at(0, 0, 1, day=2)) == ["@flaky_bot"]
+
+def test_jitter_is_fixed_per_day():
+    scheduler = make_scheduler([{"bot_username": "@bot", "jitter": 60}])
+    planned = scheduler.planned_at("@bot", at(0).date())
+    assert at(0) <= planned <= at(0, 1)
+    assert scheduler.planned_at("@bot", at(0).date()) == planned